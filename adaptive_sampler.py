@@ -0,0 +1,173 @@
+"""
+Adaptive Function Sampler
+Vectorized curve sampling for graphs: refines where the curve bends, finds
+poles and jumps (tan x, 1/x, ln x) and breaks the line there with NaN, and
+picks a viewing window from the roots and extrema of the function
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class AdaptiveSampler:
+    def __init__(self, initial_points: int = 65, max_points: int = 1500,
+                 tolerance: float = 2e-3, max_rounds: int = 10):
+        """
+        Args:
+            initial_points: uniform seed grid
+            max_points: hard cap on samples per curve
+            tolerance: allowed midpoint deviation from a straight segment,
+                as a fraction of the visible y-range
+            max_rounds: refinement rounds
+        """
+        self.initial_points = initial_points
+        self.max_points = max_points
+        self.tolerance = tolerance
+        self.max_rounds = max_rounds
+
+    def sample(self, func: Callable, lower: float, upper: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sample func on [lower, upper]
+
+        Returns:
+            (x, y) arrays ready for ax.plot; NaN entries break the line at
+            poles, jumps and points outside the real domain
+        """
+        x = np.linspace(lower, upper, self.initial_points)
+        y = func(x)
+        # Visible band from the uniform seed grid; refinement near poles would skew it
+        band_low, band_high = self.visible_band(y)
+        y_scale = band_high - band_low
+
+        for _ in range(self.max_rounds):
+            left_y, right_y = y[:-1], y[1:]
+            mid_x = 0.5 * (x[:-1] + x[1:])
+            mid_y = func(mid_x)
+
+            # Refine where the midpoint leaves the straight segment (curvature)
+            # or where the domain ends (NaN on one side only)
+            linear = 0.5 * (left_y + right_y)
+            deviation = np.abs(mid_y - linear)
+            finite = np.isfinite(left_y) & np.isfinite(right_y) & np.isfinite(mid_y)
+            domain_edge = np.isfinite(left_y) != np.isfinite(right_y)
+            # Off-screen detail (the walls of an asymptote) is not worth points
+            on_screen = (np.minimum(left_y, right_y) < band_high + y_scale) & \
+                        (np.maximum(left_y, right_y) > band_low - y_scale)
+            refine = (finite & on_screen & (deviation > self.tolerance * y_scale)) | domain_edge
+
+            budget = self.max_points - x.size
+            if not refine.any() or budget <= 0:
+                break
+            if refine.sum() > budget:
+                # Spend the remaining budget on the worst intervals
+                worst = np.argsort(np.where(refine, np.nan_to_num(deviation, nan=np.inf), -1))[::-1][:budget]
+                refine = np.zeros_like(refine)
+                refine[worst] = True
+
+            x, y = self.merge(x, y, mid_x[refine], mid_y[refine])
+
+        return self.break_discontinuities(func, x, y, y_scale)
+
+    def merge(self, x, y, new_x, new_y):
+        """Insert new samples keeping x sorted"""
+        merged_x = np.concatenate([x, new_x])
+        merged_y = np.concatenate([y, new_y])
+        order = np.argsort(merged_x, kind='mergesort')
+        return merged_x[order], merged_y[order]
+
+    def visible_band(self, y: np.ndarray) -> Tuple[float, float]:
+        """Robust (low, high) y-band of uniformly spaced samples (ignores spikes at poles)"""
+        finite = y[np.isfinite(y)]
+        if finite.size < 2:
+            return -1.0, 1.0
+        low, high = np.percentile(finite, [5, 95])
+        if high - low < 1e-9:
+            low, high = low - 1.0, high + 1.0
+        return low, high
+
+    def visible_range(self, y: np.ndarray) -> float:
+        """Height of the visible band"""
+        low, high = self.visible_band(y)
+        return high - low
+
+    def break_discontinuities(self, func, x, y, y_scale: float, bisections: int = 30):
+        """
+        Find intervals whose jump does not shrink under bisection - a pole or
+        a step - and insert a NaN there so matplotlib does not draw a
+        vertical line across it
+        """
+        jump = np.abs(np.diff(y))
+        suspect = np.flatnonzero(np.isfinite(jump) & (jump > 0.05 * y_scale))
+        if suspect.size == 0:
+            return x, y
+
+        # Bisect every suspect interval at once, following the half with the bigger jump
+        left, right = x[suspect].copy(), x[suspect + 1].copy()
+        left_y, right_y = y[suspect].copy(), y[suspect + 1].copy()
+        for _ in range(bisections):
+            mid = 0.5 * (left + right)
+            mid_y = func(mid)
+            left_jump = np.abs(mid_y - left_y)
+            right_jump = np.abs(right_y - mid_y)
+            go_left = ~(right_jump > left_jump)
+            right = np.where(go_left, mid, right)
+            right_y = np.where(go_left, mid_y, right_y)
+            left = np.where(go_left, left, mid)
+            left_y = np.where(go_left, left_y, mid_y)
+
+        final_jump = np.abs(right_y - left_y)
+        # A continuous curve's jump has shrunk to ~nothing by now; a step or pole has not
+        broken = ~np.isfinite(final_jump) | (final_jump > 0.02 * y_scale)
+        if not broken.any():
+            return x, y
+
+        gaps = 0.5 * (left[broken] + right[broken])
+        return self.merge(x, y, gaps, np.full(gaps.size, np.nan))
+
+    def y_limits(self, x: np.ndarray, y: np.ndarray, padding: float = 0.15) -> Optional[Tuple[float, float]]:
+        """y-limits that keep the interesting part visible next to asymptotes"""
+        finite = np.isfinite(y)
+        if finite.sum() < 2:
+            return None
+        # Percentiles over a uniform grid, not over the (pole-heavy) adaptive samples
+        uniform_x = np.linspace(x[finite].min(), x[finite].max(), 400)
+        uniform_y = np.interp(uniform_x, x[finite], y[finite])
+        low, high = np.percentile(uniform_y, [2, 98])
+        if high - low < 1e-9:
+            low, high = low - 1, high + 1
+        pad = padding * (high - low)
+        return low - pad, high + pad
+
+    def auto_window(self, func: Callable, derivative: Optional[Callable] = None,
+                    search: float = 20.0, max_features: int = 3, min_half_width: float = 2.5,
+                    default: Tuple[float, float] = (-5.0, 5.0)) -> Tuple[float, float]:
+        """
+        Viewing window around the roots and extrema closest to the origin
+
+        Roots and critical points are located from sign changes of f and f'
+        on a dense vectorized scan of [-search, search]; periodic functions
+        have endless roots, so only the nearest max_features of each are kept
+        """
+        scan = np.linspace(-search, search, 4001)
+        features: List[np.ndarray] = []
+        for curve in filter(None, [func, derivative]):
+            values = curve(scan)
+            sign = np.sign(values)
+            valid = np.isfinite(values[:-1]) & np.isfinite(values[1:])
+            # A sign change across a huge jump is a pole, not a root
+            small_step = np.abs(np.diff(values)) < 0.5 * self.visible_range(values)
+            change = valid & small_step & ((sign[:-1] * sign[1:] < 0) | (sign[:-1] == 0))
+            points = 0.5 * (scan[:-1][change] + scan[1:][change])
+            if points.size:
+                # Keep the nearest few, including mirror-image ties so symmetric curves stay centred
+                cutoff = np.sort(np.abs(points))[min(max_features, points.size) - 1] + 1e-3
+                features.append(points[np.abs(points) <= cutoff])
+
+        points = np.concatenate(features) if features else np.array([])
+        if points.size == 0:
+            return default
+
+        center = 0.5 * (points.min() + points.max())
+        half_width = max(0.675 * (points.max() - points.min()), min_half_width)
+        return center - half_width, center + half_width
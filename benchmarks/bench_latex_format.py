@@ -0,0 +1,82 @@
+"""
+Benchmark: pdflatex with the full preamble vs the precompiled format
+
+Compiles the same sample solution N times each way and prints per-PDF
+wall-clock times as JSON
+
+Usage:
+    python benchmarks/bench_latex_format.py [--runs 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_generator import PDFGenerator
+
+SAMPLE_SOLUTION = {
+    'strategy_1': "Let t = sin x, so dt = cos x dx. The integral becomes t^2 dt = t^3/3 + C.",
+    'strategy_2': "Shortcut: integral of f(x)^n f'(x) dx = f(x)^(n+1)/(n+1) + C with f = sin x, n = 2.",
+    'strategy_3': "Differentiate sin^3(x)/3: we get sin^2(x) cos(x), which is the integrand.",
+    'final_answer': "sin^3(x)/3 + C",
+    'confidence': 100,
+    'one_sentence_reason': "Substitution t = sin x reduces it to a power rule.",
+    'all_agree': True,
+}
+
+
+def time_compiles(generator: PDFGenerator, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        pdf_path = generator.create_pdf_local(SAMPLE_SOLUTION, f"bench_{time.time_ns()}")
+        timings.append(time.perf_counter() - start)
+        os.remove(pdf_path)
+    return timings
+
+
+def summarize(timings: list) -> dict:
+    return {
+        'runs': len(timings),
+        'mean_s': statistics.mean(timings),
+        'median_s': statistics.median(timings),
+        'min_s': min(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        generator = PDFGenerator(output_dir=os.path.join(workdir, 'pdfs'),
+                                 format_dir=os.path.join(workdir, 'format'))
+        if generator.format_name is None:
+            print(json.dumps({'error': 'precompiled format could not be built (is pdflatex installed?)'}))
+            sys.exit(1)
+
+        # Warm the TeX file cache so the first variant is not penalised
+        time_compiles(generator, 1)
+
+        precompiled = time_compiles(generator, args.runs)
+        format_name, generator.format_name = generator.format_name, None
+        full_preamble = time_compiles(generator, args.runs)
+        generator.format_name = format_name
+
+    results = {
+        'full_preamble': summarize(full_preamble),
+        'precompiled_format': summarize(precompiled),
+    }
+    results['speedup'] = results['full_preamble']['median_s'] / results['precompiled_format']['median_s']
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: the whole image pipeline, offline
+
+Runs CalculusBot.handle_image through a real python-telegram-bot
+Application against FakeBotApi (photo download, progress edits, PDF upload
+over local HTTP) with Gemini replaced by ReplayGemini (recorded responses,
+configurable latency). Every request is a new photo and a new solution, so
+no store, PDF or file_id cache short-circuits it (--warm keeps the caches).
+
+Reports end-to-end time per request plus the per-stage spans the bot
+records (download, enhance, gemini, parse, sympy_verify, graphs, pdflatex,
+upload, ...) as JSON; --output saves them for
+`python benchmarks/harness.py before.json after.json`
+
+Usage:
+    python benchmarks/bench_pipeline.py [--runs 10] [--gemini-latency 0] [--output pipeline.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import summarize, write_results
+from fakes import FakeBotApi, ReplayGemini, load_photos
+
+TOKEN = '123456:offline-benchmark'
+
+
+def offline_environment(workdir: str, keys: int = 1, delivery_mode: str = 'pdf', pdf_backend: str = None):
+    """Settings for a bot process that talks to nothing outside workdir"""
+    if pdf_backend:
+        os.environ['PDF_BACKEND'] = pdf_backend
+        os.environ['GRAPH_FORMAT'] = 'png' if pdf_backend == 'mathtext' else 'pdf'
+    for index in range(1, 6):
+        os.environ[f'GEMINI_API_KEY_{index}'] = f'replay-{index}' if index <= keys else ''
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': TOKEN,
+        'DELIVERY_MODE': delivery_mode,
+        # In-process scheduling; nothing profiled, metrics not served
+        'JOB_QUEUE_URL': '',
+        'PROFILE_SAMPLE_RATE': '0',
+        'SOLUTION_DB': os.path.join(workdir, 'solutions.db'),
+    })
+
+
+@asynccontextmanager
+async def offline_bot(gemini: ReplayGemini, api_latency: float = 0.0, keys: int = 1,
+                      delivery_mode: str = 'pdf', pdf_backend: str = None):
+    """
+    A CalculusBot wired to FakeBotApi and gemini, running in a temporary
+    directory; yields (application, calculus_bot, api)
+    """
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    offline_environment(workdir, keys, delivery_mode, pdf_backend)
+    from telegram.ext import MessageHandler, filters
+    from bot import CalculusBot, application_builder
+
+    api = FakeBotApi(TOKEN, latency=api_latency)
+    await api.start()
+    calculus_bot = CalculusBot()
+    gemini.install(calculus_bot.solver)
+    application = application_builder(TOKEN).base_url(api.base_url).base_file_url(api.base_file_url).build()
+    application.add_handler(MessageHandler(filters.PHOTO, calculus_bot.handle_image))
+    try:
+        async with application:
+            yield application, calculus_bot, api
+    finally:
+        await api.stop()
+        calculus_bot.store.close()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def photo_for(photos, number: int, distinct: bool) -> bytes:
+    photo = photos[number % len(photos)]
+    if distinct:
+        # Bytes after the JPEG end marker: same picture, new image hash
+        photo += f'replay {number}'.encode('ascii')
+    return photo
+
+
+def failures():
+    from metrics import METRICS
+    return METRICS.counters.get('image_errors', 0) + METRICS.counters.get('download_errors', 0)
+
+
+def stage_results(summary):
+    """METRICS.summary() rows in the results format"""
+    return {
+        f'stage/{stage}': {
+            'runs': row['count'],
+            'median_ms': row['p50'] * 1000,
+            'p95_ms': row['p95'] * 1000,
+            'p99_ms': row['p99'] * 1000,
+        }
+        for stage, row in summary.items()
+    }
+
+
+async def run(args):
+    from telegram import Update
+    from metrics import METRICS
+
+    photos = load_photos(args.photos)
+    gemini = ReplayGemini(latency=args.gemini_latency, distinct=not args.warm)
+    async with offline_bot(gemini, api_latency=args.api_latency, delivery_mode=args.delivery_mode,
+                           pdf_backend=args.pdf_backend) as (application, calculus_bot, api):
+        timings = []
+        errors_before = failures()
+        for number in range(args.warmup + args.runs):
+            if number == args.warmup:
+                # Only measured requests count in the stage spans
+                with METRICS.lock:
+                    METRICS.histograms.clear()
+                errors_before = failures()
+            chat_id = 10_000 + number
+            update = Update.de_json(
+                api.photo_update(chat_id, photo_for(photos, number, not args.warm)), application.bot
+            )
+            started = time.perf_counter()
+            await application.process_update(update)
+            # The handler only queues the image; the job delivers the solution
+            await calculus_bot.scheduler.join()
+            if number >= args.warmup:
+                timings.append(time.perf_counter() - started)
+
+        results = {'end_to_end': summarize(timings)}
+        results.update(stage_results(METRICS.summary()))
+        results['errors'] = failures() - errors_before
+        results['gemini_calls'] = gemini.calls
+        results['bot_api_calls'] = len(api.calls)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=1, help='requests run first and not measured')
+    parser.add_argument('--gemini-latency', type=float, default=0.0, help='seconds per replayed Gemini call')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='seconds per Bot API call')
+    parser.add_argument('--delivery-mode', default='pdf', choices=['pdf', 'background', 'on_demand'])
+    parser.add_argument('--pdf-backend', choices=['pdflatex', 'mathtext'], help='default: PDF_BACKEND')
+    parser.add_argument('--warm', action='store_true', help='repeat photos and answers (cache hits allowed)')
+    parser.add_argument('--photos', nargs='*', default=[], help='problem photos (default: synthetic)')
+    parser.add_argument('--output', help='also save the results JSON here')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    args.photos = [os.path.abspath(path) for path in args.photos]
+
+    # The pipeline prints progress; keep stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run(args))
+    write_results('pipeline', results, output)
+    sys.exit(1 if results['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark: each pipeline stage on its own
+
+- enhance: ImageEnhancer.enhance_image on problem photos (synthetic ones
+  unless --photos are given)
+- parse: CalculusSolver.parse_response + problem parsing on the recorded
+  Gemini responses in benchmarks/fixtures
+- sympy_verify / sympy_solve / mcq_check: the SymPy checks run on a response
+- graphs: rendering the graph of the parsed problem (bypassing the graph cache)
+- latex_build (cold and warm fragment cache), latex_compile (pdflatex, PDF
+  cache cleared) and mathtext_pdf
+
+Prints per-call timings as JSON (--output also saves them); compare two
+saved runs with `python benchmarks/harness.py before.json after.json`
+
+Usage:
+    python benchmarks/bench_stages.py [--runs 20] [--output stages.json] [--photos a.jpg b.jpg]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import summarize, time_calls, write_results
+from fakes import load_photos, load_responses
+
+
+def bench_enhance(photos, runs, workdir):
+    from image_enhancer import ImageEnhancer
+
+    enhancer = ImageEnhancer()
+    results = {}
+    for index, photo in enumerate(photos):
+        path = os.path.join(workdir, f'photo{index}.jpg')
+        with open(path, 'wb') as f:
+            f.write(photo)
+
+        def enhance():
+            enhanced = enhancer.enhance_image(path)
+            if enhanced != path:
+                os.remove(enhanced)
+
+        results[f'enhance/photo{index}'] = summarize(time_calls(enhance, runs))
+    return results
+
+
+def parsed_solutions(responses):
+    """(name, solution_data) per recorded response, parsed the way generate_solution does"""
+    from calculus_solver import CalculusSolver
+    from mcq_evaluator import MCQEvaluator
+    from problem_parser import ProblemParser
+    from sympy_verifier import SympyVerifier
+
+    # Parsing and checks need no API keys or Gemini client
+    solver = CalculusSolver.__new__(CalculusSolver)
+    solver.problem_parser = ProblemParser()
+    solver.mcq_evaluator = MCQEvaluator(solver.problem_parser)
+    solver.verifier = SympyVerifier()
+
+    def parse(analysis):
+        solution_data = solver.parse_response(analysis)
+        solution_data['problem'] = solver.problem_parser.parse(
+            solver.mcq_evaluator.strip_options(solution_data['problem_text'])
+        )
+        return solution_data
+
+    solutions = [(f'response{index}', parse(analysis)) for index, analysis in enumerate(responses)]
+    return solver, parse, solutions
+
+
+def bench_solver_stages(responses, runs):
+    solver, parse, solutions = parsed_solutions(responses)
+    verifier = solver.verifier
+    results = {}
+    for (name, solution_data), analysis in zip(solutions, responses):
+        results[f'parse/{name}'] = summarize(time_calls(lambda: parse(analysis), runs))
+        results[f'sympy_verify/{name}'] = summarize(
+            time_calls(lambda: verifier.verify_solution(solution_data), runs)
+        )
+
+        problem = solution_data['problem']
+        if problem is None:
+            continue
+        results[f'sympy_solve/{name}'] = summarize(time_calls(lambda: verifier.solve_parsed(problem), runs))
+        options = solver.mcq_evaluator.parse_options(solution_data['problem_text'])
+        if options:
+            answer = verifier.solve_parsed(problem)['answer']
+            indefinite = problem['operation'] == 'integrate' and problem['limits'] is None
+            results[f'mcq_check/{name}'] = summarize(time_calls(
+                lambda: solver.mcq_evaluator.evaluate(answer, options, var=problem['variable'], indefinite=indefinite),
+                runs
+            ))
+
+        limits = None
+        if problem['limits'] is not None:
+            limits = tuple(verifier.numeric.to_float(limit) for limit in problem['limits'])
+
+        def render_graph():
+            # Rendered every time, past the graph cache (and the keyword check for whether to graph)
+            verifier.graph_renderer.render(problem['expression'], problem['variable'], limits=limits,
+                                           output=io.BytesIO(), fmt=verifier.graph_format)
+
+        results[f'graphs/{name}'] = summarize(time_calls(render_graph, max(1, runs // 4)))
+        solution_data['graphs'] = verifier.generate_graphs(solution_data)
+    return solutions, results
+
+
+def bench_pdf_stages(solutions, runs, workdir):
+    from pdf_generator import PDFGenerator
+
+    generator = PDFGenerator(output_dir=os.path.join(workdir, 'pdfs'), format_dir=os.path.join(workdir, 'format'))
+    mathtext = PDFGenerator(output_dir=os.path.join(workdir, 'pdfs'), backend='mathtext')
+    results = {}
+    for name, solution_data in solutions:
+        def build_cold():
+            generator.latex_renderer.fragments.clear()
+            return generator.build_latex_body(solution_data)
+
+        results[f'latex_build_cold/{name}'] = summarize(time_calls(build_cold, runs))
+        results[f'latex_build_warm/{name}'] = summarize(
+            time_calls(lambda: generator.build_latex_body(solution_data), runs)
+        )
+
+        def compile_pdf():
+            shutil.rmtree(generator.cache_dir, ignore_errors=True)
+            os.makedirs(generator.cache_dir, exist_ok=True)
+            os.remove(generator.compile_pdf(solution_data, f'bench_{name}'))
+
+        if shutil.which('pdflatex'):
+            results[f'latex_compile/{name}'] = summarize(time_calls(compile_pdf, max(1, runs // 4)))
+        else:
+            results[f'latex_compile/{name}'] = {'skipped': 'pdflatex not installed'}
+
+        def mathtext_pdf():
+            os.remove(mathtext.create_pdf_mathtext(solution_data, f'bench_{name}'))
+
+        results[f'mathtext_pdf/{name}'] = summarize(time_calls(mathtext_pdf, max(1, runs // 4)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--output', help='also save the results JSON here')
+    parser.add_argument('--photos', nargs='*', default=[], help='problem photos (default: synthetic)')
+    args = parser.parse_args()
+
+    photos = load_photos(args.photos)
+    responses = load_responses()
+    workdir = tempfile.mkdtemp(prefix='bench_stages_')
+    cwd = os.getcwd()
+    # Stage code writes to relative temp_* and cache directories
+    os.chdir(workdir)
+    try:
+        # The stages print progress; keep stdout for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            results = bench_enhance(photos, args.runs, workdir)
+            solutions, solver_results = bench_solver_stages(responses, args.runs)
+            results.update(solver_results)
+            results.update(bench_pdf_stages(solutions, args.runs, workdir))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results('stages', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Offline stand-ins for the two remote services the pipeline talks to:
+
+- FakeBotApi: a local HTTP server speaking enough of the Telegram Bot API
+  (getMe, getFile and file download, sendMessage, editMessageText,
+  sendDocument, ...) for python-telegram-bot pointed at it with base_url
+- ReplayGemini: replaces CalculusSolver.model and answers generate_content
+  with recorded responses (benchmarks/fixtures/response_*.txt), with
+  optional latency and injected 429s
+
+plus sample_photo() for synthetic problem photos when no real ones are given
+"""
+
+import asyncio
+import glob
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http import HTTPStatus
+from types import SimpleNamespace
+from typing import Dict, List
+from urllib.parse import parse_qsl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import FIXTURES
+from webhook_server import HttpServer, Response
+
+# Bot API methods answered with a Message
+MESSAGE_METHODS = ('sendMessage', 'editMessageText', 'sendDocument', 'sendPhoto', 'editMessageReplyMarkup')
+# Bot API methods answered with True
+TRUE_METHODS = ('answerCallbackQuery', 'deleteMessage', 'sendChatAction', 'setWebhook', 'deleteWebhook')
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Calculus Bench', 'username': 'calculus_bench_bot'}
+
+
+class FakeBotApi(HttpServer):
+    # PDFs are uploaded with sendDocument
+    max_body_bytes = 64 * 1024 * 1024
+
+    def __init__(self, token: str, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        """
+        Args:
+            token: bot token the client uses (part of every URL)
+            host / port: listening address (port 0 picks a free one)
+            latency: added to every Bot API call (seconds), like the round trip to Telegram
+        """
+        super().__init__(host, port)
+        self.token = token
+        self.latency = latency
+        self.files = {}
+        self.message_ids = itertools.count(1000)
+        self.file_ids = itertools.count(1)
+        self.update_ids = itertools.count(1)
+        # (monotonic time, method, params) of every call, in order
+        self.calls = []
+        self.add_route('POST', f'/bot{token}/getMe', self.get_me)
+        self.add_route('POST', f'/bot{token}/getFile', self.get_file)
+        for method in MESSAGE_METHODS:
+            self.add_route('POST', f'/bot{token}/{method}', self.message_method(method))
+        for method in TRUE_METHODS:
+            self.add_route('POST', f'/bot{token}/{method}', self.true_method(method))
+
+    async def start(self):
+        await super().start()
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}/bot'
+
+    @property
+    def base_file_url(self) -> str:
+        return f'http://{self.host}:{self.port}/file/bot'
+
+    def add_photo(self, image: bytes) -> str:
+        """Make an uploaded photo downloadable; returns its file_id"""
+        file_id = f'photo{next(self.file_ids)}'
+        file_path = f'photos/{file_id}.jpg'
+        self.files[file_id] = (file_path, len(image))
+
+        async def download(headers, body):
+            return HTTPStatus.OK, 'image/jpeg', image
+
+        self.add_route('GET', f'/file/bot{self.token}/{file_path}', download)
+        return file_id
+
+    def photo_update(self, chat_id: int, image: bytes) -> Dict:
+        """Update JSON for a private-chat photo message from user chat_id"""
+        file_id = self.add_photo(image)
+        return {
+            'update_id': next(self.update_ids),
+            'message': {
+                'message_id': next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': f'Student {chat_id}'},
+                'photo': [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1600,
+                           'height': 1200, 'file_size': self.files[file_id][1]}],
+            },
+        }
+
+    def calls_for(self, chat_id: int) -> List[tuple]:
+        return [call for call in self.calls if str(call[2].get('chat_id')) == str(chat_id)]
+
+    async def call(self, method: str, headers: Dict[str, str], body: bytes) -> Dict:
+        params = parse_params(headers, body)
+        self.calls.append((time.monotonic(), method, params))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return params
+
+    async def get_me(self, headers, body) -> Response:
+        await self.call('getMe', headers, body)
+        return ok(BOT_USER)
+
+    async def get_file(self, headers, body) -> Response:
+        params = await self.call('getFile', headers, body)
+        file_id = params.get('file_id')
+        if file_id not in self.files:
+            return error(HTTPStatus.BAD_REQUEST, 'Bad Request: invalid file_id')
+        file_path, size = self.files[file_id]
+        return ok({'file_id': file_id, 'file_unique_id': file_id, 'file_size': size, 'file_path': file_path})
+
+    def message_method(self, method: str):
+        async def handler(headers, body) -> Response:
+            params = await self.call(method, headers, body)
+            message = {
+                'message_id': int(params.get('message_id') or next(self.message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'},
+                'from': BOT_USER,
+            }
+            if 'text' in params:
+                message['text'] = params['text']
+            if method == 'sendDocument':
+                file_id = f'document{next(self.file_ids)}'
+                message['document'] = {'file_id': file_id, 'file_unique_id': file_id}
+            return ok(message)
+        return handler
+
+    def true_method(self, method: str):
+        async def handler(headers, body) -> Response:
+            await self.call(method, headers, body)
+            return ok(True)
+        return handler
+
+
+def parse_params(headers: Dict[str, str], body: bytes) -> Dict[str, str]:
+    """Form, multipart or JSON request parameters (file parts are kept as their size)"""
+    content_type = headers.get('content-type', '')
+    if content_type.startswith('multipart/form-data'):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {content_type}\r\n\r\n'.encode('latin-1') + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            payload = part.get_payload(decode=True) or b''
+            params[name] = len(payload) if part.get_filename() else payload.decode('utf-8')
+        return params
+    if content_type.startswith('application/json'):
+        return json.loads(body or b'{}')
+    return dict(parse_qsl(body.decode('utf-8')))
+
+
+def ok(result) -> Response:
+    return HTTPStatus.OK, 'application/json', json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+
+def error(status: int, description: str) -> Response:
+    payload = {'ok': False, 'error_code': int(status), 'description': description}
+    return status, 'application/json', json.dumps(payload).encode('utf-8')
+
+
+class ReplayGemini:
+    def __init__(self, responses: List[str] = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, distinct: bool = True, seed: int = 7):
+        """
+        Args:
+            responses: recorded response texts, served round-robin (default: the fixtures)
+            latency / jitter: seconds each call takes, +- uniform jitter (a real call takes 30-200 s)
+            error_rate: fraction of calls failing with a 429 quota error
+            distinct: mark each response so every request is a new problem (no solution/PDF cache hits)
+        """
+        self.responses = responses or load_responses()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.distinct = distinct
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def install(self, solver):
+        """Serve solver's Gemini calls from the recording, on every key"""
+        solver.model = self
+        # A key switch would build a real GenerativeModel
+        solver.setup_gemini = lambda: None
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        with self.lock:
+            number = self.calls
+            self.calls += 1
+            failed = self.rng.random() < self.error_rate
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            # generate_content is blocking, like the real client
+            time.sleep(delay)
+        if failed:
+            with self.lock:
+                self.errors += 1
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+
+        text = self.responses[number % len(self.responses)]
+        if self.distinct:
+            # Lands in the strategy 1 section, which is part of the solution key
+            text = text.replace('STRATEGY 2', f'(replay {number})\n\nSTRATEGY 2', 1)
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(prompt_token_count=1800, candidates_token_count=len(text) // 4),
+        )
+
+
+def load_responses(pattern: str = 'response_*.txt') -> List[str]:
+    responses = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, pattern))):
+        with open(path, 'r', encoding='utf-8') as f:
+            responses.append(f.read())
+    return responses
+
+
+def problem_lines() -> List[str]:
+    """The PROBLEM: lines of the recorded responses, for the synthetic photos"""
+    lines = []
+    for response in load_responses():
+        problem = response.split('STRATEGY 1', 1)[0].replace('PROBLEM:', '', 1).strip()
+        lines.append(problem)
+    return lines
+
+
+def sample_photo(text: str, seed: int = 0, size: tuple = (1600, 1200), quality: int = 85) -> bytes:
+    """
+    A phone-photo-like JPEG of text: off-white noisy paper, slight tilt
+    Different seeds give different bytes (and image hashes) for the same text
+    """
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+    import io
+
+    rng = random.Random(seed)
+    noise = Image.effect_noise(size, 18 + rng.random() * 6).convert('RGB')
+    paper = Image.blend(Image.new('RGB', size, (236, 232, 220)), noise, 0.15)
+    draw = ImageDraw.Draw(paper)
+    try:
+        font = ImageFont.load_default(size=44)
+    except TypeError:
+        # Pillow < 10.1: fixed-size bitmap font
+        font = ImageFont.load_default()
+    y = 120
+    for line in text.splitlines():
+        draw.text((100 + rng.randint(-8, 8), y), line, fill=(30, 30, 45), font=font)
+        y += 70
+    photo = paper.rotate(rng.uniform(-3, 3), resample=Image.BICUBIC, fillcolor=(200, 196, 186))
+    photo = photo.filter(ImageFilter.GaussianBlur(0.6))
+    buffer = io.BytesIO()
+    photo.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def load_photos(paths: List[str]) -> List[bytes]:
+    """Real problem photos if given, else one synthetic photo per recorded problem"""
+    if paths:
+        photos = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                photos.append(f.read())
+        return photos
+    return [sample_photo(text, seed) for seed, text in enumerate(problem_lines())]
@@ -0,0 +1,123 @@
+"""
+Shared helpers for the benchmark scripts: timing, summaries, the
+machine-readable results file (with the commit it was measured on) and the
+comparison of two results files
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(REPO_ROOT, 'benchmarks', 'fixtures')
+
+# Slower than baseline by more than this fraction counts as a regression...
+DEFAULT_THRESHOLD = 0.10
+# ...and by more than this many milliseconds (sub-millisecond stages are mostly noise)
+DEFAULT_MIN_DELTA_MS = 0.5
+
+
+def time_calls(fn: Callable[[], object], runs: int, warmup: int = 1) -> List[float]:
+    """Seconds per call of fn, after warmup calls that are not recorded"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    ordered = sorted(timings)
+    return {
+        'runs': len(ordered),
+        'median_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000,
+        'p99_ms': ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000,
+        'min_ms': ordered[0] * 1000,
+        'mean_ms': statistics.mean(ordered) * 1000,
+    }
+
+
+def environment() -> Dict[str, str]:
+    """Where the numbers come from: commit, interpreter and machine"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+            capture_output=True, text=True, timeout=30
+        ).stdout.strip())
+    except (OSError, subprocess.SubprocessError):
+        commit, dirty = 'unknown', False
+    return {
+        'commit': commit + ('-dirty' if dirty and commit else ''),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def write_results(suite: str, results: Dict, output: str = None):
+    """Print the results as JSON, and save them to output for compare()"""
+    document = {'suite': suite, 'environment': environment(), 'results': results}
+    text = json.dumps(document, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+def compare(baseline_path: str, current_path: str, threshold: float = DEFAULT_THRESHOLD,
+            min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> bool:
+    """Print median changes per benchmark; returns False if any got slower than threshold"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    print(f"{baseline['environment']['commit']} -> {current['environment']['commit']} "
+          f"(regression: median more than {threshold:.0%} slower)\n")
+    ok = True
+    for name, result in sorted(current['results'].items()):
+        before = baseline['results'].get(name)
+        if not isinstance(result, dict) or 'median_ms' not in result:
+            continue
+        if not isinstance(before, dict) or 'median_ms' not in before:
+            print(f"  {name:<40} {result['median_ms']:>10.2f} ms  (new)")
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0.0
+        mark = ''
+        significant = abs(result['median_ms'] - before['median_ms']) > min_delta_ms
+        if change > threshold and significant:
+            mark, ok = '  REGRESSION', False
+        elif change < -threshold and significant:
+            mark = '  faster'
+        print(f"  {name:<40} {before['median_ms']:>10.2f} -> {result['median_ms']:>10.2f} ms "
+              f"({change:+.1%}){mark}")
+    return ok
+
+
+def main():
+    """python benchmarks/harness.py baseline.json current.json [--threshold 0.1] [--min-delta-ms 0.5]"""
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare two benchmark results files')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS)
+    args = parser.parse_args()
+    sys.exit(0 if compare(args.baseline, args.current, args.threshold, args.min_delta_ms) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Load test: many students sending photos at once
+
+Simulates --users chats each sending one photo at a random moment within
+--window seconds, against the offline bot of bench_pipeline.py (FakeBotApi
+with optional round-trip latency, ReplayGemini with latency, jitter and a
+--error-rate of injected 429s spread over --keys keys). Every update is put
+on application.update_queue, as the network layer would, so it goes through
+the started Application's update processor (CONCURRENT_UPDATES), the
+JobScheduler and the pipeline. A request ends when its job has delivered,
+or when the handler refused it.
+
+Reports throughput, end-to-end latency (p50/p95/p99) of solved requests,
+queue wait, per-stage spans, event-loop lag, memory high-water mark and the
+share of requests solved / refused (queue full, quota) / failed, as JSON
+(--output saves it for `python benchmarks/harness.py`)
+
+ReplayGemini blocks in generate_content like the real client, so Gemini
+latency shows up the way it does in production
+
+Usage:
+    python benchmarks/load_test.py [--users 50] [--window 60] [--gemini-latency 2] [--error-rate 0.05]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import summarize, write_results
+from fakes import ReplayGemini, load_photos
+from bench_pipeline import offline_bot, photo_for, stage_results
+
+# How often memory and event-loop lag are sampled (seconds)
+SAMPLE_INTERVAL = 0.1
+
+
+def rss_mb() -> float:
+    """Resident set size now (Linux), else the high-water mark so far"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+class Monitor:
+    """Samples RSS and how late the event loop wakes up while the test runs"""
+
+    def __init__(self):
+        self.rss_start = rss_mb()
+        self.rss_peak = self.rss_start
+        self.loop_lag = []
+
+    async def run(self):
+        while True:
+            expected = time.perf_counter() + SAMPLE_INTERVAL
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            self.loop_lag.append(max(0.0, time.perf_counter() - expected))
+            self.rss_peak = max(self.rss_peak, rss_mb())
+
+
+def outcome(api, chat_id: int) -> str:
+    """solved / busy / quota / failed, from what the bot sent the chat"""
+    texts = [str(params.get('text', '')) for _, method, params in api.calls_for(chat_id) if method == 'sendMessage']
+    if any('BOT IS BUSY' in text for text in texts):
+        return 'busy'
+    if any('DAILY CAPACITY' in text for text in texts):
+        return 'quota'
+    if any(text.startswith('❌') for text in texts):
+        return 'failed'
+    return 'solved'
+
+
+def track_requests(application, calculus_bot):
+    """
+    (handled, jobs): handled[chat_id] is resolved once every handler is done
+    with the chat's update, jobs[chat_id] is the scheduler job it submitted
+    (if it was not refused)
+    """
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    handled = {}
+    jobs = {}
+    submit = calculus_bot.scheduler.submit
+
+    def tracked_submit(user_id, run, on_position=None):
+        job = submit(user_id, run, on_position)
+        jobs[user_id] = job
+        return job
+
+    async def mark_handled(update, context):
+        future = handled.get(update.effective_chat.id)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    calculus_bot.scheduler.submit = tracked_submit
+    # Handler groups run in order: this one after handle_image has returned
+    application.add_handler(TypeHandler(Update, mark_handled), group=1)
+    return handled, jobs
+
+
+async def simulate(args):
+    from telegram import Update
+    from metrics import METRICS
+
+    photos = load_photos(args.photos)
+    gemini = ReplayGemini(latency=args.gemini_latency, jitter=args.gemini_jitter, error_rate=args.error_rate,
+                          seed=args.seed)
+    rng = random.Random(args.seed)
+    arrivals = sorted(rng.uniform(0, args.window) for _ in range(args.users))
+
+    async with offline_bot(gemini, api_latency=args.api_latency, keys=args.keys,
+                           delivery_mode=args.delivery_mode, pdf_backend=args.pdf_backend) as (
+            application, calculus_bot, api):
+        handled, jobs = track_requests(application, calculus_bot)
+        await application.start()
+        with METRICS.lock:
+            METRICS.histograms.clear()
+        monitor = Monitor()
+        monitor_task = asyncio.create_task(monitor.run())
+        started = time.perf_counter()
+        latencies = {}
+        finished = []
+
+        async def student(number: int, arrival: float):
+            await asyncio.sleep(max(0.0, arrival - (time.perf_counter() - started)))
+            chat_id = 20_000 + number
+            update = Update.de_json(api.photo_update(chat_id, photo_for(photos, number, True)), application.bot)
+            handled[chat_id] = asyncio.get_running_loop().create_future()
+            sent = time.perf_counter()
+            await application.update_queue.put(update)
+            await handled[chat_id]
+            if chat_id in jobs:
+                await asyncio.gather(jobs[chat_id].future, return_exceptions=True)
+            latencies[chat_id] = time.perf_counter() - sent
+            finished.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(student(number, arrival) for number, arrival in enumerate(arrivals)))
+        duration = time.perf_counter() - started
+        monitor_task.cancel()
+        await asyncio.gather(monitor_task, return_exceptions=True)
+        await application.stop()
+
+        outcomes = {chat_id: outcome(api, chat_id) for chat_id in latencies}
+        counts = {kind: sum(1 for value in outcomes.values() if value == kind)
+                  for kind in ('solved', 'busy', 'quota', 'failed')}
+        solved = [latencies[chat_id] for chat_id, kind in outcomes.items() if kind == 'solved']
+        summary = METRICS.summary()
+
+    results = {
+        'users': args.users,
+        'window_s': args.window,
+        'concurrent_updates': application.update_processor.max_concurrent_updates,
+        'duration_s': duration,
+        'throughput_per_min': counts['solved'] / duration * 60 if duration else 0.0,
+        'outcomes': counts,
+        'error_rate': (counts['failed'] + counts['busy'] + counts['quota']) / args.users,
+        'gemini': {'calls': gemini.calls, 'injected_429': gemini.errors},
+        'memory_mb': {'rss_start': monitor.rss_start, 'rss_peak': monitor.rss_peak},
+    }
+    if solved:
+        results['latency'] = summarize(solved)
+    if monitor.loop_lag:
+        results['loop_lag'] = summarize(monitor.loop_lag)
+    results.update(stage_results(summary))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50, help='chats, one photo each')
+    parser.add_argument('--window', type=float, default=60, help='seconds over which photos arrive')
+    parser.add_argument('--gemini-latency', type=float, default=2.0, help='seconds per Gemini call')
+    parser.add_argument('--gemini-jitter', type=float, default=1.0, help='+- seconds on each call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of Gemini calls answering 429')
+    parser.add_argument('--keys', type=int, default=5, help='Gemini keys (1-5) to spread calls and 429s over')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='seconds per Bot API call')
+    parser.add_argument('--concurrency', type=int, help='JOB_CONCURRENCY for the run')
+    parser.add_argument('--queue-limit', type=int, help='JOB_QUEUE_LIMIT for the run')
+    parser.add_argument('--delivery-mode', default='pdf', choices=['pdf', 'background', 'on_demand'])
+    parser.add_argument('--pdf-backend', choices=['pdflatex', 'mathtext'], help='default: PDF_BACKEND')
+    parser.add_argument('--photos', nargs='*', default=[], help='problem photos (default: synthetic)')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='also save the results JSON here')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    args.photos = [os.path.abspath(path) for path in args.photos]
+    if args.concurrency:
+        os.environ['JOB_CONCURRENCY'] = str(args.concurrency)
+    if args.queue_limit:
+        os.environ['JOB_QUEUE_LIMIT'] = str(args.queue_limit)
+
+    # The pipeline prints progress; keep stdout for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(simulate(args))
+    write_results('load', results, output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,28 @@
 import os
+import asyncio
+import hashlib
 import logging
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+import time
+import sys
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.error import BadRequest
+from telegram.helpers import escape_markdown
 from PIL import Image
 import io
-import tempfile
 from calculus_solver import CalculusSolver
-from pdf_generator import PDFGenerator
+from pdf_generator import PDFGenerator, PDFCompileError
 from image_enhancer import ImageEnhancer
+from solution_store import SolutionStore, open_solution_store
+from job_scheduler import JobScheduler, QueueFullError
+from job_queue import RedisJobQueue, open_job_queue
+from solver_worker import SolverWorker
+from webhook_server import run_webhook, start_metrics_server
+from metrics import METRICS, span
+from progress_reporter import PIPELINE_STAGES, ProgressReporter, StageClock, TokenBucket, format_estimate
+from request_profiler import RequestProfiler
+from workspace import request_workspace, sweep_workspaces
 
 # Configure logging
 logging.basicConfig(
@@ -16,11 +31,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Solutions waiting for their "Get full PDF" button (DELIVERY_MODE=on_demand)
+PENDING_PDF_LIMIT = 1000
+# Uploaded-PDF file_ids remembered for re-sending
+FILE_ID_CACHE_SIZE = 5000
+# Past solutions listed by /history
+HISTORY_LIMIT = 10
+# The only update types there are handlers for (messages and inline-button presses)
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+# Latency rows in /status, in pipeline order
+STATUS_STAGES = [
+    ('queue_wait', 'Queue wait'),
+    ('download', 'Download'),
+    ('enhance', 'Enhancement'),
+    ('gemini', 'Gemini'),
+    ('parse', 'Parse'),
+    ('sympy_verify', 'SymPy verify'),
+    ('graphs', 'Graphs'),
+    ('pdflatex', 'pdflatex pass'),
+    ('pdf', 'PDF total'),
+    ('upload', 'Upload'),
+    ('image_total', 'End to end'),
+]
+
 class CalculusBot:
     def __init__(self):
         self.solver = CalculusSolver()
         self.pdf_generator = PDFGenerator()
         self.image_enhancer = ImageEnhancer()
+        self.store = open_solution_store()
+        self.scheduler = JobScheduler()
+        # Set (JOB_QUEUE_URL): images are solved by `python bot.py --worker` processes
+        self.job_queue = open_job_queue()
+        # Progress-message edits: bot-wide flood budget and measured stage durations
+        self.edit_limiter = TokenBucket(float(os.getenv('PROGRESS_EDITS_PER_SECOND', '20')))
+        self.stage_clock = StageClock()
+        # Opt-in per-request profiles; /profile is limited to ADMIN_USER_IDS
+        self.profiler = RequestProfiler()
+        self.admin_ids = {int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
+        METRICS.gauge('jobs_running', lambda: self.scheduler.active)
+        METRICS.gauge('jobs_queued', lambda: self.scheduler.queued)
+        METRICS.gauge('gemini_requests_remaining', lambda: self.solver.usage.remaining_requests() or 0)
+        
+        # pdf (default) / background / on_demand - see deliver_solution
+        self.delivery_mode = os.getenv('DELIVERY_MODE', 'pdf').lower()
+        self.pending_pdfs = OrderedDict()
+        # solution hash -> Telegram file_id of the PDF uploaded for it
+        self.pdf_file_ids = OrderedDict()
+        self.background_tasks = set()
         
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Send welcome message"""
@@ -36,7 +94,8 @@ class CalculusBot:
 
 📸 **How to Use:**
 1. Send me a calculus problem image (differentiation/integration)
-2. Wait 3-8 minutes for deep analysis
+   or simply type it: `integrate x^2*e^x`
+2. Wait 3-8 minutes for deep analysis (typed problems are often instant)
 3. Receive professional PDF with complete solution!
 
 🔬 **Accuracy:** 95%+ on JEE Advanced Calculus
@@ -61,6 +120,7 @@ Send an image to get started! 🚀
 /start - Welcome message
 /help - This help message
 /status - Bot status
+/history - Your recent solutions (re-sent instantly)
 
 **Tips:**
 ✅ Clear, high-quality images work best
@@ -68,7 +128,7 @@ Send an image to get started! 🚀
 ✅ Include all options (A/B/C/D)
 ✅ Wait patiently - deep analysis takes time!
 
-**Example Problems:**
+**Example Problems (send as image or type them):**
 "Find ∫x²·e^x dx"
 "Differentiate y = sin(x²)"
 "Area bounded by y=x² and y=4"
@@ -76,205 +136,571 @@ Send an image to get started! 🚀
         await update.message.reply_text(help_text, parse_mode='Markdown')
     
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Send bot status"""
-        status_text = """
-✅ **BOT STATUS: ONLINE**
-
-🔧 Systems:
-✅ Gemini 2.0 Flash - Active
-✅ SymPy Verifier - Active
-✅ Matplotlib Graphs - Active
-✅ PyLaTeX PDF - Active
-✅ Knowledge Base - Loaded
-
-📊 **Current Load:** Normal
-⏱️ **Avg Response Time:** 3-8 minutes
-
-Ready to solve! 🚀
-        """
-        await update.message.reply_text(status_text, parse_mode='Markdown')
+        """Send bot status: live load and measured stage latencies"""
+        uptime = int(time.time() - METRICS.started)
+        stats = self.scheduler.stats()
+        lines = [
+            "✅ **BOT STATUS: ONLINE**",
+            "",
+            f"⏱️ Uptime: {uptime // 3600}h {uptime % 3600 // 60}m",
+        ]
+        if self.job_queue is not None:
+            lines.append("📊 **Load:** solving runs in worker processes")
+        else:
+            lines.append(
+                f"📊 **Load:** {stats['running']} solving, {stats['queued']} queued "
+                f"(max {stats['max_concurrent']} at once)"
+            )
+        
+        summary = METRICS.summary()
+        lines += ["", "**Latency, last hour (p50 / p95 / p99):**"]
+        rows = [
+            f"• {label}: {summary[stage]['p50']:.1f}s / {summary[stage]['p95']:.1f}s / "
+            f"{summary[stage]['p99']:.1f}s ({summary[stage]['count']})"
+            for stage, label in STATUS_STAGES if stage in summary
+        ]
+        lines += rows or ["No requests measured yet"]
+        
+        lines += ["", "**Gemini usage today:**"]
+        for key in self.solver.usage.report():
+            quota = f"/{key['request_quota']}" if key['request_quota'] else ""
+            line = (
+                f"• Key {key['key']}: {key['requests']}{quota} req, "
+                f"{(key['prompt_tokens'] + key['response_tokens']) / 1000:.1f}k tokens"
+            )
+            if key['cooling_down']:
+                line += " - rate limited"
+            elif key['exhausted_in_s'] is not None:
+                line += f" - quota in ~{key['exhausted_in_s'] / 3600:.1f}h"
+            lines.append(line)
+        lines += ["", "Ready to solve! 🚀"]
+        await update.message.reply_text('\n'.join(lines), parse_mode='Markdown')
+    
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Admins only: /profile [on | off | rate <fraction> | last]"""
+        if update.effective_user.id not in self.admin_ids:
+            return
+        
+        args = context.args or []
+        action = args[0].lower() if args else 'status'
+        if action == 'on':
+            self.profiler.forced = True
+        elif action == 'off':
+            self.profiler.forced = False
+        elif action == 'rate' and len(args) == 2:
+            try:
+                self.profiler.sample_rate = min(1.0, max(0.0, float(args[1])))
+            except ValueError:
+                await update.message.reply_text("Usage: /profile rate 0.01")
+                return
+        elif action == 'last':
+            prefix = self.profiler.latest()
+            if prefix is None:
+                await update.message.reply_text("No profiles written yet.")
+                return
+            for suffix in ('.txt', '.memory.txt', '.collapsed'):
+                if os.path.exists(prefix + suffix):
+                    with open(prefix + suffix, 'rb') as report:
+                        await update.message.reply_document(report, filename=os.path.basename(prefix + suffix))
+            return
+        elif action != 'status':
+            await update.message.reply_text("Usage: /profile [on | off | rate <fraction> | last]")
+            return
+        
+        # Only this process: solver workers take PROFILE_SAMPLE_RATE from their environment
+        await update.message.reply_text(f"🔬 Profiling: {self.profiler.status()}")
     
     async def handle_image(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle incoming images"""
-        try:
-            # Send initial message
-            processing_msg = await update.message.reply_text(
-                "🔍 **ANALYSIS STARTED**\n\n"
-                "⏳ Stage 1/5: Image preprocessing...\n"
-                "⏱️ Estimated time: 3-8 minutes\n\n"
-                "Please wait patiently! 🧮",
+        """Queue incoming images behind the job scheduler (or for solver workers)"""
+        if self.job_queue is not None:
+            await self.enqueue_image(update, context)
+            return
+        
+        # Shed load early: no point queueing work the Gemini quota cannot serve today
+        remaining = self.solver.usage.remaining_requests()
+        if remaining is not None and remaining <= self.scheduler.active + self.scheduler.queued:
+            logger.warning(f"Image refused, Gemini quota nearly used up ({remaining} requests left)")
+            await update.message.reply_text(
+                "🔋 **DAILY CAPACITY REACHED**\n\n"
+                "Today's solving quota is used up. Please try again after the daily reset,\n"
+                "or type the problem - simple ones are solved instantly without it.",
                 parse_mode='Markdown'
             )
-            
-            # Get the image
-            photo = update.message.photo[-1]  # Get highest resolution
-            file = await context.bot.get_file(photo.file_id)
-            
-            # Download image to temporary file
-            temp_image = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-            await file.download_to_drive(temp_image.name)
-            temp_image.close()
-            
-            # Stage 1: Enhance image
-            await processing_msg.edit_text(
-                "🔍 **ANALYSIS IN PROGRESS**\n\n"
-                "✅ Stage 1/5: Image enhanced\n"
-                "⏳ Stage 2/5: OCR and problem extraction...\n"
-                "⏱️ Time remaining: ~5-7 minutes",
-                parse_mode='Markdown'
+            return
+        
+        queue_msg = None
+        
+        async def show_position(position, eta_seconds):
+            nonlocal queue_msg
+            text = (
+                "🕒 **IN QUEUE**\n\n"
+                f"You are #{position} - ETA ~{max(1, round(eta_seconds / 60))} min\n"
+                "Your analysis starts automatically, no need to resend! 🧮"
             )
-            enhanced_image_path = self.image_enhancer.enhance_image(temp_image.name)
-            
-            # Stage 2-4: Solve with triple strategy
-            await processing_msg.edit_text(
-                "🔍 **ANALYSIS IN PROGRESS**\n\n"
-                "✅ Stage 1/5: Image enhanced\n"
-                "✅ Stage 2/5: Problem extracted\n"
-                "⏳ Stage 3/5: Triple-strategy solving...\n"
-                "⏱️ Time remaining: ~4-6 minutes",
+            if queue_msg is None:
+                queue_msg = await update.message.reply_text(text, parse_mode='Markdown')
+            else:
+                await queue_msg.edit_text(text, parse_mode='Markdown')
+        
+        try:
+            # The queue message (if the job had to wait) becomes the progress message.
+            # The job delivers (or reports) the solution itself; the handler returns
+            # right away so the next update is not held up behind it
+            self.scheduler.submit(
+                update.effective_user.id,
+                lambda: self.process_image(update, context, queue_msg),
+                on_position=show_position
+            )
+        except QueueFullError as e:
+            logger.warning(f"Image refused, queue full: {e}")
+            await update.message.reply_text(
+                "🚦 **BOT IS BUSY**\n\n"
+                "Too many problems are waiting right now (or you already have several queued).\n"
+                "Please send it again in a few minutes.",
                 parse_mode='Markdown'
             )
+    
+    async def enqueue_image(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Worker mode: hand the image to the durable job queue for a solver worker"""
+        try:
+            photo = update.message.photo[-1]  # Get highest resolution
+            file = await context.bot.get_file(photo.file_id)
+            image = bytes(await file.download_as_bytearray())
             
-            solution_data = await self.solver.solve(enhanced_image_path)
-            
-            # Stage 5: Generate PDF
-            await processing_msg.edit_text(
-                "🔍 **ANALYSIS IN PROGRESS**\n\n"
-                "✅ Stage 1/5: Image enhanced\n"
-                "✅ Stage 2/5: Problem extracted\n"
-                "✅ Stage 3/5: Triple-strategy complete\n"
-                "✅ Stage 4/5: SymPy verification done\n"
-                "⏳ Stage 5/5: Generating PDF with graphs...\n"
-                "⏱️ Time remaining: ~1 minute",
+            processing_msg = await update.message.reply_text(
+                "📥 **QUEUED**\n\n"
+                "A solver will pick up your problem shortly... 🧮",
                 parse_mode='Markdown'
             )
+            loop = asyncio.get_running_loop()
+            job_id = await loop.run_in_executor(None, lambda: self.job_queue.enqueue(
+                image, chat_id=update.effective_chat.id, user_id=update.effective_user.id,
+                message_id=update.message.message_id, progress_message_id=processing_msg.message_id
+            ))
+            position = await loop.run_in_executor(None, self.job_queue.position, job_id)
+            if position > 1:
+                await processing_msg.edit_text(
+                    "📥 **QUEUED**\n\n"
+                    f"You are #{position} in the queue.\n"
+                    "Your analysis starts automatically, no need to resend! 🧮",
+                    parse_mode='Markdown'
+                )
+        except Exception as e:
+            await self.report_image_error(update.message, e)
+    
+    async def process_image(self, update: Update, context: ContextTypes.DEFAULT_TYPE, processing_msg=None):
+        """Download an image, solve it and deliver the solution"""
+        try:
+            processing_msg = await self.show_started(update.message, processing_msg)
             
-            # MODIFIED: Catch PDF generation errors and send debug info to Telegram
-            try:
-                pdf_path = self.pdf_generator.generate(solution_data)
-            except Exception as pdf_error:
-                # Send debug info to Telegram
-                debug_msg = f"🔧 **PDF GENERATION DEBUG INFO**\n\n"
-                debug_msg += f"Error: {str(pdf_error)[:500]}\n\n"
+            # Photo and enhanced image live in the request's workspace, removed however it ends
+            with request_workspace('image') as workdir:
+                with span('download'):
+                    photo = update.message.photo[-1]  # Get highest resolution
+                    file = await context.bot.get_file(photo.file_id)
+                    image_path = os.path.join(workdir, 'photo.jpg')
+                    await file.download_to_drive(image_path)
                 
-                # Try to read the debug .tex file
-                debug_tex_path = "temp_pdfs/DEBUG_last_compile.tex"
-                if os.path.exists(debug_tex_path):
-                    with open(debug_tex_path, 'r', encoding='utf-8', errors='replace') as f:
-                        tex_content = f.read()
-                    
-                    # Send .tex file to user for inspection
-                    await update.message.reply_document(
-                        document=open(debug_tex_path, 'rb'),
-                        filename='debug.tex',
-                        caption="🔍 Debug: Here's the LaTeX file that failed to compile"
-                    )
+                await self.solve_image(update.message, processing_msg, image_path, update.effective_user.id, workdir)
+        except Exception as e:
+            await self.report_image_error(update.message, e)
+    
+    async def show_started(self, message, processing_msg=None):
+        """Post (or turn the queue message into) the progress message"""
+        stages = self.pipeline_stages()
+        estimate = self.stage_clock.remaining([name for name, _ in stages], None, 0)
+        status_text = (
+            "🔍 **ANALYSIS STARTED**\n\n"
+            f"⏳ Stage 1/{len(stages)}: {stages[0][1]}...\n"
+            f"⏱️ Estimated time: ~{format_estimate(estimate)}\n\n"
+            "Please wait patiently! 🧮"
+        )
+        if processing_msg is None:
+            return await message.reply_text(status_text, parse_mode='Markdown')
+        await processing_msg.edit_text(status_text, parse_mode='Markdown')
+        return processing_msg
+    
+    def pipeline_stages(self):
+        """Stages the user waits for (answer-first modes do not wait for the PDF)"""
+        return PIPELINE_STAGES if self.delivery_mode == 'pdf' else PIPELINE_STAGES[:-1]
+    
+    async def solve_image(self, message, processing_msg, image_path, user_id, workdir):
+        """
+        Solve a downloaded image and reply to message with the solution
+        (used in-process and by solver workers); workdir is the request's
+        workspace holding image_path, removed by the caller
+        """
+        # Sampled (PROFILE_SAMPLE_RATE) or forced on by /profile: the whole pipeline is profiled
+        with self.profiler.profile(f"{message.chat_id}-{message.message_id}"):
+            # Stage changes only mark the message dirty; edits happen in the background
+            progress = ProgressReporter(processing_msg, self.edit_limiter, self.stage_clock, self.pipeline_stages())
+            try:
+                with open(image_path, 'rb') as image_file:
+                    image_hash = hashlib.sha256(image_file.read()).hexdigest()
                 
-                # Check if log file exists
-                log_files = [f for f in os.listdir('temp_pdfs') if f.endswith('.log')]
-                if log_files:
-                    latest_log = os.path.join('temp_pdfs', log_files[-1])
-                    with open(latest_log, 'r', encoding='utf-8', errors='replace') as f:
-                        log_content = f.read()
-                    
-                    # Find the actual error in log
-                    error_lines = []
-                    for line in log_content.split('\n'):
-                        if '!' in line or 'Error' in line or 'error' in line:
-                            error_lines.append(line)
+                # The same photo solved before (re-sent or forwarded): skip OCR and solving
+                started = time.perf_counter()
+                enhanced_image_path = image_path
+                loop = asyncio.get_running_loop()
+                solution_data = await loop.run_in_executor(None, self.store.find_by_image_hash, image_hash)
+                METRICS.increment('images')
+                if solution_data is None:
+                    progress.stage('enhance')
+                    with span('enhance'):
+                        enhanced_image_path = await loop.run_in_executor(
+                            None, self.image_enhancer.enhance_image, image_path, workdir
+                        )
                     
-                    if error_lines:
-                        debug_msg += f"📄 **LaTeX Errors Found:**\n"
-                        debug_msg += '\n'.join(error_lines[:10])  # First 10 error lines
-                    
-                    # Send log file excerpt
-                    log_excerpt = log_content[-2000:]  # Last 2000 chars
-                    await update.message.reply_text(
-                        f"📄 **Log File (last 2000 chars):**\n\n```\n{log_excerpt}\n```",
-                        parse_mode='Markdown'
+                    # OCR, triple-strategy solving and SymPy verification
+                    progress.stage('solve')
+                    solve_started = time.perf_counter()
+                    with span('solve'):
+                        solution_data = await self.solver.solve(enhanced_image_path, user_id)
+                    # Only new solutions are stored: a re-sent photo adds no /history entry
+                    self.store.save_solution(
+                        solution_data, user_id=user_id, chat_id=message.chat_id,
+                        image_hash=image_hash, solution_key=self.pdf_generator.solution_key(solution_data),
+                        timings={
+                            'enhance_s': round(solve_started - started, 3),
+                            'solve_s': round(time.perf_counter() - solve_started, 3),
+                        }
                     )
                 
-                await update.message.reply_text(debug_msg, parse_mode='Markdown')
+                # Generate PDF (answer-first modes reply with the answer instead)
+                if self.delivery_mode == 'pdf':
+                    progress.stage('pdf')
                 
-                # Re-raise to show user the error
+                await self.deliver_solution(message, progress, solution_data)
+                METRICS.observe('image_total', time.perf_counter() - started)
+            except Exception:
+                METRICS.increment('image_errors')
                 raise
-            
-            # Send PDF
-            await processing_msg.edit_text(
-                "✅ **ANALYSIS COMPLETE!**\n\n"
-                "Sending your solution... 📄",
-                parse_mode='Markdown'
+            finally:
+                await progress.stop()
+    
+    async def report_image_error(self, message, e):
+        """Tell the user an image could not be processed"""
+        logger.error(f"Error processing image: {e}")
+        
+        # Escape special characters for Telegram MarkdownV2
+        error_msg = str(e)
+        # Truncate if too long
+        if len(error_msg) > 150:
+            error_msg = error_msg[:150] + "..."
+        
+        # Escape special characters
+        error_msg_escaped = (error_msg
+            .replace('_', '\\_')
+            .replace('*', '\\*')
+            .replace('[', '\\[')
+            .replace(']', '\\]')
+            .replace('(', '\\(')
+            .replace(')', '\\)')
+            .replace('~', '\\~')
+            .replace('`', '\\`')
+            .replace('>', '\\>')
+            .replace('#', '\\#')
+            .replace('+', '\\+')
+            .replace('-', '\\-')
+            .replace('=', '\\=')
+            .replace('|', '\\|')
+            .replace('{', '\\{')
+            .replace('}', '\\}')
+            .replace('.', '\\.')
+            .replace('!', '\\!')
+        )
+        
+        await message.reply_text(
+            f"❌ *ERROR*\n\n"
+            f"Failed to process image\\.\n\n"
+            f"Error: {error_msg_escaped}\n\n"
+            f"Please try again with a clearer image\\.",
+            parse_mode='MarkdownV2'
+        )
+    
+    async def deliver_solution(self, message, progress, solution_data):
+        """
+        Send a solution (progress: the ProgressReporter of the request) according to DELIVERY_MODE:
+        pdf - build the PDF, then send it with the answer as caption
+        background - answer right away, attach the PDF when it is ready
+        on_demand - answer right away with a "Get full PDF" button
+        """
+        if self.delivery_mode == 'pdf':
+            await self.send_solution_pdf(
+                message, solution_data,
+                caption=self.answer_text(solution_data, "🎯 **SOLUTION READY**") +
+                "\n\n📄 Complete analysis in PDF above! 🧮",
+                progress=progress
             )
+            return
+        
+        if self.delivery_mode == 'on_demand':
+            # Kept in memory until the button is pressed (oldest dropped first);
+            # the solution store has it too, for other processes and after restarts
+            pdf_key = self.pdf_generator.solution_key(solution_data)
+            self.pending_pdfs[pdf_key] = solution_data
+            while len(self.pending_pdfs) > PENDING_PDF_LIMIT:
+                self.pending_pdfs.popitem(last=False)
+            await progress.finish(
+                self.answer_text(solution_data, "✅ **ANALYSIS COMPLETE!**"),
+                reply_markup=InlineKeyboardMarkup(
+                    [[InlineKeyboardButton("📄 Get full PDF", callback_data=f"pdf:{pdf_key}")]]
+                )
+            )
+            return
+        
+        await progress.finish(
+            self.answer_text(solution_data, "✅ **ANALYSIS COMPLETE!**") +
+            "\n\n⏳ Full PDF with all three strategies is on its way..."
+        )
+        # Keep a reference so the task is not garbage-collected mid-flight
+        task = asyncio.create_task(self.deliver_pdf_later(progress.message, solution_data))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+    
+    async def deliver_pdf_later(self, answer_msg, solution_data):
+        """Background delivery: build the PDF off the hot path and reply to the answer"""
+        try:
+            await self.send_solution_pdf(answer_msg, solution_data, caption="📄 Complete analysis 🧮")
+        except Exception as e:
+            logger.error(f"Error building background PDF: {e}")
+    
+    async def handle_pdf_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """"Get full PDF" button: build and send the PDF for that answer"""
+        query = update.callback_query
+        pdf_key = query.data.split(':', 1)[1]
+        solution_data = self.pending_pdfs.get(pdf_key)
+        if solution_data is None:
+            solution_data = await asyncio.get_running_loop().run_in_executor(
+                None, self.store.find_by_solution_key, pdf_key
+            )
+        if solution_data is None:
+            await query.answer("This solution has expired - please send the problem again.", show_alert=True)
+            return
+        
+        # The button stays: pressing it again re-sends the uploaded file by file_id
+        await query.answer("Sending your PDF... 📄")
+        try:
+            await self.send_solution_pdf(query.message, solution_data, caption="📄 Complete analysis 🧮")
+        except Exception as e:
+            logger.error(f"Error building on-demand PDF: {e}")
+            await query.message.reply_text("❌ Could not build the PDF. Please try again later.")
+    
+    def answer_text(self, solution_data, title):
+        """Final answer, confidence and one-sentence reason (Markdown)"""
+        return (
+            f"{title}\n\n"
+            f"✅ Answer: `{str(solution_data['final_answer']).replace('`', '')}`\n"
+            f"📊 Confidence: {solution_data['confidence']}%\n"
+            f"💡 {escape_markdown(str(solution_data['one_sentence_reason']))}"
+        )
+    
+    def instant_answer_text(self, solution_data):
+        """Reply for a SymPy-solved problem (Markdown)"""
+        return (
+            f"⚡ **INSTANT ANSWER**\n\n"
+            f"✅ Answer: `{str(solution_data['final_answer']).replace('`', '')}`\n"
+            f"💡 {escape_markdown(str(solution_data['one_sentence_reason']))}"
+        )
+    
+    async def build_pdf(self, message, solution_data, workdir):
+        """Generate the PDF in workdir in a worker thread; on LaTeX failure reply with debug info"""
+        loop = asyncio.get_running_loop()
+        # MODIFIED: Catch PDF generation errors and send debug info to Telegram
+        try:
+            with span('pdf'):
+                return await loop.run_in_executor(None, self.pdf_generator.generate, solution_data, workdir)
+        except PDFCompileError as pdf_error:
+            # Send debug info to Telegram
+            debug_msg = f"🔧 **PDF GENERATION DEBUG INFO**\n\n"
+            debug_msg += f"Error: {str(pdf_error)[:500]}\n\n"
             
-            # Send the PDF file
-            with open(pdf_path, 'rb') as pdf_file:
-                await update.message.reply_document(
-                    document=pdf_file,
-                    filename=f"calculus_solution_{update.message.message_id}.pdf",
-                    caption=f"🎯 **SOLUTION READY**\n\n"
-                            f"📊 Confidence: {solution_data['confidence']}%\n"
-                            f"✅ Answer: {solution_data['final_answer']}\n"
-                            f"💡 {solution_data['one_sentence_reason']}\n\n"
-                            f"📄 Complete analysis in PDF above! 🧮",
-                    parse_mode='Markdown'
+            # Send the .tex file that failed to compile for inspection
+            if pdf_error.tex_path and os.path.exists(pdf_error.tex_path):
+                with open(pdf_error.tex_path, 'rb') as tex_file:
+                    await message.reply_document(
+                        document=tex_file,
+                        filename='debug.tex',
+                        caption="🔍 Debug: Here's the LaTeX file that failed to compile"
+                    )
+            
+            # Errors parsed from the pdflatex log, with their source lines
+            if pdf_error.errors:
+                debug_msg += f"📄 **LaTeX Errors Found:**\n"
+                debug_msg += '\n'.join(
+                    f"l.{error['line']}: {error['message']} {error['context']}".strip()
+                    for error in pdf_error.errors[:10]  # First 10 errors
                 )
             
-            # Clean up
-            os.remove(pdf_path)
-            os.remove(temp_image.name)
-            if enhanced_image_path != temp_image.name:
-                os.remove(enhanced_image_path)
+            await message.reply_text(debug_msg)
             
+            # Re-raise to show user the error
+            raise
+    
+    async def send_solution_pdf(self, message, solution_data, caption, progress=None):
+        """
+        Send the solution PDF as a reply to message
+        A PDF Telegram already has (same solution hash) is re-sent by file_id
+        without building or uploading anything
+        """
+        solution_key = self.pdf_generator.solution_key(solution_data)
+        file_id = self.pdf_file_ids.get(solution_key)
+        if file_id is None:
+            file_id = await asyncio.get_running_loop().run_in_executor(None, self.store.file_id, solution_key)
+        if file_id is not None:
+            try:
+                await self.mark_sending(progress)
+                with span('upload'):
+                    await message.reply_document(document=file_id, caption=caption, parse_mode='Markdown')
+                METRICS.increment('pdf_file_id_resends')
+                self.remember_file_id(solution_key, file_id, persist=False)
+                return
+            except BadRequest as e:
+                # file_id no longer valid (e.g. bot token changed): upload again
+                logger.warning(f"Stale PDF file_id for {solution_key}: {e}")
+                self.pdf_file_ids.pop(solution_key, None)
+        
+        # .tex, .aux, .log and the PDF go with the workspace, on success or failure
+        with request_workspace('pdf') as workdir:
+            pdf_path = await self.build_pdf(message, solution_data, workdir)
+            await self.mark_sending(progress)
+            sent = await self.send_pdf(message, pdf_path, caption)
+        self.remember_file_id(solution_key, sent.document.file_id)
+    
+    async def mark_sending(self, progress):
+        """Final progress update before the document goes out"""
+        if progress is not None:
+            await progress.finish(
+                "✅ **ANALYSIS COMPLETE!**\n\n"
+                "Sending your solution... 📄"
+            )
+    
+    def remember_file_id(self, solution_key, file_id, persist=True):
+        """Record the file_id Telegram returned for an uploaded PDF (kept across restarts)"""
+        if persist:
+            self.store.save_file_id(solution_key, file_id)
+        self.pdf_file_ids[solution_key] = file_id
+        self.pdf_file_ids.move_to_end(solution_key)
+        while len(self.pdf_file_ids) > FILE_ID_CACHE_SIZE:
+            self.pdf_file_ids.popitem(last=False)
+    
+    async def send_pdf(self, message, pdf_path, caption):
+        """Upload the PDF as a reply to message"""
+        with open(pdf_path, 'rb') as pdf_file, span('upload'):
+            return await message.reply_document(
+                document=pdf_file,
+                filename=f"calculus_solution_{message.message_id}.pdf",
+                caption=caption,
+                parse_mode='Markdown'
+            )
+    
+    async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """List the user's recent solutions; each button re-serves one"""
+        entries = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self.store.recent(update.effective_user.id, limit=HISTORY_LIMIT)
+        )
+        if not entries:
+            await update.message.reply_text("📚 No solutions yet - send a problem to get started!")
+            return
+        
+        buttons = []
+        for entry in entries:
+            label = entry['problem_text'] or entry['final_answer'] or "Solution"
+            label = ' '.join(label.split())
+            if len(label) > 40:
+                label = label[:40] + "..."
+            day = time.strftime('%d %b', time.localtime(entry['created_at']))
+            mark = "✅" if entry['verified'] else "📝"
+            buttons.append([InlineKeyboardButton(f"{mark} {day} · {label}", callback_data=f"hist:{entry['id']}")])
+        
+        await update.message.reply_text(
+            f"📚 **YOUR LAST {len(entries)} SOLUTIONS**\n\nTap one to get it again:",
+            parse_mode='Markdown',
+            reply_markup=InlineKeyboardMarkup(buttons)
+        )
+    
+    async def handle_history_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/history button: re-serve a stored solution (by file_id when already uploaded)"""
+        query = update.callback_query
+        solution_data = await asyncio.get_running_loop().run_in_executor(
+            None, self.store.get, int(query.data.split(':', 1)[1]), update.effective_user.id
+        )
+        if solution_data is None:
+            await query.answer("This solution is no longer available.", show_alert=True)
+            return
+        
+        await query.answer()
+        if solution_data.get('source') == 'sympy':
+            await query.message.reply_text(self.instant_answer_text(solution_data), parse_mode='Markdown')
+            return
+        
+        try:
+            await self.send_solution_pdf(
+                query.message, solution_data,
+                caption=self.answer_text(solution_data, "📚 **FROM YOUR HISTORY**")
+            )
         except Exception as e:
-            logger.error(f"Error processing image: {e}")
+            logger.error(f"Error re-sending stored solution: {e}")
+            await query.message.reply_text("❌ Could not send this solution. Please try again later.")
+    
+    async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle typed problems: SymPy fast path first, text-only Gemini as fallback"""
+        text = update.message.text or ""
+        
+        if self.solver.problem_parser.parse(text) is None and not self.solver.problem_parser.looks_like_problem(text):
+            await update.message.reply_text(
+                "📸 Please send an **image** of the calculus problem,\n"
+                "or type it, e.g. `integrate x^2*e^x` or `differentiate sin(x^2)`.\n\n"
+                "Use /help for more information.",
+                parse_mode='Markdown'
+            )
+            return
+        
+        try:
+            started = time.perf_counter()
+            solution_data = await self.solver.solve_text(text, update.effective_user.id)
+            self.store.save_solution(
+                solution_data, user_id=update.effective_user.id, chat_id=update.effective_chat.id,
+                solution_key=self.pdf_generator.solution_key(solution_data),
+                timings={'solve_s': round(time.perf_counter() - started, 3)}
+            )
             
-            # Escape special characters for Telegram MarkdownV2
-            error_msg = str(e)
-            # Truncate if too long
-            if len(error_msg) > 150:
-                error_msg = error_msg[:150] + "..."
+            if solution_data.get('source') == 'sympy':
+                await update.message.reply_text(self.instant_answer_text(solution_data), parse_mode='Markdown')
+                return
             
-            # Escape special characters
-            error_msg_escaped = (error_msg
-                .replace('_', '\\_')
-                .replace('*', '\\*')
-                .replace('[', '\\[')
-                .replace(']', '\\]')
-                .replace('(', '\\(')
-                .replace(')', '\\)')
-                .replace('~', '\\~')
-                .replace('`', '\\`')
-                .replace('>', '\\>')
-                .replace('#', '\\#')
-                .replace('+', '\\+')
-                .replace('-', '\\-')
-                .replace('=', '\\=')
-                .replace('|', '\\|')
-                .replace('{', '\\{')
-                .replace('}', '\\}')
-                .replace('.', '\\.')
-                .replace('!', '\\!')
+            processing_msg = await update.message.reply_text(
+                "🔍 **ANALYSIS IN PROGRESS**\n\n"
+                "✅ Triple-strategy complete\n"
+                "⏳ Generating PDF...",
+                parse_mode='Markdown'
+            )
+            progress = ProgressReporter(
+                processing_msg, self.edit_limiter, self.stage_clock, self.pipeline_stages()[2:]
             )
+            try:
+                if self.delivery_mode == 'pdf':
+                    progress.stage('pdf')
+                await self.deliver_solution(update.message, progress, solution_data)
+            finally:
+                await progress.stop()
             
+        except Exception as e:
+            logger.error(f"Error processing typed problem: {e}")
             await update.message.reply_text(
-                f"❌ *ERROR*\n\n"
-                f"Failed to process image\\.\n\n"
-                f"Error: {error_msg_escaped}\n\n"
-                f"Please try again with a clearer image\\.",
-                parse_mode='MarkdownV2'
+                "❌ Failed to solve the typed problem. Please try again or send an image."
             )
-    
-    async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle text messages"""
-        await update.message.reply_text(
-            "📸 Please send an **image** of the calculus problem.\n\n"
-            "I can only analyze images, not text input.\n\n"
-            "Use /help for more information.",
-            parse_mode='Markdown'
-        )
+
+def application_builder(token):
+    """
+    Application builder with the bot's update concurrency: up to
+    CONCURRENT_UPDATES handlers run at once, so a typed problem waiting on
+    Gemini or a slow upload does not hold up every other chat
+    """
+    return Application.builder().token(token).concurrent_updates(int(os.getenv('CONCURRENT_UPDATES', '64')))
 
 def main():
-    """Start the bot"""
+    """Start the bot (or, with --worker, a solver worker)"""
     # Get token from environment
     TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
     
@@ -284,20 +710,47 @@ def main():
     
     # Create bot instance
     bot = CalculusBot()
+    # Workspaces a killed earlier run left behind (finished requests remove their own)
+    sweep_workspaces()
+    
+    if '--worker' in sys.argv[1:]:
+        if bot.job_queue is None:
+            logger.error("--worker needs JOB_QUEUE_URL (shared with the bot process)")
+            return
+        if isinstance(bot.job_queue, RedisJobQueue) and isinstance(bot.store, SolutionStore):
+            logger.warning("SOLUTION_DB is a local SQLite file: point it at the Redis server so the bot "
+                           "sees this worker's solutions (/history, repeated images, PDF file_ids)")
+        logger.info("🛠️ Solver worker starting...")
+        SolverWorker(bot, bot.job_queue, TOKEN).run()
+        bot.store.close()
+        return
+    
+    async def post_init(application):
+        # Polling has no HTTP server of its own: /metrics on METRICS_PORT, if set
+        application.bot_data['metrics_server'] = await start_metrics_server()
     
     # Create application
-    application = Application.builder().token(TOKEN).build()
+    application = application_builder(TOKEN).post_init(post_init).build()
     
     # Add handlers
     application.add_handler(CommandHandler("start", bot.start))
     application.add_handler(CommandHandler("help", bot.help_command))
     application.add_handler(CommandHandler("status", bot.status_command))
+    application.add_handler(CommandHandler("history", bot.history_command))
+    application.add_handler(CommandHandler("profile", bot.profile_command))
     application.add_handler(MessageHandler(filters.PHOTO, bot.handle_image))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_text))
+    application.add_handler(CallbackQueryHandler(bot.handle_pdf_request, pattern=r'^pdf:'))
+    application.add_handler(CallbackQueryHandler(bot.handle_history_request, pattern=r'^hist:'))
     
-    # Start bot
+    # Start bot: webhook behind the platform's proxy when WEBHOOK_URL is set, else long polling
     logger.info("🚀 JEE Calculus Bot starting...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if webhook_url:
+        asyncio.run(run_webhook(application, webhook_url, allowed_updates=ALLOWED_UPDATES))
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
+    bot.store.close()
 
 if __name__ == '__main__':
     main()
@@ -1,11 +1,20 @@
 import os
+import asyncio
 import google.generativeai as genai
+from google.generativeai import client as genai_client
 from PIL import Image
 import io
 import base64
 import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from knowledge_base import CALCULUS_KNOWLEDGE
 from sympy_verifier import SympyVerifier
+from problem_parser import ProblemParser
+from mcq_evaluator import MCQEvaluator
+from metrics import METRICS, span
+from gemini_usage import UsageTracker
 
 class CalculusSolver:
     def __init__(self):
@@ -37,25 +46,66 @@ class CalculusSolver:
         print(f"✅ Loaded {len(self.api_keys)} Gemini API key(s)")
         
         self.current_key_index = 0
+        # Requests and tokens per key and per user against the configured quotas
+        self.usage = UsageTracker(len(self.api_keys))
         self.verifier = SympyVerifier()
+        self.problem_parser = ProblemParser()
+        self.mcq_evaluator = MCQEvaluator(self.problem_parser)
+        
+        # Typed-problem fast path: SymPy runs in its own small pool so a
+        # runaway integral can never starve the event loop's default executor.
+        # A SymPy thread cannot be stopped, so a worker stays taken until its
+        # call really returns; new work only starts on a free worker
+        self.fast_path_timeout = float(os.getenv('FAST_PATH_TIMEOUT', '1.5'))
+        self.numeric_timeout = float(os.getenv('FAST_PATH_NUMERIC_TIMEOUT', '5'))
+        fast_path_workers = int(os.getenv('FAST_PATH_WORKERS', '2'))
+        self.fast_path_executor = ThreadPoolExecutor(max_workers=fast_path_workers, thread_name_prefix='sympy-fast')
+        self.fast_path_slots = threading.BoundedSemaphore(fast_path_workers)
+        
+        # Gemini calls block for seconds; they run in their own threads so the
+        # event loop keeps serving other chats (GEMINI_WORKERS calls at once)
+        self.gemini_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('GEMINI_WORKERS', '8')), thread_name_prefix='gemini'
+        )
+        # One model per key, each bound to its own client
+        self.models = {}
+        
+        # LRU cache of typed-problem answers, keyed by canonical problem
+        self.answer_cache = OrderedDict()
+        self.answer_cache_size = int(os.getenv('ANSWER_CACHE_SIZE', '512'))
         
         # Configure Gemini
         self.setup_gemini()
         
     def setup_gemini(self):
-        """Setup Gemini API with current key"""
-        genai.configure(api_key=self.api_keys[self.current_key_index])
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-    def rotate_api_key(self):
-        """Rotate to next API key"""
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        print(f"🔄 Rotating to API key {self.current_key_index + 1}/{len(self.api_keys)}")
-        self.setup_gemini()
+        """
+        Setup Gemini API with current key
+        genai keeps one global configuration and models pick their client up
+        lazily, on the first call - which runs in a Gemini thread, possibly
+        after another key was configured. So the client is bound here
+        """
+        model = self.models.get(self.current_key_index)
+        if model is None:
+            genai.configure(api_key=self.api_keys[self.current_key_index])
+            model = genai.GenerativeModel('gemini-2.0-flash-exp')
+            model._client = genai_client.get_default_generative_client()
+            self.models[self.current_key_index] = model
+        self.model = model
+        
+    def use_key(self, key_index):
+        """Switch to the key the usage tracker picked"""
+        if key_index != self.current_key_index:
+            self.current_key_index = key_index
+            print(f"🔄 Switching to API key {self.current_key_index + 1}/{len(self.api_keys)}")
+            self.setup_gemini()
     
-    def build_ultimate_prompt(self):
+    def build_ultimate_prompt(self, source: str = 'image'):
         """Build the triple-strategy prompt with all knowledge"""
         knowledge = CALCULUS_KNOWLEDGE
+        problem_location = (
+            "in the image" if source == 'image'
+            else "typed by the student below the instructions"
+        )
         
         prompt = f"""
 YOU ARE THE ULTIMATE JEE CALCULUS EXPERT
@@ -80,7 +130,16 @@ KNOWLEDGE BASE LOADED:
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-TASK: Analyze the calculus problem in the image using THREE DISTINCT STRATEGIES.
+TASK: Analyze the calculus problem {problem_location} using THREE DISTINCT STRATEGIES.
+
+Start your response by transcribing the problem in plain-text math
+(use ^ for powers, * for products, e.g. x^2*e^x):
+
+PROBLEM: [Problem statement exactly as given]
+(A) [Option A, if multiple choice]
+(B) [Option B]
+(C) [Option C]
+(D) [Option D]
 
 ═════════════════════════════════════════════════
 TRIPLE-STRATEGY ANALYSIS FRAMEWORK:
@@ -229,76 +288,267 @@ Begin analysis now! 🧮
 """
         return prompt
     
-    async def solve(self, image_path: str):
+    async def solve(self, image_path: str, user_id: int = None):
         """Solve calculus problem with triple-strategy approach"""
+        # Open image from path
+        image = Image.open(image_path)
+        
+        # Build prompt
+        prompt = self.build_ultimate_prompt()
+        
+        solution_data = await self.generate_solution([prompt, image], user_id)
+        with span('mcq_confirm'):
+            await self.confirm_mcq(solution_data)
+        return solution_data
+    
+    async def solve_text(self, problem_text: str, user_id: int = None):
+        """
+        Solve a typed problem
+        Tries the SymPy fast path (with cache) first and falls back to a
+        text-only Gemini call - no image, no ImageEnhancer
+        """
+        problem = self.problem_parser.parse(problem_text)
+        
+        if problem is not None:
+            key = self.problem_parser.cache_key(problem)
+            if key in self.answer_cache:
+                self.answer_cache.move_to_end(key)
+                print(f"⚡ Answer cache hit: {key[:80]}")
+                return self.answer_cache[key]
+            
+            with span('sympy_fast'):
+                fast_result = await self.solve_fast(problem)
+            if fast_result is not None:
+                self.remember_answer(key, fast_result)
+                return fast_result
+        else:
+            key = None
+        
+        prompt = self.build_ultimate_prompt(source='text')
+        contents = [prompt, f"PROBLEM:\n{problem_text}"]
+        hint = self.shortcut_hint(problem) if problem is not None else None
+        if hint:
+            contents.append(f"SHORTCUT HINT (from knowledge base): {hint}")
+        solution_data = await self.generate_solution(contents, user_id)
+        solution_data['source'] = 'gemini'
+        await self.confirm_mcq(solution_data)
+        if key is not None:
+            self.remember_answer(key, solution_data)
+        return solution_data
+    
+    def start_sympy(self, fn, *args):
+        """
+        Run fn(*args) on a free fast-path worker; None if every worker is busy
+        The slot is released when fn returns, not when the caller stops
+        waiting, so calls that outlived their timeout keep new work from
+        queueing behind them
+        """
+        if not self.fast_path_slots.acquire(blocking=False):
+            return None
+        
+        def call():
+            try:
+                return fn(*args)
+            finally:
+                self.fast_path_slots.release()
+        
+        return asyncio.get_running_loop().run_in_executor(self.fast_path_executor, call)
+    
+    async def solve_fast(self, problem):
+        """Run the SymPy fast path with a time budget; None if it cannot answer in time"""
+        work = self.start_sympy(self.verifier.solve_parsed, problem)
+        if work is None:
+            print("⏱️ SymPy fast path busy with earlier problems, falling back to Gemini")
+            return None
+        try:
+            result = await asyncio.wait_for(work, timeout=self.fast_path_timeout)
+        except asyncio.TimeoutError:
+            if problem['operation'] != 'integrate' or problem['limits'] is None:
+                print(f"⏱️ SymPy fast path exceeded {self.fast_path_timeout}s, falling back to Gemini")
+                return None
+            # Definite integral without a quick closed form: numeric quadrature instead
+            work = self.start_sympy(self.verifier.solve_parsed, problem, False)
+            if work is None:
+                return None
+            try:
+                result = await asyncio.wait_for(work, timeout=self.numeric_timeout)
+            except asyncio.TimeoutError:
+                print(f"⏱️ Numeric quadrature exceeded {self.numeric_timeout}s, falling back to Gemini")
+                return None
+            except Exception as e:
+                print(f"⚠️ Numeric quadrature failed: {e}")
+                return None
+        except Exception as e:
+            print(f"⚠️ SymPy fast path failed: {e}")
+            return None
+        
+        if result is None or not result['verified']:
+            return None
+        
+        if result['answer_text'].startswith('≈'):
+            reason = "Evaluated numerically (adaptive Gauss-Kronrod quadrature)."
+        elif result['shortcuts']:
+            reason = f"Knowledge-base shortcut ({', '.join(result['shortcuts'])}), verified with SymPy."
+        else:
+            reason = f"Computed exactly with SymPy ({problem['operation']})."
+        
+        return {
+            'source': 'sympy',
+            'problem': problem['source'],
+            'final_answer': result['answer_text'],
+            'answer': result['answer'],
+            'answer_latex': result['latex'],
+            'confidence': 100,
+            'one_sentence_reason': reason,
+        }
+    
+    async def confirm_mcq(self, solution_data):
+        """
+        Check the model's MCQ pick against a SymPy-computed answer
+        Confirms it, or corrects it when another option matches clearly
+        """
+        problem_text = solution_data.get('problem_text', '')
+        options = self.mcq_evaluator.parse_options(problem_text)
+        if not options:
+            return
+        
+        problem = solution_data.get('problem')
+        if problem is None:
+            return
+        
+        fast_result = await self.solve_fast(problem)
+        if fast_result is None:
+            return
+        
+        try:
+            check = self.mcq_evaluator.evaluate(
+                fast_result['answer'], options,
+                var=problem['variable'],
+                indefinite=problem['operation'] == 'integrate' and problem['limits'] is None,
+            )
+        except Exception as e:
+            print(f"⚠️ MCQ evaluation failed: {e}")
+            return
+        
+        if check is None:
+            return
+        
+        model_option = self.mcq_evaluator.model_choice(solution_data.get('final_answer', ''))
+        check['model_option'] = model_option
+        solution_data['mcq_check'] = check
+        
+        if check['option'] is None:
+            print(f"⚠️ MCQ check: no option matches the SymPy answer {fast_result['final_answer']}")
+        elif check['option'] == model_option:
+            print(f"✅ MCQ check confirms option {model_option} (margin {check['margin']:.3g})")
+        else:
+            print(f"🔁 MCQ check corrects option {model_option} -> {check['option']}")
+            solution_data['final_answer'] = (
+                f"Option {check['option']} (SymPy-verified; model chose {model_option or 'none'})"
+            )
+    
+    def shortcut_hint(self, problem):
+        """Knowledge-base shortcut that applies to (part of) a parsed problem"""
+        pattern_index = self.verifier.pattern_index
+        try:
+            if problem['operation'] == 'integrate' and problem['limits'] is not None:
+                shortcut = pattern_index.match_definite(problem['expression'], problem['variable'], *problem['limits'])
+                if shortcut is not None:
+                    return "; ".join(shortcut['hints'])
+            return pattern_index.hint_for(problem['expression'], problem['variable'])
+        except Exception as e:
+            print(f"⚠️ Shortcut hint failed: {e}")
+            return None
+    
+    def remember_answer(self, key: str, solution_data):
+        """Store an answer in the LRU cache"""
+        self.answer_cache[key] = solution_data
+        self.answer_cache.move_to_end(key)
+        while len(self.answer_cache) > self.answer_cache_size:
+            self.answer_cache.popitem(last=False)
+    
+    async def generate_solution(self, contents, user_id: int = None):
+        """
+        Call Gemini on the key with the most quota headroom (others on failure),
+        then parse, verify and graph the response - all off the event loop
+        """
+        loop = asyncio.get_running_loop()
         max_retries = len(self.api_keys)
         last_error = None
+        tried = set()
         
         for attempt in range(max_retries):
+            key_index = self.usage.pick_key(exclude=tried)
+            if key_index is None:
+                # Every remaining key is over quota or cooling down after a 429
+                last_error = last_error or Exception("Gemini quota used up on every key")
+                break
+            tried.add(key_index)
+            self.use_key(key_index)
+            model = self.model
             try:
-                # Open image from path
-                image = Image.open(image_path)
-                
-                # Convert image to bytes
-                img_byte_arr = io.BytesIO()
-                image.save(img_byte_arr, format='PNG', quality=98)
-                img_byte_arr = img_byte_arr.getvalue()
-                
-                # Build prompt
-                prompt = self.build_ultimate_prompt()
-                
-                # Call Gemini with image
-                response = self.model.generate_content(
-                    [prompt, image],
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.05,  # Low temperature for consistency
-                        top_p=0.95,
-                        top_k=40,
-                        max_output_tokens=8192,
-                    )
-                )
-                
-                analysis = response.text
-                
-                # Parse response
-                solution_data = self.parse_response(analysis)
-                
-                # Verify with SymPy
-                verification_result = self.verifier.verify_solution(solution_data)
-                solution_data['sympy_verification'] = verification_result
+                # Call Gemini with prompt (and image, if any)
+                try:
+                    with span('gemini'):
+                        response = await loop.run_in_executor(self.gemini_executor, lambda: model.generate_content(
+                            contents,
+                            generation_config=genai.types.GenerationConfig(
+                                temperature=0.05,  # Low temperature for consistency
+                                top_p=0.95,
+                                top_k=40,
+                                max_output_tokens=8192,
+                            )
+                        ))
+                        analysis = response.text
+                except Exception as e:
+                    self.usage.record_error(key_index, e)
+                    raise
+                tokens = self.usage.record(key_index, user_id, response, contents)
+                METRICS.increment('gemini_prompt_tokens', tokens['prompt'])
+                METRICS.increment('gemini_response_tokens', tokens['response'])
                 
-                # Generate graphs if needed
-                solution_data['graphs'] = self.verifier.generate_graphs(solution_data)
-                
-                print(f"✅ Solution generated successfully with API key {self.current_key_index + 1}")
+                solution_data = await loop.run_in_executor(None, self.analyse_response, analysis)
+                print(f"✅ Solution generated successfully with API key {key_index + 1}")
                 return solution_data
                 
             except Exception as e:
                 last_error = e
                 error_msg = str(e)
                 
-                print(f"⚠️ Error with API key {self.current_key_index + 1}: {error_msg[:100]}")
+                print(f"⚠️ Error with API key {key_index + 1}: {error_msg[:100]}")
                 
-                # Check if quota exceeded
+                # Check if quota exceeded (the tracker has benched the key; the next attempt picks another)
                 if '429' in error_msg or 'quota' in error_msg.lower() or 'exceeded' in error_msg.lower():
-                    print(f"⚠️ API key {self.current_key_index + 1} quota exceeded")
-                    if attempt < max_retries - 1:
-                        self.rotate_api_key()
-                        continue
-                else:
-                    # For other errors, try rotating once
-                    if attempt < max_retries - 1:
-                        self.rotate_api_key()
-                        continue
+                    print(f"⚠️ API key {key_index + 1} quota exceeded")
         
         # All attempts failed
         raise Exception(f"All {len(self.api_keys)} API keys exhausted or failed. Last error: {last_error}")
     
+    def analyse_response(self, analysis: str):
+        """Parse, verify and graph a Gemini response (CPU-bound; run in an executor)"""
+        # Parse response
+        with span('parse'):
+            solution_data = self.parse_response(analysis)
+            solution_data['problem'] = self.problem_parser.parse(
+                self.mcq_evaluator.strip_options(solution_data['problem_text'])
+            )
+        
+        # Verify with SymPy
+        with span('sympy_verify'):
+            verification_result = self.verifier.verify_solution(solution_data)
+        solution_data['sympy_verification'] = verification_result
+        
+        # Generate graphs if needed
+        with span('graphs'):
+            solution_data['graphs'] = self.verifier.generate_graphs(solution_data)
+        return solution_data
+    
     def parse_response(self, analysis: str):
         """Parse Gemini's response into structured data"""
         # Extract key information from the response
         solution_data = {
             'full_analysis': analysis,
+            'problem_text': self.extract_section(analysis, 'PROBLEM:', 'STRATEGY 1').replace('PROBLEM:', '', 1).strip(),
             'strategy_1': self.extract_section(analysis, 'STRATEGY 1', 'STRATEGY 2'),
             'strategy_2': self.extract_section(analysis, 'STRATEGY 2', 'STRATEGY 3'),
             'strategy_3': self.extract_section(analysis, 'STRATEGY 3', 'FINAL SYNTHESIS'),
@@ -0,0 +1,202 @@
+"""
+Gemini Usage Accounting
+Counts requests and prompt/response tokens per API key and per user from
+each response's usage metadata, as daily totals (reset at the quota day
+boundary) plus a one-minute window, checked against configured quotas. The
+key scheduler asks it for the key with the most headroom; the bot asks it
+whether there is quota left before accepting work
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+# Image parts are billed at a flat token count
+IMAGE_TOKENS = 258
+# Rough characters-per-token when a response carries no usage metadata
+CHARS_PER_TOKEN = 4
+# Back-off for a key that answered 429 without a daily-quota message (seconds)
+RATE_LIMIT_COOLDOWN = 60
+
+
+class KeyUsage:
+    def __init__(self):
+        self.day = None
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        # (time, tokens) per request in the last minute
+        self.minute = deque()
+        self.cooldown_until = 0.0
+        # Requests over the day, for the exhaustion forecast
+        self.first_request = None
+
+    def reset(self, day):
+        self.__init__()
+        self.day = day
+
+
+class UsageTracker:
+    def __init__(self, key_count: int, daily_requests: int = None, daily_tokens: int = None,
+                 minute_requests: int = None, minute_tokens: int = None):
+        """
+        Args:
+            key_count: number of API keys (addressed by index)
+            daily_requests / daily_tokens: per-key daily quotas (default from GEMINI_DAILY_REQUEST_QUOTA / GEMINI_DAILY_TOKEN_QUOTA, 0 = unlimited)
+            minute_requests / minute_tokens: per-key per-minute quotas (default from GEMINI_RPM_QUOTA / GEMINI_TPM_QUOTA, 0 = unlimited)
+        """
+        self.daily_requests = daily_requests if daily_requests is not None else int(os.getenv('GEMINI_DAILY_REQUEST_QUOTA', '0'))
+        self.daily_tokens = daily_tokens if daily_tokens is not None else int(os.getenv('GEMINI_DAILY_TOKEN_QUOTA', '0'))
+        self.minute_requests = minute_requests if minute_requests is not None else int(os.getenv('GEMINI_RPM_QUOTA', '0'))
+        self.minute_tokens = minute_tokens if minute_tokens is not None else int(os.getenv('GEMINI_TPM_QUOTA', '0'))
+        # Gemini daily quotas reset at midnight Pacific time (08:00 UTC)
+        self.reset_hour = int(os.getenv('GEMINI_QUOTA_RESET_UTC_HOUR', '8'))
+        self.keys = [KeyUsage() for _ in range(key_count)]
+        # user_id -> [requests, prompt_tokens, response_tokens] for users_day
+        self.users = {}
+        self.users_day = None
+        self.lock = threading.Lock()
+
+    def quota_day(self, now: float):
+        return (datetime.fromtimestamp(now, timezone.utc) - timedelta(hours=self.reset_hour)).date()
+
+    def next_reset(self, now: float) -> float:
+        day = self.quota_day(now) + timedelta(days=1)
+        return datetime(day.year, day.month, day.day, self.reset_hour, tzinfo=timezone.utc).timestamp()
+
+    def key(self, index: int, now: float) -> KeyUsage:
+        usage = self.keys[index]
+        day = self.quota_day(now)
+        if usage.day != day:
+            usage.reset(day)
+        while usage.minute and usage.minute[0][0] < now - 60:
+            usage.minute.popleft()
+        return usage
+
+    def record(self, index: int, user_id: Optional[int], response, contents: Iterable) -> Dict[str, int]:
+        """Account one successful request; returns the token counts used"""
+        tokens = self.token_counts(response, contents)
+        now = time.time()
+        with self.lock:
+            usage = self.key(index, now)
+            usage.requests += 1
+            usage.prompt_tokens += tokens['prompt']
+            usage.response_tokens += tokens['response']
+            usage.minute.append((now, tokens['prompt'] + tokens['response']))
+            if usage.first_request is None:
+                usage.first_request = now
+            if user_id is not None:
+                if self.users_day != usage.day:
+                    self.users, self.users_day = {}, usage.day
+                entry = self.users.setdefault(user_id, [0, 0, 0])
+                entry[0] += 1
+                entry[1] += tokens['prompt']
+                entry[2] += tokens['response']
+        return tokens
+
+    def record_error(self, index: int, error: Exception):
+        """A failed request: 429s take the key out of rotation for a minute, or for the day"""
+        message = str(error).lower()
+        now = time.time()
+        with self.lock:
+            usage = self.key(index, now)
+            usage.errors += 1
+            if '429' in message or 'quota' in message or 'exhausted' in message:
+                daily = 'per day' in message or 'perday' in message or 'daily' in message
+                usage.cooldown_until = self.next_reset(now) if daily else now + RATE_LIMIT_COOLDOWN
+
+    def token_counts(self, response, contents: Iterable) -> Dict[str, int]:
+        """Prompt/response tokens from usage_metadata, estimated from text if it is missing"""
+        metadata = getattr(response, 'usage_metadata', None)
+        if metadata is not None and getattr(metadata, 'prompt_token_count', None) is not None:
+            return {
+                'prompt': int(metadata.prompt_token_count),
+                'response': int(getattr(metadata, 'candidates_token_count', 0) or 0),
+                'estimated': 0,
+            }
+        prompt = sum(len(part) // CHARS_PER_TOKEN if isinstance(part, str) else IMAGE_TOKENS for part in contents)
+        try:
+            response_text = response.text
+        except Exception:
+            response_text = ''
+        return {'prompt': prompt, 'response': len(response_text) // CHARS_PER_TOKEN, 'estimated': 1}
+
+    def headroom(self, index: int, now: float) -> float:
+        """Fraction of the tightest quota left for a key (0 = unusable right now)"""
+        usage = self.key(index, now)
+        if usage.cooldown_until > now:
+            return 0.0
+        fractions = [1.0]
+        minute_tokens = sum(tokens for _, tokens in usage.minute)
+        for used, quota in ((usage.requests, self.daily_requests),
+                            (usage.prompt_tokens + usage.response_tokens, self.daily_tokens),
+                            (len(usage.minute), self.minute_requests),
+                            (minute_tokens, self.minute_tokens)):
+            if quota:
+                fractions.append(max(0.0, 1 - used / quota))
+        return min(fractions)
+
+    def pick_key(self, exclude: Iterable[int] = ()) -> Optional[int]:
+        """Key with the most headroom (None if every key is spent or excluded)"""
+        now = time.time()
+        with self.lock:
+            candidates = [
+                (self.headroom(index, now), -index)
+                for index in range(len(self.keys)) if index not in exclude
+            ]
+        best = max(candidates, default=None)
+        if best is None or best[0] <= 0:
+            return None
+        return -best[1]
+
+    def remaining_requests(self) -> Optional[int]:
+        """Requests left today across usable keys (None when there is no daily request quota)"""
+        if not self.daily_requests:
+            return None
+        now = time.time()
+        reset = self.next_reset(now)
+        with self.lock:
+            # A key Gemini reported out of daily quota has nothing left, whatever the count says
+            return sum(
+                max(0, self.daily_requests - self.key(index, now).requests)
+                for index in range(len(self.keys)) if self.keys[index].cooldown_until < reset
+            )
+
+    def report(self) -> List[Dict]:
+        """Per-key daily totals with an exhaustion forecast at today's request rate"""
+        now = time.time()
+        rows = []
+        with self.lock:
+            for index in range(len(self.keys)):
+                usage = self.key(index, now)
+                exhausted_in = None
+                if self.daily_requests and usage.requests and usage.first_request:
+                    rate = usage.requests / max(now - usage.first_request, 60)
+                    exhausted_in = max(0, self.daily_requests - usage.requests) / rate
+                rows.append({
+                    'key': index + 1,
+                    'requests': usage.requests,
+                    'errors': usage.errors,
+                    'prompt_tokens': usage.prompt_tokens,
+                    'response_tokens': usage.response_tokens,
+                    'request_quota': self.daily_requests,
+                    'cooling_down': usage.cooldown_until > now,
+                    'exhausted_in_s': exhausted_in,
+                })
+        return rows
+
+    def top_users(self, limit: int = 5) -> List[Dict]:
+        """Today's heaviest users by tokens"""
+        day = self.quota_day(time.time())
+        with self.lock:
+            users = self.users if self.users_day == day else {}
+            entries = [
+                {'user_id': user_id, 'requests': requests, 'prompt_tokens': prompt, 'response_tokens': response}
+                for user_id, (requests, prompt, response) in users.items()
+            ]
+        entries.sort(key=lambda entry: entry['prompt_tokens'] + entry['response_tokens'], reverse=True)
+        return entries[:limit]
@@ -0,0 +1,174 @@
+"""
+Graph Renderer
+Plots the actual extracted function, its derivative and the area under it
+using the object-oriented Figure API on the Agg canvas - no pyplot global
+state, so renders are safe to run concurrently in worker threads
+"""
+
+import hashlib
+import io
+import os
+import uuid
+from typing import Optional, Union
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from sympy import diff, lambdify, latex, srepr
+
+from adaptive_sampler import AdaptiveSampler
+
+
+class GraphRenderer:
+    def __init__(self, output_dir: str = "temp_graphs", dpi: int = None,
+                 figsize: tuple = None, cache_dir: str = None):
+        """
+        Args:
+            output_dir: where per-request files go when no explicit output is given
+            dpi / figsize: size budget (defaults from GRAPH_DPI, GRAPH_WIDTH, GRAPH_HEIGHT)
+            cache_dir: rendered-graph cache (default from GRAPH_CACHE_DIR)
+        """
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.cache_dir = cache_dir or os.getenv('GRAPH_CACHE_DIR', 'graph_cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_max_files = int(os.getenv('GRAPH_CACHE_MAX_FILES', '500'))
+        self.dpi = dpi or int(os.getenv('GRAPH_DPI', '120'))
+        self.figsize = figsize or (
+            float(os.getenv('GRAPH_WIDTH', '9')),
+            float(os.getenv('GRAPH_HEIGHT', '7')),
+        )
+        self.sampler = AdaptiveSampler()
+
+    def render(self, expr, var, limits: Optional[tuple] = None, area: Optional[float] = None,
+               output: Union[str, io.BytesIO, None] = None, fmt: str = 'png') -> Union[str, io.BytesIO]:
+        """
+        Render function / derivative / area panels for expr
+
+        Args:
+            expr, var: SymPy expression and its variable
+            limits: (lower, upper) floats for the area panel, if definite
+            area: precomputed value of the definite integral for the label
+            output: file path or BytesIO; a unique per-request path if None
+            fmt: 'png' or 'pdf'
+
+        Returns:
+            The path or buffer the figure was written to
+        """
+        func = self.compile(expr, var)
+        derivative = self.compile_derivative(expr, var, func)
+        lower_x, upper_x = self.window(limits, func, derivative)
+        x_vals, y_vals = self.sampler.sample(func, lower_x, upper_x)
+        dx_vals, dy_vals = self.sampler.sample(derivative, lower_x, upper_x)
+
+        panels = 3 if limits is not None else 2
+        fig = Figure(figsize=self.figsize, dpi=self.dpi)
+        FigureCanvasAgg(fig)
+        axes = fig.subplots(panels, 1, sharex=True)
+        fig.suptitle(f"${latex(expr)}$", fontsize=13, fontweight='bold')
+
+        self.draw_panel(axes[0], x_vals, y_vals, 'tab:blue', 'f(x)', 'Original Function')
+        self.draw_panel(axes[1], dx_vals, dy_vals, 'tab:red', "f'(x)", 'Derivative')
+
+        if limits is not None:
+            lower, upper = limits
+            self.draw_panel(axes[2], x_vals, y_vals, 'tab:blue', 'f(x)', 'Area Under Curve')
+            fill_x, fill_y = self.sampler.sample(func, lower, upper)
+            label = f"Area = {area:.6g}" if area is not None else "Area"
+            axes[2].fill_between(fill_x, 0, fill_y, where=np.isfinite(fill_y), alpha=0.3,
+                                 color='tab:blue', label=label)
+            axes[2].legend(loc='best')
+
+        axes[-1].set_xlabel(str(var), fontsize=11)
+        fig.tight_layout()
+
+        if output is None:
+            output = os.path.join(self.output_dir, f"graph_{uuid.uuid4().hex}.{fmt}")
+        # No creation date in the metadata: identical graphs give identical bytes
+        metadata = {'CreationDate': None} if fmt == 'pdf' else None
+        fig.savefig(output, format=fmt, dpi=self.dpi, bbox_inches='tight', metadata=metadata)
+        if isinstance(output, io.BytesIO):
+            output.seek(0)
+        return output
+
+    def render_cached(self, expr, var, limits: Optional[tuple] = None, area: Optional[float] = None,
+                      fmt: str = 'pdf') -> str:
+        """
+        Render to the graph cache, keyed by (expression, window, style)
+        Repeated functions return the cached file without touching matplotlib
+        """
+        path = os.path.join(self.cache_dir, f"{self.cache_key(expr, var, limits, fmt)}.{fmt}")
+        if os.path.exists(path):
+            print(f"✓ Graph cache hit: {path}")
+            return path
+
+        # Render to a private file and rename, so concurrent renders of the
+        # same graph never expose a half-written file
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self.render(expr, var, limits=limits, area=area, output=temp_path, fmt=fmt)
+        os.replace(temp_path, path)
+        self.prune_cache()
+        return path
+
+    def cache_key(self, expr, var, limits: Optional[tuple], fmt: str) -> str:
+        """Stable hash of the expression, the plotted window and the render style"""
+        style = (self.dpi, self.figsize, fmt)
+        key = f"{srepr(expr)}|{var}|{limits}|{style}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    def prune_cache(self):
+        """Keep the cache bounded: drop the least recently written files"""
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_file()]
+        if len(entries) <= self.cache_max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.cache_max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def draw_panel(self, ax, x_vals, y_vals, color, ylabel, title):
+        """One panel with the repo's usual axis styling"""
+        ax.plot(x_vals, y_vals, color=color, linewidth=1.8)
+        y_limits = self.sampler.y_limits(x_vals, y_vals)
+        if y_limits is not None:
+            ax.set_ylim(*y_limits)
+        ax.grid(True, alpha=0.3)
+        ax.axhline(y=0, color='k', linewidth=0.5)
+        ax.axvline(x=0, color='k', linewidth=0.5)
+        ax.set_ylabel(ylabel, fontsize=11)
+        ax.set_title(title, fontsize=12, fontweight='bold')
+
+    def window(self, limits: Optional[tuple], func, derivative) -> tuple:
+        """x-range: the integration limits with some padding, else around roots and extrema"""
+        if limits is None:
+            return self.sampler.auto_window(func, derivative)
+        lower, upper = limits
+        pad = max(0.25 * (upper - lower), 0.5)
+        return lower - pad, upper + pad
+
+    def compile(self, expr, var):
+        """Vectorized real-valued function; points outside the real domain become NaN gaps"""
+        func = lambdify(var, expr, modules='numpy')
+
+        def evaluate(x_vals: np.ndarray) -> np.ndarray:
+            with np.errstate(all='ignore'):
+                values = np.asarray(func(np.asarray(x_vals, dtype=float)), dtype=float)
+            values = np.broadcast_to(values, np.shape(x_vals))
+            return np.where(np.isfinite(values), values, np.nan)
+
+        return evaluate
+
+    def compile_derivative(self, expr, var, func):
+        """f'(x) symbolically when NumPy can print it, else by central differences"""
+        try:
+            return self.compile(diff(expr, var), var)
+        except Exception:
+            step = 1e-5
+
+            def central_difference(x_vals: np.ndarray) -> np.ndarray:
+                x_vals = np.asarray(x_vals, dtype=float)
+                return (func(x_vals + step) - func(x_vals - step)) / (2 * step)
+
+            return central_difference
@@ -6,18 +6,20 @@ Same enhancement as chemistry bot: Contrast +30%, Sharpness +20%, Brightness +10
 
 from PIL import Image, ImageEnhance
 import os
+import uuid
 
 class ImageEnhancer:
     def __init__(self):
         self.temp_dir = "temp_images"
         os.makedirs(self.temp_dir, exist_ok=True)
     
-    def enhance_image(self, image_path):
+    def enhance_image(self, image_path, output_dir=None):
         """
         Enhance image for better OCR by Gemini Vision
         
         Args:
             image_path: Path to original image
+            output_dir: Where to write the enhanced image (the request's workspace; default temp_images)
             
         Returns:
             Path to enhanced image
@@ -49,10 +51,8 @@ class ImageEnhancer:
             brightness_enhancer = ImageEnhance.Brightness(img)
             img = brightness_enhancer.enhance(1.1)
             
-            # Save enhanced image
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            enhanced_path = os.path.join(self.temp_dir, f"enhanced_{timestamp}.jpg")
+            # Save enhanced image (unique name, so concurrent requests never collide)
+            enhanced_path = os.path.join(output_dir or self.temp_dir, f"enhanced_{uuid.uuid4().hex}.jpg")
             
             # Save with high quality (98)
             img.save(enhanced_path, 'JPEG', quality=98, optimize=True)
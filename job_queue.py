@@ -0,0 +1,311 @@
+"""
+Durable Job Queue
+Hands image jobs from the bot front-end to `python bot.py --worker`
+processes. SQLiteJobQueue keeps the queue in a local WAL database (workers on
+the same host); RedisJobQueue uses any Redis-compatible server so workers can
+run on other hosts, and serves users round-robin from per-user lists.
+Claimed jobs carry a lease that the worker renews while it works: a job
+whose worker died is handed to another worker once the lease expires
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    user_id INTEGER,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER,
+    progress_message_id INTEGER,
+    image BLOB NOT NULL,
+    worker TEXT,
+    leased_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+"""
+
+JOB_FIELDS = ('user_id', 'chat_id', 'message_id', 'progress_message_id')
+
+
+def open_job_queue(url: str = None):
+    """
+    Queue named by url (default from JOB_QUEUE_URL); None means jobs run
+    in the bot process
+        redis://host:6379/0          -> RedisJobQueue
+        sqlite:///data/jobs.db, path -> SQLiteJobQueue
+    """
+    url = os.getenv('JOB_QUEUE_URL', '') if url is None else url
+    if not url:
+        return None
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisJobQueue(url)
+    return SQLiteJobQueue(url[len('sqlite:///'):] if url.startswith('sqlite:///') else url)
+
+
+class SQLiteJobQueue:
+    def __init__(self, path: str, lease_seconds: float = None, max_attempts: int = None):
+        """
+        Args:
+            path: SQLite file shared by the bot and its workers
+            lease_seconds: how long a claimed job stays with its worker without a renew() (default from JOB_LEASE_SECONDS)
+            max_attempts: claims before a job whose workers keep dying is failed (default from JOB_MAX_ATTEMPTS)
+        """
+        self.path = path
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lease_seconds = lease_seconds or float(os.getenv('JOB_LEASE_SECONDS', '120'))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+        self.local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """One connection per thread, in autocommit mode so claim() controls its transaction"""
+        if getattr(self.local, 'connection', None) is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.row_factory = sqlite3.Row
+            self.local.connection = connection
+        return self.local.connection
+
+    def enqueue(self, image: bytes, chat_id: int, user_id: int = None,
+                message_id: int = None, progress_message_id: int = None) -> int:
+        cursor = self.connection().execute(
+            'INSERT INTO jobs (created_at, user_id, chat_id, message_id, progress_message_id, image) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (time.time(), user_id, chat_id, message_id, progress_message_id, image),
+        )
+        return cursor.lastrowid
+
+    def position(self, job_id: int) -> int:
+        """1 for the next job to be claimed"""
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id <= ?", (job_id,),
+        ).fetchone()[0]
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """
+        Lease the oldest waiting job of a user who has nothing running
+        (one user's burst cannot occupy every worker), or None
+        """
+        connection = self.connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            # Jobs whose worker died: back in the queue, or failed after max_attempts
+            connection.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "error = 'worker lease expired' WHERE status = 'running' AND leased_until < ?",
+                (self.max_attempts, now),
+            )
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND COALESCE(user_id, -1) NOT IN "
+                "(SELECT COALESCE(user_id, -1) FROM jobs WHERE status = 'running') ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, leased_until = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + self.lease_seconds, row['id']),
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        job = {field: row[field] for field in JOB_FIELDS}
+        job.update(id=row['id'], image=bytes(row['image']), attempts=row['attempts'] + 1)
+        return job
+
+    def renew(self, job_id: int, worker: str) -> bool:
+        """Extend the lease of a job this worker still holds (False: it was handed to another)"""
+        cursor = self.connection().execute(
+            "UPDATE jobs SET leased_until = ? WHERE id = ? AND status = 'running' AND worker = ?",
+            (time.time() + self.lease_seconds, job_id, worker),
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: int):
+        # The image is not needed once the solution is delivered
+        self.connection().execute(
+            "UPDATE jobs SET status = 'done', image = x'' WHERE id = ?", (job_id,),
+        )
+
+    def fail(self, job_id: int, error: str):
+        self.connection().execute(
+            "UPDATE jobs SET status = 'failed', image = x'', error = ? WHERE id = ?", (error[:1000], job_id),
+        )
+
+
+class RedisJobQueue:
+    def __init__(self, url: str, lease_seconds: float = None, max_attempts: int = None, client=None):
+        """
+        Args:
+            url: Redis-compatible server (redis://host:port/db)
+            lease_seconds / max_attempts: as for SQLiteJobQueue
+            client: an already-connected client exposing the same commands (e.g. a local stand-in)
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("JOB_QUEUE_URL points at Redis - install the 'redis' package") from None
+            client = redis.Redis.from_url(url)
+        self.redis = client
+        self.prefix = os.getenv('JOB_QUEUE_PREFIX', 'calculus_bot')
+        self.lease_seconds = lease_seconds or float(os.getenv('JOB_LEASE_SECONDS', '120'))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+
+    def key(self, *parts) -> str:
+        return ':'.join((self.prefix,) + tuple(str(part) for part in parts))
+
+    @staticmethod
+    def member(user_id) -> str:
+        """Rotation entry of a user (jobs without one share a single entry)"""
+        return '-' if user_id is None else str(int(user_id))
+
+    def enqueue(self, image: bytes, chat_id: int, user_id: int = None,
+                message_id: int = None, progress_message_id: int = None) -> int:
+        job_id = self.redis.incr(self.key('next_id'))
+        fields = dict(zip(JOB_FIELDS, (user_id, chat_id, message_id, progress_message_id)))
+        mapping = {field: value for field, value in fields.items() if value is not None}
+        mapping.update(image=image, attempts=0)
+        self.redis.hset(self.key('job', job_id), mapping=mapping)
+        # Each user's jobs wait in their own list: pushed on the left, claimed from the right
+        user = self.member(user_id)
+        self.redis.lpush(self.key('queued', user), job_id)
+        self.wake(user)
+        return job_id
+
+    def wake(self, user: str):
+        """Put a user with waiting jobs in the rotation, at the turn they last had"""
+        served = self.redis.hget(self.key('served'), user)
+        self.redis.zadd(self.key('users'), {user: float(served or 0)}, nx=True)
+
+    def forget(self, user: str):
+        """Take a user whose list ran empty out of the rotation"""
+        self.redis.zrem(self.key('users'), user)
+        # A job enqueued in between finds the user still in the rotation or is seen here
+        if self.redis.llen(self.key('queued', user)):
+            self.wake(user)
+
+    def rotation(self):
+        """Users with waiting jobs, least recently served first"""
+        return [value.decode() if isinstance(value, bytes) else value
+                for value in self.redis.zrange(self.key('users'), 0, -1)]
+
+    def position(self, job_id: int) -> int:
+        """1 for the next job to be claimed (round-robin order, ignoring running jobs)"""
+        user = self.member(self.job_user(job_id))
+        queued = [int(value) for value in self.redis.lrange(self.key('queued', user), 0, -1)]
+        if job_id not in queued:
+            return 0
+        depth = len(queued) - queued.index(job_id)
+        position = 0
+        ahead = True
+        for other in self.rotation():
+            if other == user:
+                ahead = False
+                position += depth
+            else:
+                position += min(self.redis.llen(self.key('queued', other)), depth if ahead else depth - 1)
+        return position
+
+    def job_user(self, job_id: int) -> Optional[int]:
+        user_id = self.redis.hget(self.key('job', job_id), 'user_id')
+        return None if user_id is None else int(user_id)
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """
+        Lease the oldest job of the least recently served user who has
+        nothing running (round-robin across users), or None
+        """
+        self.requeue_expired()
+        for user in self.rotation():
+            # The user's running marker: SET NX lets exactly one worker through;
+            # it expires with the lease if that worker dies before recording the job
+            active = self.key('active', user)
+            if not self.redis.set(active, worker, nx=True, ex=self.lease_ttl()):
+                continue
+            job_id = self.redis.rpoplpush(self.key('queued', user), self.key('running'))
+            if job_id is None:
+                self.redis.delete(active)
+                self.forget(user)
+                continue
+            self.redis.set(active, int(job_id), ex=self.lease_ttl())
+            served = self.redis.incr(self.key('served_count'))
+            self.redis.hset(self.key('served'), user, served)
+            self.redis.zadd(self.key('users'), {user: float(served)}, xx=True)
+            if not self.redis.llen(self.key('queued', user)):
+                self.forget(user)
+            return self.lease(int(job_id), worker)
+        return None
+
+    def lease_ttl(self) -> int:
+        """Lifetime of a running marker (whole seconds, as Redis wants)"""
+        return max(1, math.ceil(self.lease_seconds))
+
+    def release(self, user: str, job_id: int):
+        """Clear the user's running marker if it is this job's"""
+        active = self.key('active', user)
+        marker = self.redis.get(active)
+        if marker is not None and marker.decode() == str(job_id):
+            self.redis.delete(active)
+
+    def lease(self, job_id: int, worker: str) -> Dict:
+        job_key = self.key('job', job_id)
+        attempts = self.redis.hincrby(job_key, 'attempts', 1)
+        self.redis.hset(job_key, mapping={'worker': worker, 'leased_until': time.time() + self.lease_seconds})
+        data = self.redis.hgetall(job_key)
+        job = {
+            field: int(data[field.encode()]) if field.encode() in data else None
+            for field in JOB_FIELDS
+        }
+        job.update(id=job_id, image=data[b'image'], attempts=attempts)
+        return job
+
+    def renew(self, job_id: int, worker: str) -> bool:
+        """Extend the lease of a job this worker still holds (False: it was handed to another)"""
+        job_key = self.key('job', job_id)
+        holder = self.redis.hget(job_key, 'worker')
+        if holder is None or holder.decode() != worker:
+            return False
+        self.redis.hset(job_key, 'leased_until', time.time() + self.lease_seconds)
+        self.redis.expire(self.key('active', self.member(self.job_user(job_id))), self.lease_ttl())
+        return True
+
+    def requeue_expired(self):
+        """Jobs whose worker died go back to the front of their user's list, or are dropped after max_attempts"""
+        now = time.time()
+        for job_id in self.redis.lrange(self.key('running'), 0, -1):
+            job_key = self.key('job', int(job_id))
+            leased_until, attempts, user_id = self.redis.hmget(job_key, 'leased_until', 'attempts', 'user_id')
+            user = self.member(None if user_id is None else int(user_id))
+            if leased_until is None or float(leased_until) >= now:
+                continue
+            if self.redis.lrem(self.key('running'), 1, job_id):
+                self.release(user, int(job_id))
+                if int(attempts or 0) >= self.max_attempts:
+                    self.redis.delete(job_key)
+                else:
+                    self.redis.rpush(self.key('queued', user), job_id)
+                    self.wake(user)
+
+    def complete(self, job_id: int):
+        self.release(self.member(self.job_user(job_id)), job_id)
+        self.redis.lrem(self.key('running'), 1, job_id)
+        self.redis.delete(self.key('job', job_id))
+
+    def fail(self, job_id: int, error: str):
+        self.complete(job_id)
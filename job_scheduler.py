@@ -0,0 +1,217 @@
+"""
+Job Scheduler
+Admission control in front of the solving pipeline: a global cap on jobs in
+flight, round-robin across users so one busy chat cannot starve the others,
+a per-user in-flight limit and a bounded queue that refuses new work when
+full. Waiting jobs are told their position and an ETA computed from measured
+job durations
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# ETA before any job has finished (seconds; the bot advertises 3-8 minutes)
+DEFAULT_JOB_SECONDS = 300
+# Weight of the newest duration in the moving average
+DURATION_SMOOTHING = 0.2
+# Users whose last turn is remembered for the rotation (idle ones are dropped beyond this)
+LAST_SERVED_LIMIT = 10000
+
+
+class QueueFullError(Exception):
+    """The scheduler cannot take another job (global queue or the user's share is full)"""
+
+
+class Job:
+    def __init__(self, user_id: int, run: Callable[[], Awaitable],
+                 on_position: Optional[Callable[[int, float], Awaitable]] = None):
+        self.user_id = user_id
+        self.run = run
+        self.on_position = on_position
+        self.future = asyncio.get_running_loop().create_future()
+        self.position = None
+        self.notify_task = None
+        self.submitted = time.monotonic()
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class JobScheduler:
+    def __init__(self, max_concurrent: int = None, per_user_limit: int = None,
+                 max_queued: int = None, per_user_queued: int = None):
+        """
+        Args:
+            max_concurrent: jobs running at once (default from JOB_CONCURRENCY)
+            per_user_limit: jobs one user may have running (default from JOB_PER_USER_LIMIT)
+            max_queued: waiting jobs before new ones are refused (default from JOB_QUEUE_LIMIT)
+            per_user_queued: waiting jobs one user may have (default from JOB_USER_QUEUE_LIMIT)
+        """
+        self.max_concurrent = max_concurrent or int(os.getenv('JOB_CONCURRENCY', '4'))
+        self.per_user_limit = per_user_limit or int(os.getenv('JOB_PER_USER_LIMIT', '1'))
+        self.max_queued = max_queued or int(os.getenv('JOB_QUEUE_LIMIT', '200'))
+        self.per_user_queued = per_user_queued or int(os.getenv('JOB_USER_QUEUE_LIMIT', '3'))
+
+        # user_id -> deque of waiting jobs, in arrival order
+        self.queues = OrderedDict()
+        # user_id -> sequence number of their latest started job; the user
+        # served longest ago goes next (round-robin, even for a user whose
+        # queue emptied and refilled while their job ran)
+        self.last_served = {}
+        self.started = 0
+        self.running = {}
+        self.active = 0
+        self.queued = 0
+        self.job_seconds = None
+        self.tasks = set()
+
+    def submit(self, user_id: int, run: Callable[[], Awaitable],
+               on_position: Optional[Callable[[int, float], Awaitable]] = None) -> Job:
+        """
+        Queue run() for user_id and return the Job (await it for run's result)
+        on_position(position, eta_seconds) is called while the job waits,
+        whenever its place in the queue changes
+
+        Raises:
+            QueueFullError: the queue or the user's share of it is full
+        """
+        if self.queued >= self.max_queued:
+            raise QueueFullError(f"{self.queued} jobs already waiting")
+        if len(self.queues.get(user_id, ())) >= self.per_user_queued:
+            raise QueueFullError(f"user {user_id} already has {self.per_user_queued} jobs waiting")
+
+        job = Job(user_id, run, on_position)
+        self.queues.setdefault(user_id, deque()).append(job)
+        self.queued += 1
+        self.dispatch()
+        return job
+
+    def dispatch(self):
+        """Start waiting jobs while there is capacity, then refresh queue positions"""
+        while self.active < self.max_concurrent:
+            job = self.next_job()
+            if job is None:
+                break
+            self.start(job)
+        self.notify_positions()
+
+    def rotation(self):
+        """User ids with waiting jobs, least recently served first"""
+        return sorted(self.queues, key=lambda user_id: self.last_served.get(user_id, -1))
+
+    def next_job(self) -> Optional[Job]:
+        """First user in the rotation with a waiting job and room to run it"""
+        for user_id in self.rotation():
+            if self.running.get(user_id, 0) < self.per_user_limit:
+                waiting = self.queues[user_id]
+                job = waiting.popleft()
+                self.queued -= 1
+                if not waiting:
+                    del self.queues[user_id]
+                self.last_served[user_id] = self.started
+                self.started += 1
+                if len(self.last_served) > LAST_SERVED_LIMIT:
+                    self.forget_idle_users()
+                return job
+        return None
+
+    def forget_idle_users(self):
+        """Drop the older half of the users with nothing running or waiting (served long ago)"""
+        idle = sorted(
+            (sequence, user_id) for user_id, sequence in self.last_served.items()
+            if user_id not in self.queues and user_id not in self.running
+        )
+        for _, user_id in idle[:len(idle) // 2 + 1]:
+            del self.last_served[user_id]
+
+    def start(self, job: Job):
+        self.active += 1
+        self.running[job.user_id] = self.running.get(job.user_id, 0) + 1
+        task = asyncio.create_task(self.execute(job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def execute(self, job: Job):
+        # A position message still being sent must land before the job's own messages
+        if job.notify_task is not None:
+            await asyncio.gather(job.notify_task, return_exceptions=True)
+        started = time.monotonic()
+        METRICS.observe('queue_wait', started - job.submitted)
+        try:
+            result = await job.run()
+        except BaseException as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            job.future.set_result(result)
+        finally:
+            self.record_duration(time.monotonic() - started)
+            self.active -= 1
+            self.running[job.user_id] -= 1
+            if not self.running[job.user_id]:
+                del self.running[job.user_id]
+            self.dispatch()
+
+    async def join(self):
+        """Wait until no job is running or waiting (shutdown, benchmarks)"""
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
+
+    def record_duration(self, seconds: float):
+        if self.job_seconds is None:
+            self.job_seconds = seconds
+        else:
+            self.job_seconds += DURATION_SMOOTHING * (seconds - self.job_seconds)
+
+    def waiting_order(self):
+        """Waiting jobs in the order round-robin will start them (ignoring per-user limits)"""
+        queues = [list(self.queues[user_id]) for user_id in self.rotation()]
+        for depth in range(max(map(len, queues), default=0)):
+            for waiting in queues:
+                if depth < len(waiting):
+                    yield waiting[depth]
+
+    def eta(self, position: int) -> float:
+        """Seconds until the job at this queue position finishes"""
+        job_seconds = self.job_seconds or DEFAULT_JOB_SECONDS
+        return math.ceil(position / self.max_concurrent) * job_seconds + job_seconds
+
+    def notify_positions(self):
+        for position, job in enumerate(self.waiting_order(), start=1):
+            if job.on_position is None or job.position == position:
+                continue
+            job.position = position
+            # One message update at a time per job; the newest position wins
+            previous = job.notify_task
+            job.notify_task = asyncio.create_task(
+                self.notify(job, previous, position, self.eta(position))
+            )
+
+    async def notify(self, job: Job, previous, position: int, eta_seconds: float):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        if job.position != position:
+            return
+        try:
+            await job.on_position(position, eta_seconds)
+        except Exception as e:
+            logger.warning(f"Queue position update failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'running': self.active,
+            'queued': self.queued,
+            'max_concurrent': self.max_concurrent,
+            'avg_job_seconds': self.job_seconds,
+        }
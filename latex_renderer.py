@@ -0,0 +1,269 @@
+"""
+Math-Aware LaTeX Renderer
+Splits model output into prose and math: LaTeX math the model already wrote
+($...$, $$...$$, \\(...\\), \\[...\\]) is kept when it is safe to compile,
+plain-text formulas (x^2*e^x, sin(x)/(1+cos(x))) go through the SymPy parser
+and latex(), and everything else is escaped as prose. Rendered fragments are
+cached by content hash
+"""
+
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from sympy import latex
+
+from problem_parser import ProblemParser
+
+# Math the model wrote as LaTeX; display forms first so $$ is not read as two $
+LATEX_MATH_RE = re.compile(
+    r'\$\$(?P<display>.+?)\$\$'
+    r'|\\\[(?P<display_bracket>.+?)\\\]'
+    r'|\$(?P<inline>[^$\n]+?)\$'
+    r'|\\\((?P<inline_paren>.+?)\\\)',
+    re.DOTALL,
+)
+
+# Plain-text formula candidates: runs of math characters with at least one operator
+MATH_CHARS = r"A-Za-z0-9.()^*/+\-|²³ˣⁿ−×·π "
+PLAIN_MATH_RE = re.compile(rf"[{MATH_CHARS}]*[\^*/²³ˣⁿ×·][{MATH_CHARS}]*")
+
+# LaTeX math from the model is compiled only if every command in it is on
+# these lists; anything else (\input, \write18, \InputIfFileExists, \def,
+# \catcode, ...) sends the whole span to the prose escaper instead
+ALLOWED_MACROS = {
+    # structure and spacing
+    'frac', 'dfrac', 'tfrac', 'sqrt', 'left', 'right', 'big', 'Big', 'bigg', 'Bigg',
+    'quad', 'qquad', 'displaystyle', 'textstyle', 'limits', 'begin', 'end',
+    'text', 'mathrm', 'mathbf', 'mathit', 'mathbb', 'mathcal', 'operatorname', 'boxed',
+    'overline', 'underline', 'hat', 'bar', 'vec', 'dot', 'ddot', 'tilde', 'binom',
+    # operators and functions
+    'int', 'iint', 'oint', 'sum', 'prod', 'lim', 'sin', 'cos', 'tan', 'cot', 'sec', 'csc',
+    'arcsin', 'arccos', 'arctan', 'sinh', 'cosh', 'tanh', 'log', 'ln', 'exp', 'max', 'min',
+    'partial', 'nabla', 'infty', 'prime', 'circ', 'degree',
+    # relations and symbols
+    'cdot', 'times', 'div', 'pm', 'mp', 'leq', 'geq', 'le', 'ge', 'neq', 'ne', 'approx',
+    'equiv', 'sim', 'propto', 'to', 'rightarrow', 'leftarrow', 'Rightarrow', 'Leftarrow',
+    'Leftrightarrow', 'implies', 'iff', 'in', 'notin', 'subset', 'subseteq', 'cup', 'cap',
+    'forall', 'exists', 'mid', 'therefore', 'because', 'cdots', 'ldots', 'dots', 'vdots',
+    'lfloor', 'rfloor', 'lceil', 'rceil', 'langle', 'rangle', 'vert', 'Vert', 'lvert',
+    'rvert', 'lbrace', 'rbrace',
+    # Greek
+    'alpha', 'beta', 'gamma', 'delta', 'epsilon', 'varepsilon', 'zeta', 'eta', 'theta',
+    'vartheta', 'iota', 'kappa', 'lambda', 'mu', 'nu', 'xi', 'pi', 'rho', 'sigma', 'tau',
+    'upsilon', 'phi', 'varphi', 'chi', 'psi', 'omega', 'Gamma', 'Delta', 'Theta', 'Lambda',
+    'Xi', 'Pi', 'Sigma', 'Phi', 'Psi', 'Omega',
+}
+ALLOWED_ENVIRONMENTS = {'cases', 'aligned', 'array', 'matrix', 'pmatrix', 'bmatrix', 'vmatrix', 'gathered', 'split'}
+# Control symbols: spacing, line breaks, \left. and escaped characters
+ALLOWED_SYMBOLS = set(',;:!{}|\\ .%&_#')
+
+# \name, or a single non-letter control symbol
+CONTROL_SEQUENCE_RE = re.compile(r'\\(?:([A-Za-z]+)|(.))', re.DOTALL)
+ENVIRONMENT_RE = re.compile(r'\\(?:begin|end)\s*\{([^{}]*)\}')
+
+# Words allowed inside a plain-text formula; any other word means it is prose
+FUNCTION_NAMES = {
+    'sin', 'cos', 'tan', 'cot', 'sec', 'csc', 'cosec', 'log', 'ln', 'exp', 'sqrt',
+    'asin', 'acos', 'atan', 'sinh', 'cosh', 'tanh', 'pi', 'abs',
+}
+
+# Unicode the model types inside LaTeX math; anything else non-ASCII is not kept as math
+MATH_UNICODE = str.maketrans({
+    '−': '-', '×': r'\times ', '·': r'\cdot ', '÷': r'\div ', '±': r'\pm ',
+    '≤': r'\leq ', '≥': r'\geq ', '≠': r'\neq ', '≈': r'\approx ', '∞': r'\infty ',
+    'π': r'\pi ', '∫': r'\int ', '√': r'\sqrt ', '²': '^2', '³': '^3',
+    '→': r'\to ', '⟹': r'\implies ', '⇒': r'\Rightarrow ', '°': r'^\circ ',
+})
+
+# An English word (two or more ASCII letters)
+WORD_RE = re.compile(r'[A-Za-z]{2,}')
+
+# Option labels "(A)" and single-letter calls "f(x)" (SymPy would read f*x) stay prose
+OPTION_LABEL_RE = re.compile(r'\(?[A-D]\)')
+FUNCTION_CALL_RE = re.compile(r'(?<![A-Za-z])[fghFGHy]\(')
+
+DISPLAY_REPLACEMENTS = str.maketrans({
+    '²': '^2', '³': '^3', 'ˣ': '^x', 'ⁿ': '^n', '−': '-', '×': '*', '·': '*', 'π': 'pi',
+})
+
+# Trailing differential: "x^2 e^x dx" renders as x^{2} e^{x} \, dx
+DIFFERENTIAL_RE = re.compile(r'\s+d([a-z])$')
+
+# d/dx, dy/dx, d^2y/dx^2 (and d2y/dx2) are derivative notation, not quotients
+DERIVATIVE_RE = re.compile(r'd(?:\^?(?P<order>\d))?(?P<function>[a-z])?/d(?P<var>[a-z])(?:\^?\d)?')
+
+# Letter runs in a token; outside function names, two or more letters are words
+LETTERS_RE = re.compile(r'[A-Za-z]+')
+
+# Dangling at either end of a candidate run ("x^2 e^x - " before a ∫)
+OPERATORS = ' +-−*/×·'
+
+MAX_FORMULA_LENGTH = 160
+
+
+class LatexRenderer:
+    def __init__(self, escape: Callable[[str], str], parser: ProblemParser = None, cache_size: int = None):
+        """
+        Args:
+            escape: prose escaper (PDFGenerator.escape_for_latex)
+            parser: typed-math parser used for plain-text formulas
+            cache_size: rendered fragments kept (default from LATEX_FRAGMENT_CACHE_SIZE)
+        """
+        self.escape = escape
+        self.parser = parser or ProblemParser()
+        self.cache_size = cache_size or int(os.getenv('LATEX_FRAGMENT_CACHE_SIZE', '4096'))
+        self.fragments = OrderedDict()
+
+    def render(self, text: str) -> str:
+        """Model text to LaTeX: escaped prose with typeset math"""
+        if not text:
+            return ""
+        return self.cached(('text', text), lambda: ''.join(
+            self.render_latex_math(content, display) if kind == 'latex' else self.render_prose(content)
+            for kind, content, display in self.segment(text)
+        ))
+
+    def segment(self, text: str) -> List[Tuple[str, str, bool]]:
+        """Split into ('prose', text, False) and ('latex', math, display) pieces"""
+        segments = []
+        last = 0
+        for match in LATEX_MATH_RE.finditer(text):
+            math = next(group for group in match.groups() if group is not None).translate(MATH_UNICODE)
+            display = match.group('display') is not None or match.group('display_bracket') is not None
+            if not self.is_safe_latex(math):
+                continue
+            if match.start() > last:
+                segments.append(('prose', text[last:match.start()], False))
+            segments.append(('latex', math.strip(), display))
+            last = match.end()
+        if last < len(text):
+            segments.append(('prose', text[last:], False))
+        return segments
+
+    def is_safe_latex(self, math: str) -> bool:
+        """Balanced braces, no stray dollars and only allowlisted commands and environments"""
+        depth = 0
+        for char in math.replace(r'\{', '').replace(r'\}', ''):
+            depth += (char == '{') - (char == '}')
+            if depth < 0:
+                return False
+        # ^^5c is TeX's hex notation for a backslash; it would hide commands from the scan
+        if depth != 0 or '$' in math or '^^' in math or not math.isascii():
+            return False
+        for name, symbol in CONTROL_SEQUENCE_RE.findall(math):
+            if name not in ALLOWED_MACROS if name else symbol not in ALLOWED_SYMBOLS:
+                return False
+        return all(environment in ALLOWED_ENVIRONMENTS for environment in ENVIRONMENT_RE.findall(math))
+
+    def render_latex_math(self, math: str, display: bool) -> str:
+        math = ' '.join(math.split())
+        return f"\\[ {math} \\]" if display else f"${math}$"
+
+    def render_prose(self, text: str) -> str:
+        """Escape prose, typesetting the plain-text formulas inside it"""
+        parts = []
+        last = 0
+        for start, end, formula in self.find_formulas(text):
+            rendered = self.render_formula(formula)
+            if rendered is None:
+                continue
+            parts.append(self.escape(text[last:start]))
+            parts.append(rendered)
+            last = end
+        parts.append(self.escape(text[last:]))
+        return ''.join(parts)
+
+    def find_formulas(self, text: str):
+        """
+        Yield (start, end, formula) for plain-text formulas: candidate runs
+        are split at English words, and the pieces that still contain an
+        operator and a variable are kept
+        """
+        for match in PLAIN_MATH_RE.finditer(text):
+            position = match.start()
+            group_start, group = None, []
+            for token in match.group(0).split(' ') + ['']:
+                derivative = DERIVATIVE_RE.search(token)
+                if derivative and derivative.group(0) == token.strip('()'):
+                    # Its own formula: never a quotient of whatever stands next to it
+                    if group:
+                        yield from self.clean_formula(group_start, ' '.join(group))
+                        group_start, group = None, []
+                    yield position + derivative.start(), position + derivative.end(), derivative.group(0)
+                elif token and not self.is_prose_token(token):
+                    if group_start is None:
+                        group_start = position
+                    group.append(token)
+                elif group:
+                    yield from self.clean_formula(group_start, ' '.join(group))
+                    group_start, group = None, []
+                position += len(token) + 1
+
+    def clean_formula(self, start: int, formula: str):
+        """Trim dangling operators; keep it if it still looks like math"""
+        stripped = formula.lstrip(OPERATORS)
+        start += len(formula) - len(stripped)
+        formula = stripped.rstrip(OPERATORS)
+        if (formula and PLAIN_MATH_RE.fullmatch(formula) and len(formula) <= MAX_FORMULA_LENGTH
+                and (re.search('[A-Za-zπ]', formula) or '^' in formula)
+                and not FUNCTION_CALL_RE.search(formula)):
+            yield start, start + len(formula), formula
+
+    def is_prose_token(self, token: str) -> bool:
+        """
+        A word that is not a function name (single letters are variables), an
+        option label (A), or a slash between words (and/or, km/h, /usr/bin):
+        a slash only becomes a fraction between math operands
+        """
+        word = token.strip('().,')
+        if OPTION_LABEL_RE.fullmatch(token):
+            return True
+        if '/' in word:
+            return any(len(letters) > 1 and letters.lower() not in FUNCTION_NAMES
+                       for letters in LETTERS_RE.findall(word))
+        return bool(WORD_RE.fullmatch(word)) and word.lower() not in FUNCTION_NAMES
+
+    def render_formula(self, formula: str) -> Optional[str]:
+        """Plain-text formula to $latex$ via SymPy; None if it does not parse"""
+        def convert():
+            derivative = DERIVATIVE_RE.fullmatch(formula)
+            if derivative:
+                return self.render_derivative(derivative)
+            source = formula.translate(DISPLAY_REPLACEMENTS)
+            differential = DIFFERENTIAL_RE.search(source)
+            if differential:
+                source = source[:differential.start()]
+            if source.count('(') != source.count(')'):
+                return None
+            try:
+                expr = self.parser.parse_expression(source, evaluate=False)
+                rendered = latex(expr, order='none', ln_notation=True)
+            except Exception:
+                return None
+            if differential:
+                rendered += f" \\, d{differential.group(1)}"
+            return f"${rendered}$"
+
+        return self.cached(('formula', formula), convert)
+
+    def render_derivative(self, match) -> str:
+        """dy/dx -> $\\frac{dy}{dx}$, d^2y/dx^2 -> $\\frac{d^{2}y}{dx^{2}}$"""
+        order, function, var = match.group('order'), match.group('function') or '', match.group('var')
+        if order:
+            return f"$\\frac{{d^{{{order}}}{function}}}{{d{var}^{{{order}}}}}$"
+        return f"$\\frac{{d{function}}}{{d{var}}}$"
+
+    def cached(self, key: tuple, build: Callable[[], Optional[str]]) -> Optional[str]:
+        """LRU fragment cache keyed by content hash"""
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        if digest in self.fragments:
+            self.fragments.move_to_end(digest)
+            return self.fragments[digest]
+        value = build()
+        self.fragments[digest] = value
+        if len(self.fragments) > self.cache_size:
+            self.fragments.popitem(last=False)
+        return value
@@ -0,0 +1,244 @@
+"""
+Pure-Python PDF Writer
+Lays out the solution sections (three strategies, final answer, confidence,
+reason, graphs) on A4 pages with matplotlib text and mathtext and writes
+them with the PDF backend - in-process, no TeX installation needed
+"""
+
+import re
+import textwrap
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import matplotlib.image as mpimg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+from matplotlib.mathtext import MathTextParser
+
+# Inline math the way Gemini writes it: $...$ (not $$...$$ display blocks)
+MATH_RE = re.compile(r'(?<!\\)\$(?!\$)(.+?)(?<!\\)\$')
+# Words for line filling; inline math segments are never broken
+TOKEN_RE = re.compile(r'(?<!\\)\$(?!\$).+?(?<!\\)\$|\S+')
+
+# Section colours, same RGB values as the LaTeX template
+COLORS = {
+    'cengage': (0 / 255, 102 / 255, 204 / 255),
+    'blackbook': (204 / 255, 0 / 255, 102 / 255),
+    'olympiad': (102 / 255, 51 / 255, 153 / 255),
+    'text': (0, 0, 0),
+}
+
+SECTIONS = [
+    ('strategy_1', 'Strategy 1: Cengage Method', 'Systematic Approach', 'cengage'),
+    ('strategy_2', 'Strategy 2: Black Book Shortcuts', 'Quick Method', 'blackbook'),
+    ('strategy_3', 'Strategy 3: Olympiad Insights', 'Elegant Solution', 'olympiad'),
+]
+
+
+class MathtextPDFWriter:
+    def __init__(self, page_size: Tuple[float, float] = (8.27, 11.69), margin: float = 1.0,
+                 font_size: float = 10, line_spacing: float = 1.45):
+        """
+        Args:
+            page_size: (width, height) in inches, A4 by default
+            margin: page margin in inches (the LaTeX template uses 1in)
+            font_size / line_spacing: body text size in points and line height factor
+        """
+        self.page_width, self.page_height = page_size
+        self.margin = margin
+        self.font_size = font_size
+        self.line_spacing = line_spacing
+        self.parser = MathTextParser('path')
+
+    def supports(self, solution_data: Dict) -> bool:
+        """
+        True if every inline math segment parses with mathtext and every graph
+        is a raster image; anything else needs the pdflatex backend
+        """
+        for path in solution_data.get('graphs', []):
+            if not path.lower().endswith('.png'):
+                return False
+        for key in ('strategy_1', 'strategy_2', 'strategy_3', 'final_answer', 'one_sentence_reason'):
+            for segment in MATH_RE.findall(str(solution_data.get(key, ''))):
+                if not self.math_ok(segment):
+                    return False
+        return True
+
+    def math_ok(self, segment: str) -> bool:
+        """Can mathtext render $segment$?"""
+        try:
+            self.parser.parse(f"${segment}$", dpi=72)
+            return True
+        except Exception:
+            return False
+
+    def write(self, solution_data: Dict, pdf_path: str, verbatim_math: bool = False) -> str:
+        """
+        Render the solution to pdf_path
+
+        Args:
+            verbatim_math: print $...$ segments as typed instead of as math
+                (used when mathtext cannot parse them and no TeX is available)
+        """
+        blocks = self.build_blocks(solution_data)
+
+        # No creation date: identical solutions give identical bytes
+        with PdfPages(pdf_path, metadata={'CreationDate': None}) as pdf:
+            # verbatim_math is passed down, not stored: one writer serves concurrent requests
+            for page in self.paginate(blocks, verbatim_math):
+                fig = Figure(figsize=(self.page_width, self.page_height))
+                for draw in page:
+                    draw(fig)
+                pdf.savefig(fig)
+        return pdf_path
+
+    def build_blocks(self, solution_data: Dict) -> List[Dict]:
+        """The document as a flat list of blocks: text lines, spacing and images"""
+        blocks = [
+            self.line('JEE Calculus Solution', size=17, weight='bold', align='center'),
+            self.line('Ultimate Calculus Bot', size=12, align='center'),
+            self.line(datetime.now().strftime('%B %d, %Y').replace(' 0', ' '), size=12, align='center'),
+            self.space(0.3),
+        ]
+
+        for number, (key, title, subtitle, color) in enumerate(SECTIONS, 1):
+            blocks += [
+                self.line(f"{number}   {title}", size=14, weight='bold'),
+                self.space(0.1),
+                self.line(subtitle, weight='bold', color=color),
+                self.space(0.1),
+            ]
+            blocks += self.paragraphs(solution_data.get(key, 'N/A'))
+            blocks.append(self.space(0.2))
+
+        blocks += [
+            self.line(f"{len(SECTIONS) + 1}   Final Answer", size=14, weight='bold'),
+            self.space(0.1),
+        ]
+        blocks += self.paragraphs(solution_data.get('final_answer', 'N/A'), size=14, weight='bold', align='center')
+        blocks += [
+            self.space(0.15),
+            self.line(f"Confidence: {solution_data.get('confidence', 90)}%"),
+        ]
+        blocks += self.paragraphs(f"Reason: {solution_data.get('one_sentence_reason', 'See analysis')}")
+        blocks += [
+            self.space(0.2),
+            self.line(f"All strategies agree: {'Yes' if solution_data.get('all_agree', False) else 'No'}"),
+        ]
+
+        graphs = solution_data.get('graphs', [])
+        if graphs:
+            heading = self.line(f"{len(SECTIONS) + 2}   Graphs", size=14, weight='bold')
+            heading['keep_with_next'] = True
+            blocks += [self.space(0.2), heading]
+            blocks += [self.image(path) for path in graphs]
+        return blocks
+
+    def line(self, text: str, size: float = None, weight: str = 'normal', color: str = 'text',
+             align: str = 'left') -> Dict:
+        size = size or self.font_size
+        return {'kind': 'text', 'text': text, 'size': size, 'weight': weight,
+                'color': COLORS[color], 'align': align, 'height': size * self.line_spacing / 72}
+
+    def space(self, inches: float) -> Dict:
+        return {'kind': 'space', 'height': inches}
+
+    def image(self, path: str) -> Dict:
+        pixels = mpimg.imread(path)
+        width = self.page_width - 2 * self.margin
+        height = min(width * pixels.shape[0] / pixels.shape[1], 0.8 * (self.page_height - 2 * self.margin))
+        return {'kind': 'image', 'pixels': pixels, 'height': height + 0.1}
+
+    def paragraphs(self, text, **style) -> List[Dict]:
+        """Wrap text into lines that fit the text width (math segments stay whole)"""
+        text = str(text or '').strip() or 'N/A'
+        size = style.get('size', self.font_size)
+        # Average glyph advance of DejaVu Sans prose is ~0.5em
+        max_chars = int((self.page_width - 2 * self.margin) * 72 / (0.5 * size))
+
+        blocks = []
+        for paragraph in re.split(r'\n\s*\n', text):
+            for source_line in paragraph.splitlines():
+                current, width = [], 0
+                for token in TOKEN_RE.findall(source_line):
+                    token_width = self.visible_length(token)
+                    if current and width + 1 + token_width > max_chars:
+                        blocks.append(self.line(' '.join(current), **style))
+                        current, width = [], 0
+                    if token_width > max_chars and not token.startswith('$'):
+                        # A single overlong word (e.g. a long expression): hard-wrap it
+                        pieces = textwrap.wrap(token, int(0.8 * max_chars))
+                        blocks += [self.line(piece, **style) for piece in pieces[:-1]]
+                        token, token_width = pieces[-1], len(pieces[-1])
+                    current.append(token)
+                    width += token_width + (1 if width else 0)
+                if current:
+                    blocks.append(self.line(' '.join(current), **style))
+            blocks.append(self.space(0.08))
+        return blocks
+
+    def visible_length(self, token: str) -> int:
+        """Approximate printed width in characters (math markup mostly disappears)"""
+        if token.startswith('$') and token.endswith('$') and len(token) > 1:
+            return max(1, int(0.8 * len(re.sub(r'\\[a-zA-Z]+|[{}^_$]', 'x', token))))
+        return len(token)
+
+    def paginate(self, blocks: List[Dict], verbatim_math: bool = False) -> List[List]:
+        """Assign blocks to pages top-down; returns per-page lists of draw callbacks"""
+        usable = self.page_height - 2 * self.margin
+        pages, page, cursor = [], [], 0.0
+        for i, block in enumerate(blocks):
+            needed = block['height']
+            if block.get('keep_with_next') and i + 1 < len(blocks):
+                # Never leave a heading alone at the bottom of a page
+                needed += blocks[i + 1]['height']
+            if cursor + needed > usable and page:
+                pages.append(page)
+                page, cursor = [], 0.0
+                if block['kind'] == 'space':
+                    continue
+            if block['kind'] == 'text':
+                page.append(self.text_drawer(block, cursor, verbatim_math))
+            elif block['kind'] == 'image':
+                page.append(self.image_drawer(block, cursor))
+            cursor += block['height']
+        if page:
+            pages.append(page)
+        return pages
+
+    def text_drawer(self, block: Dict, cursor: float, verbatim_math: bool = False):
+        x = {'left': self.margin / self.page_width, 'center': 0.5}[block['align']]
+        y = 1 - (self.margin + cursor) / self.page_height
+        text = self.markup(block['text'], verbatim_math)
+
+        def draw(fig):
+            fig.text(x, y, text, fontsize=block['size'], fontweight=block['weight'],
+                     color=block['color'], ha=block['align'], va='top')
+
+        return draw
+
+    def image_drawer(self, block: Dict, cursor: float):
+        width = (self.page_width - 2 * self.margin) / self.page_width
+        height = (block['height'] - 0.1) / self.page_height
+        bottom = 1 - (self.margin + cursor) / self.page_height - height
+
+        def draw(fig):
+            ax = fig.add_axes([self.margin / self.page_width, bottom, width, height])
+            ax.imshow(block['pixels'])
+            ax.set_axis_off()
+
+        return draw
+
+    def markup(self, text: str, verbatim_math: bool = False) -> str:
+        """
+        Keep $...$ as mathtext (as typed with verbatim_math); escape every
+        other dollar so it prints literally
+        """
+        parts = []
+        last = 0
+        for match in MATH_RE.finditer(text):
+            parts.append(text[last:match.start()].replace('$', r'\$'))
+            parts.append(match.group(0).replace('$', r'\$') if verbatim_math else match.group(0))
+            last = match.end()
+        parts.append(text[last:].replace('$', r'\$'))
+        return ''.join(parts)
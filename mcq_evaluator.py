@@ -0,0 +1,112 @@
+"""
+Batch MCQ Option Evaluator
+Parses the (A)-(D) options of an extracted JEE problem and checks all of them
+against a SymPy-computed answer in one vectorized numeric comparison, so the
+model's "FINAL ANSWER: Option X" can be confirmed or corrected without
+another Gemini call
+"""
+
+import re
+from typing import Dict, Optional
+
+import numpy as np
+from sympy import lambdify, symbols
+
+from problem_parser import ProblemParser
+
+# "(A) x^2", "A) x^2", "A. x^2", "(a) x^2" - on one line or many
+OPTION_RE = re.compile(
+    r'(?:^|\s)\(?([A-Da-d])[\).:]\s+(.+?)(?=\s+\(?[A-Da-d][\).:]\s|\s*$)',
+    re.MULTILINE,
+)
+
+# "+ C" / "+ c" / "+ constant" on indefinite-integral options
+CONSTANT_RE = re.compile(r'\s*\+\s*(?:c|k|constant)\s*$', re.IGNORECASE)
+
+# Irrational-ish sample points in (0, 3): avoid 0, 1, pi/2 and friends
+SAMPLE_POINTS = np.array([0.3141, 0.5772, 0.8862, 1.2345, 1.4142, 1.7321, 2.2361, 2.7183])
+
+
+class MCQEvaluator:
+    def __init__(self, parser: ProblemParser = None, tolerance: float = 1e-6):
+        self.parser = parser or ProblemParser()
+        self.tolerance = tolerance
+        self.x = symbols('x')
+
+    def parse_options(self, problem_text: str) -> Dict[str, str]:
+        """Extract {'A': '...', 'B': '...', ...} from the problem statement"""
+        options = {}
+        for letter, text in OPTION_RE.findall(problem_text or ''):
+            letter = letter.upper()
+            if letter not in options:
+                options[letter] = text.strip().rstrip(',;')
+        return options if len(options) >= 2 else {}
+
+    def strip_options(self, problem_text: str) -> str:
+        """The problem statement with the options removed"""
+        match = OPTION_RE.search(problem_text or '')
+        return (problem_text[:match.start()] if match else problem_text or '').strip()
+
+    def evaluate(self, reference, options: Dict[str, str], var=None, indefinite: bool = False) -> Optional[Dict]:
+        """
+        Compare every option with the reference answer in one vectorized pass
+
+        Args:
+            reference: SymPy expression (or number) computed for the problem
+            options: letter -> option text, as returned by parse_options
+            indefinite: options may differ from the reference by a constant (+C)
+
+        Returns:
+            Dict with the matching 'option' (or None), its 'margin' over the
+            runner-up and per-option 'distances'; None if nothing could be parsed
+        """
+        var = var or self.x
+        letters, expressions = [], []
+        for letter, text in sorted(options.items()):
+            try:
+                expressions.append(self.parser.parse_expression(CONSTANT_RE.sub('', text)))
+                letters.append(letter)
+            except Exception:
+                continue
+
+        if not expressions:
+            return None
+
+        # One lambdified function returns every option plus the reference at every sample point
+        stacked = lambdify(var, [*expressions, reference], modules='numpy')
+        with np.errstate(all='ignore'):
+            rows = [np.broadcast_to(np.asarray(value, dtype=complex), SAMPLE_POINTS.shape)
+                    for value in stacked(SAMPLE_POINTS.astype(complex))]
+        values = np.vstack(rows)
+        option_values, reference_values = values[:-1], values[-1]
+
+        difference = option_values - reference_values
+        if indefinite:
+            # Antiderivatives are only defined up to a constant
+            difference = difference - np.nanmean(difference, axis=1, keepdims=True)
+
+        scale = np.maximum(1.0, np.abs(reference_values))
+        relative = np.abs(difference) / scale
+        finite = np.isfinite(relative)
+        # Options that are undefined at most sample points cannot be judged
+        usable = finite.sum(axis=1) >= 3
+        distances = np.where(usable, np.nanmax(np.where(finite, relative, -np.inf), axis=1), np.inf)
+
+        order = np.argsort(distances)
+        best = order[0]
+        runner_up = distances[order[1]] if len(order) > 1 else np.inf
+        matched = bool(distances[best] <= self.tolerance)
+
+        return {
+            'option': letters[best] if matched else None,
+            'margin': float(runner_up - distances[best]),
+            'distances': {letter: float(distance) for letter, distance in zip(letters, distances)},
+        }
+
+    def model_choice(self, final_answer: str) -> Optional[str]:
+        """Letter the model picked in 'FINAL ANSWER: Option [B]' (None if numerical)"""
+        match = re.search(r'option\s*\[?\(?([A-D])\b', final_answer or '', re.IGNORECASE)
+        if match:
+            return match.group(1).upper()
+        match = re.match(r'^\s*\[?\(?([A-D])[\)\]]?\s*$', final_answer or '')
+        return match.group(1).upper() if match else None
@@ -0,0 +1,137 @@
+"""
+Metrics
+Process-wide latency spans and counters: `with span('gemini'):` records the
+stage's duration into a rolling window, summarised as p50/p95/p99 for
+/status and rendered in the Prometheus text format for /metrics. Recording
+is a perf_counter() call and a deque append, cheap enough for every request
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Prefix of every exported metric name
+NAMESPACE = 'calculus_bot'
+
+
+class RollingHistogram:
+    def __init__(self, window_seconds: float, max_samples: int):
+        """
+        Args:
+            window_seconds: samples older than this are dropped from the quantiles
+            max_samples: most samples kept (the newest win)
+        """
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=max_samples)
+        # All-time totals (Prometheus summaries need monotonic _sum/_count)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float, now: float):
+        self.samples.append((now, value))
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, now: float) -> Optional[Dict[float, float]]:
+        """Nearest-rank quantiles over the window, or None without samples"""
+        cutoff = now - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        if not self.samples:
+            return None
+        values = sorted(value for _, value in self.samples)
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES}
+
+
+class Metrics:
+    def __init__(self, window_seconds: float = None, max_samples: int = None):
+        """
+        Args:
+            window_seconds: rolling window for quantiles (default from METRICS_WINDOW_SECONDS)
+            max_samples: samples kept per stage (default from METRICS_MAX_SAMPLES)
+        """
+        self.window_seconds = window_seconds or float(os.getenv('METRICS_WINDOW_SECONDS', '3600'))
+        self.max_samples = max_samples or int(os.getenv('METRICS_MAX_SAMPLES', '2048'))
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+        # Spans are recorded from the event loop and from worker threads
+        self.lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram(self.window_seconds, self.max_samples)
+            histogram.observe(seconds, time.monotonic())
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the block as one sample of stage; failures also count <stage>_errors"""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(f'{stage}_errors')
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def increment(self, name: str, value: float = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, read: Callable[[], float]):
+        """Register a value read at export time (queue length, ...)"""
+        self.gauges[name] = read
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{stage: {'count', 'p50', 'p95', 'p99'}} over the rolling window"""
+        now = time.monotonic()
+        result = {}
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                quantiles = histogram.quantiles(now)
+                if quantiles is None:
+                    continue
+                result[stage] = {'count': len(histogram.samples)}
+                result[stage].update({f'p{round(q * 100)}': value for q, value in quantiles.items()})
+        return result
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        now = time.monotonic()
+        lines = [
+            f'# HELP {NAMESPACE}_stage_seconds Stage latency (quantiles over a rolling window)',
+            f'# TYPE {NAMESPACE}_stage_seconds summary',
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                for q, value in (histogram.quantiles(now) or {}).items():
+                    lines.append(f'{NAMESPACE}_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'{NAMESPACE}_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{NAMESPACE}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            counters = sorted(self.counters.items())
+        for name, value in counters:
+            lines.append(f'# TYPE {NAMESPACE}_{name}_total counter')
+            lines.append(f'{NAMESPACE}_{name}_total {value}')
+        for name, read in sorted(self.gauges.items()):
+            lines.append(f'# TYPE {NAMESPACE}_{name} gauge')
+            lines.append(f'{NAMESPACE}_{name} {read()}')
+        lines.append(f'# TYPE {NAMESPACE}_uptime_seconds gauge')
+        lines.append(f'{NAMESPACE}_uptime_seconds {time.time() - self.started:.0f}')
+        return '\n'.join(lines) + '\n'
+
+
+# The process-wide registry
+METRICS = Metrics()
+
+
+def span(stage: str):
+    return METRICS.span(stage)
@@ -0,0 +1,364 @@
+"""
+Knowledge-Base Pattern Index
+Compiles the standard results in knowledge_base.py into SymPy pattern templates,
+indexed by a structural signature (head operator, degree, function set), so an
+integrand can be answered instantly or turned into a precise hint for Gemini
+"""
+
+from typing import Callable, Dict, List, Optional
+
+from sympy import (
+    Abs, Add, Dummy, Interval, Mul, Pow, Rational, Wild, acos, asin, atan, cos, cot, csc, diff, exp,
+    fraction, log, sec, simplify, sin, singularities, sqrt, symbols, sympify, tan,
+)
+
+from knowledge_base import CALCULUS_KNOWLEDGE
+
+x = symbols('x')
+a = Wild('a', exclude=[x, 0])
+b = Wild('b', exclude=[x])
+c = Wild('c', exclude=[x, 0])
+d = Wild('d', exclude=[x])
+n = Wild('n', exclude=[x])
+
+FUNCTION_CLASSES = (sin, cos, tan, sec, csc, cot, exp, log, asin, acos, atan)
+
+
+class ShortcutTemplate:
+    """One knowledge-base result compiled into a SymPy pattern"""
+
+    def __init__(self, name: str, knowledge_path: tuple, pattern, result: Callable,
+                 examples: List, condition: Callable = None):
+        self.name = name
+        self.knowledge_path = knowledge_path
+        self.pattern = pattern
+        self.result = result
+        self.examples = examples
+        self.condition = condition or (lambda m: True)
+
+    @property
+    def formula(self) -> str:
+        """The knowledge-base text this template was compiled from"""
+        entry = CALCULUS_KNOWLEDGE
+        for key in self.knowledge_path:
+            entry = entry[key]
+        if isinstance(entry, dict):
+            return entry.get('formula', entry.get('pattern', ''))
+        return entry
+
+    def apply(self, expr) -> Optional[object]:
+        """Return the antiderivative if expr matches this template"""
+        match = expr.match(self.pattern)
+        if match is None or not self.condition(match):
+            return None
+        return self.result(match)
+
+
+def build_templates() -> List[ShortcutTemplate]:
+    """Compile the standard integrals and shortcuts of the knowledge base"""
+    linear = a * x + b
+    return [
+        ShortcutTemplate(
+            'power_rule', ('integration_techniques', 'power_rule'),
+            linear**n, lambda m: (m[a] * x + m[b])**(m[n] + 1) / (m[a] * (m[n] + 1)),
+            examples=[x, x**2, x**-3, sqrt(x), (2 * x + 1)**5],
+            condition=lambda m: m[n] != -1,
+        ),
+        ShortcutTemplate(
+            'logarithmic', ('integration_techniques', 'logarithmic'),
+            1 / linear, lambda m: log(Abs(m[a] * x + m[b])) / m[a],
+            examples=[1 / x, 1 / (3 * x + 2)],
+        ),
+        ShortcutTemplate(
+            'exponential', ('integration_techniques', 'exponential'),
+            exp(linear), lambda m: exp(m[a] * x + m[b]) / m[a],
+            examples=[exp(x)],
+        ),
+        ShortcutTemplate(
+            'sin', ('integration_techniques', 'standard_integrals', 'sin'),
+            sin(linear), lambda m: -cos(m[a] * x + m[b]) / m[a],
+            examples=[sin(x)],
+        ),
+        ShortcutTemplate(
+            'cos', ('integration_techniques', 'standard_integrals', 'cos'),
+            cos(linear), lambda m: sin(m[a] * x + m[b]) / m[a],
+            examples=[cos(x)],
+        ),
+        ShortcutTemplate(
+            'sec_squared', ('integration_techniques', 'standard_integrals', 'sec_squared'),
+            sec(linear)**2, lambda m: tan(m[a] * x + m[b]) / m[a],
+            examples=[sec(x)**2],
+        ),
+        ShortcutTemplate(
+            'sec_squared', ('integration_techniques', 'standard_integrals', 'sec_squared'),
+            cos(linear)**-2, lambda m: tan(m[a] * x + m[b]) / m[a],
+            examples=[cos(x)**-2],
+        ),
+        ShortcutTemplate(
+            'cosec_squared', ('integration_techniques', 'standard_integrals', 'cosec_squared'),
+            csc(linear)**2, lambda m: -cot(m[a] * x + m[b]) / m[a],
+            examples=[csc(x)**2],
+        ),
+        ShortcutTemplate(
+            'cosec_squared', ('integration_techniques', 'standard_integrals', 'cosec_squared'),
+            sin(linear)**-2, lambda m: -cot(m[a] * x + m[b]) / m[a],
+            examples=[sin(x)**-2],
+        ),
+        ShortcutTemplate(
+            'sec_tan', ('integration_techniques', 'standard_integrals', 'sec_tan'),
+            sec(linear) * tan(linear), lambda m: sec(m[a] * x + m[b]) / m[a],
+            examples=[sec(x) * tan(x)],
+        ),
+        ShortcutTemplate(
+            'sec_tan', ('integration_techniques', 'standard_integrals', 'sec_tan'),
+            sin(linear) * cos(linear)**-2, lambda m: sec(m[a] * x + m[b]) / m[a],
+            examples=[sin(x) / cos(x)**2],
+        ),
+        ShortcutTemplate(
+            'inv_sqrt', ('integration_techniques', 'standard_integrals', 'inv_sqrt'),
+            (c - d * x**2)**Rational(-1, 2), lambda m: asin(sqrt(m[d]) * x / sqrt(m[c])) / sqrt(m[d]),
+            examples=[1 / sqrt(1 - x**2), 1 / sqrt(4 - x**2)],
+            condition=lambda m: m[c].is_positive and m[d].is_positive,
+        ),
+        ShortcutTemplate(
+            'inv_sum', ('integration_techniques', 'standard_integrals', 'inv_sum'),
+            1 / (c + d * x**2), lambda m: atan(sqrt(m[d]) * x / sqrt(m[c])) / sqrt(m[c] * m[d]),
+            examples=[1 / (1 + x**2), 1 / (4 + x**2)],
+            condition=lambda m: m[c].is_positive and m[d].is_positive,
+        ),
+        ShortcutTemplate(
+            'linear_over_linear', ('integration_techniques', 'linear_over_linear'),
+            (a * x + b) / (c * x + d),
+            lambda m: (m[a] / m[c]) * x + ((m[b] * m[c] - m[a] * m[d]) / m[c]**2) * log(Abs(m[c] * x + m[d])),
+            examples=[(x + 1) / (x + 2), (2 * x + 3) / (3 * x - 1)],
+        ),
+        ShortcutTemplate(
+            'x_ln_x', ('common_functions', 'common_antiderivatives', 'x_ln_x'),
+            log(x), lambda m: x * log(x) - x,
+            examples=[log(x)],
+        ),
+        ShortcutTemplate(
+            'x_e_x', ('common_functions', 'common_antiderivatives', 'x_e_x'),
+            x * exp(x), lambda m: (x - 1) * exp(x),
+            examples=[x * exp(x)],
+        ),
+        ShortcutTemplate(
+            'e_x_sin_x', ('common_functions', 'common_antiderivatives', 'e_x_sin_x'),
+            exp(x) * sin(x), lambda m: exp(x) * (sin(x) - cos(x)) / 2,
+            examples=[exp(x) * sin(x)],
+        ),
+        ShortcutTemplate(
+            'e_x_cos_x', ('common_functions', 'common_antiderivatives', 'e_x_cos_x'),
+            exp(x) * cos(x), lambda m: exp(x) * (sin(x) + cos(x)) / 2,
+            examples=[exp(x) * cos(x)],
+        ),
+    ]
+
+
+def structural_signature(expr) -> tuple:
+    """
+    Structural signature of an integrand in x:
+    (head operator, degree, sorted set of functions applied to x)
+    """
+    head = type(expr).__name__
+    funcs = tuple(sorted({type(f).__name__ for f in expr.atoms(*FUNCTION_CLASSES) if f.has(x)}))
+
+    degree = None
+    if expr.is_polynomial(x):
+        degree = expr.as_poly(x).degree() if expr.has(x) else 0
+    elif expr.is_rational_function(x):
+        num, den = fraction(expr)
+        degree = (num.as_poly(x).degree(), den.as_poly(x).degree())
+
+    return (head, degree, funcs)
+
+
+def rename_to_x(expr, var):
+    """
+    Rewrite an integrand in var as one in x, the variable the templates use
+    An x already in expr is a constant here, so it becomes a fresh Dummy
+    first instead of being merged with var; returns (renamed, substitution
+    that maps results back)
+    """
+    parameter = Dummy('x')
+    renamed = expr.subs({x: parameter, var: x}, simultaneous=True)
+    return renamed, {x: var, parameter: x}
+
+
+def is_proper(expr, var, lower, upper) -> bool:
+    """Finite limits and no singularity of expr on the closed interval between them"""
+    try:
+        lower, upper = sympify(lower), sympify(upper)
+        if not (lower.is_finite and upper.is_finite):
+            return False
+        interval = Interval(min(lower, upper), max(lower, upper))
+        return singularities(expr, var, interval).is_empty is True
+    except Exception:
+        # Limits or singularities SymPy cannot decide: assume the worst
+        return False
+
+
+class PatternIndex:
+    def __init__(self):
+        """Compile every template once and index it by signature"""
+        self.templates = build_templates()
+        self.index: Dict[tuple, List[ShortcutTemplate]] = {}
+
+        for template in self.templates:
+            for example in template.examples:
+                head, degree, funcs = structural_signature(example)
+                # Index both the exact signature and a degree-agnostic one, so
+                # x^2 and x^7 land in the same power-rule bucket
+                for key in [(head, degree, funcs), (head, None, funcs)]:
+                    bucket = self.index.setdefault(key, [])
+                    if template not in bucket:
+                        bucket.append(template)
+
+        print(f"✓ Pattern index compiled: {len(self.templates)} templates, {len(self.index)} signatures")
+
+    def candidates(self, expr) -> List[ShortcutTemplate]:
+        """Templates whose signature matches expr (exact degree first)"""
+        head, degree, funcs = structural_signature(expr)
+        exact = self.index.get((head, degree, funcs), [])
+        loose = [t for t in self.index.get((head, None, funcs), []) if t not in exact]
+        return exact + loose
+
+    def match(self, expr, var=None) -> Optional[Dict]:
+        """
+        Match an integrand against the compiled shortcuts
+        Uses linearity: constant factors are pulled out and sums matched termwise
+
+        Returns:
+            Dict with 'antiderivative', 'shortcuts' (template names) and 'hints',
+            or None if any part of the integrand is not a standard form
+        """
+        if var is not None and var != x:
+            renamed, restore = rename_to_x(expr, var)
+            result = self.match(renamed)
+            if result is not None:
+                result['antiderivative'] = result['antiderivative'].subs(restore, simultaneous=True)
+            return result
+
+        terms = Add.make_args(expr.expand()) if expr.is_Add else [expr]
+        antiderivative = 0
+        shortcuts = []
+        hints = []
+
+        for term in terms:
+            coefficient, rest = term.as_independent(x, as_Add=False)
+            if rest == 1:
+                antiderivative += coefficient * x
+                continue
+
+            matched = self.match_term(rest)
+            if matched is None:
+                return None
+
+            template, result = matched
+            antiderivative += coefficient * result
+            if template.name not in shortcuts:
+                shortcuts.append(template.name)
+                hints.append(template.formula)
+
+        return {
+            'antiderivative': antiderivative,
+            'shortcuts': shortcuts,
+            'hints': hints,
+        }
+
+    def match_term(self, term):
+        """Match a single non-constant term: indexed templates, then generic f'/f and f'*f^n"""
+        for template in self.candidates(term):
+            result = template.apply(term)
+            if result is not None:
+                return template, result
+
+        return self.match_generic(term)
+
+    def match_generic(self, term):
+        """
+        Shortcuts whose shape depends on an arbitrary inner f(x), so they are
+        checked by structure rather than looked up by signature
+        """
+        # f'(x)/f(x) -> ln|f(x)|
+        num, den = fraction(term)
+        if den.has(x):
+            ratio = simplify(num / diff(den, x))
+            if not ratio.has(x):
+                return F_PRIME_OVER_F, ratio * log(Abs(den))
+
+        # f'(x) * f(x)^n -> f(x)^(n+1)/(n+1)
+        for factor in Mul.make_args(term):
+            if isinstance(factor, Pow) and factor.base.has(x) and not factor.exp.has(x) and factor.exp != -1:
+                rest = simplify(term / factor)
+                derivative = diff(factor.base, x)
+                if derivative == 0:
+                    continue
+                ratio = simplify(rest / derivative)
+                if not ratio.has(x):
+                    return F_PRIME_TIMES_F_POWER, ratio * factor.base**(factor.exp + 1) / (factor.exp + 1)
+
+        return None
+
+    def match_definite(self, expr, var, lower, upper) -> Optional[Dict]:
+        """
+        Definite-integral shortcuts: odd/even functions on symmetric limits
+        and King's property. None when the integral may be improper (a
+        singularity on [lower, upper] or an infinite limit): its value, or
+        divergence, is left to the exact and numeric paths
+        """
+        if not is_proper(expr, var, lower, upper):
+            return None
+        reflected = expr.subs(var, -var)
+
+        if simplify(lower + upper) == 0:
+            if simplify(reflected + expr) == 0:
+                return {
+                    'value': 0,
+                    'shortcuts': ['odd_function'],
+                    'hints': [CALCULUS_KNOWLEDGE['shortcuts']['odd_function']['formula']],
+                }
+            if simplify(reflected - expr) == 0:
+                return {
+                    'value': None,
+                    'shortcuts': ['even_function'],
+                    'hints': [CALCULUS_KNOWLEDGE['shortcuts']['even_function']['formula']],
+                }
+
+        # King's property helps when f(x) + f(a+b-x) is simpler than f(x)
+        kings = simplify(expr + expr.subs(var, lower + upper - var))
+        if kings.count_ops() <= expr.count_ops() and simplify(kings - 2 * expr) != 0:
+            return {
+                'value': None,
+                'shortcuts': ['kings_property'],
+                'hints': [
+                    CALCULUS_KNOWLEDGE['shortcuts']['kings_property']['formula'],
+                    f"Here f(x) + f(a+b-x) = {kings}, so I = (1/2)*integral[{lower},{upper}]({kings} dx)",
+                ],
+            }
+
+        return None
+
+    def hint_for(self, expr, var=None) -> Optional[str]:
+        """Precise shortcut hint for the model, even when only part of the integrand matched"""
+        if var is not None and var != x:
+            expr = rename_to_x(expr, var)[0]
+
+        hints = []
+        terms = Add.make_args(expr.expand()) if expr.is_Add else [expr]
+        for term in terms:
+            rest = term.as_independent(x, as_Add=False)[1]
+            matched = self.match_term(rest) if rest != 1 else None
+            if matched is not None and matched[0].formula not in hints:
+                hints.append(matched[0].formula)
+
+        return "; ".join(hints) if hints else None
+
+
+F_PRIME_OVER_F = ShortcutTemplate(
+    'f_prime_over_f', ('shortcuts', 'f_prime_over_f'), None, None, examples=[],
+)
+
+F_PRIME_TIMES_F_POWER = ShortcutTemplate(
+    'f_prime_times_f_power', ('integration_techniques', 'f_prime_times_f_power'), None, None, examples=[],
+)
@@ -4,100 +4,377 @@ This will show us EXACTLY what's failing
 """
 
 import os
+import re
+import json
+import hashlib
+import shutil
 import subprocess
 import tempfile
-from datetime import datetime
+import uuid
+
+from latex_renderer import LatexRenderer
+from mathtext_pdf import MathtextPDFWriter
+from metrics import METRICS, span
+
+# Fixed preamble shared by every solution PDF. It is dumped once into a
+# precompiled format (see ensure_format) so pdflatex does not re-load these
+# packages for every document.
+LATEX_PREAMBLE = r'''\documentclass[10pt,a4paper]{article}
+\usepackage[utf8]{inputenc}
+\usepackage[T1]{fontenc}
+\usepackage{amsmath}
+\usepackage{amssymb}
+\usepackage{amsfonts}
+\usepackage{xcolor}
+\usepackage{geometry}
+\usepackage{graphicx}
+\geometry{margin=1in}
+
+\definecolor{cengage}{RGB}{0,102,204}
+\definecolor{blackbook}{RGB}{204,0,102}
+\definecolor{olympiad}{RGB}{102,51,153}
+'''
+
+# Log lines that mean cross-references are not settled yet
+RERUN_RE = re.compile(r'Rerun to get|Label\(s\) may have changed|Rerun LaTeX')
+# Error position in a pdflatex log: "l.42 \badcommand"
+LOG_LINE_RE = re.compile(r'^l\.(\d+)\s?(.*)$')
+# Upper bound on compile passes when references keep changing
+MAX_LATEX_PASSES = 3
+
+# Single-pass escaping for model text: LaTeX specials and common Unicode
+# math symbols. A backslash comes out as \textbackslash\{\} (the historical
+# output of escaping it before the braces)
+LATEX_ESCAPE_TABLE = str.maketrans({
+    '\\': r'\textbackslash\{\}',
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+    '\u2019': "'",  # Right single quotation
+    '\u2018': "'",  # Left single quotation
+    '\u201c': '"',  # Left double quotation
+    '\u201d': '"',  # Right double quotation
+    '\u2013': '--', # En dash
+    '\u2014': '---', # Em dash
+    '\u2026': '...', # Ellipsis
+    '\u00a0': ' ',  # Non-breaking space
+    '\u00b0': r'$^\circ$',  # Degree symbol
+    '\u00b2': r'$^2$',  # Superscript 2
+    '\u00b3': r'$^3$',  # Superscript 3
+    '\u02e3': r'$^x$',  # Modifier letter small x (e^x typed as eˣ)
+    '\u207f': r'$^n$',  # Superscript n
+    '\u221e': r'$\infty$',  # Infinity
+    '\u03c0': r'$\pi$',  # Pi
+    '\u222b': r'$\int$',  # Integral
+    '\u2211': r'$\sum$',  # Sum
+    '\u221a': r'$\sqrt{}$',  # Square root
+    '\u2264': r'$\leq$',  # Less than or equal
+    '\u2265': r'$\geq$',  # Greater than or equal
+    '\u2260': r'$\neq$',  # Not equal
+    '\u00d7': r'$\times$',  # Multiplication
+    '\u00f7': r'$\div$',  # Division
+    '\u00b1': r'$\pm$',  # Plus-minus
+})
+# Keep ASCII, Latin-1 and Greek letters; anything else pdflatex may choke on
+UNSAFE_UNICODE_RE = re.compile('[^\x00-\xff\u0391-\u03a8\u03b1-\u03c8]')
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+# Control characters except newline, plus DEL
+CONTROL_CHARS_RE = re.compile('[\x00-\x09\x0b-\x1f\x7f]+')
+
+
+# solution_data fields rendered into the PDF
+SOLUTION_PDF_FIELDS = (
+    'strategy_1', 'strategy_2', 'strategy_3', 'final_answer', 'confidence',
+    'one_sentence_reason', 'all_agree', 'graphs',
+)
+
+
+class PDFCompileError(Exception):
+    """pdflatex failed; carries the parsed log errors and the files needed to debug it"""
+    
+    def __init__(self, message, errors=None, log_path=None, tex_path=None):
+        super().__init__(message)
+        self.errors = errors or []
+        self.log_path = log_path
+        self.tex_path = tex_path
+
 
 class PDFGenerator:
-    def __init__(self, output_dir="temp_pdfs"):
+    def __init__(self, output_dir="temp_pdfs", format_dir=None, backend=None):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
+        
+        # 'pdflatex' (default) or 'mathtext' (in-process, pdflatex only as a fallback)
+        self.backend = (backend or os.getenv('PDF_BACKEND', 'pdflatex')).lower()
+        self.mathtext_writer = MathtextPDFWriter() if self.backend == 'mathtext' else None
+        
+        # Precompiled preamble format (built once; None means compile the full preamble)
+        self.format_dir = os.path.abspath(format_dir or os.getenv('LATEX_FORMAT_DIR', 'latex_format'))
+        self.format_name = None
+        if self.backend == 'pdflatex' and os.getenv('LATEX_PRECOMPILE', '1') != '0':
+            self.ensure_format()
+        
+        # Typeset formulas in model text (LATEX_MATH=0 escapes everything as prose)
+        self.render_math = os.getenv('LATEX_MATH', '1') != '0'
+        self.latex_renderer = LatexRenderer(self.escape_for_latex)
+        
+        # Compiled PDFs keyed by the hash of their LaTeX source
+        self.cache_dir = os.getenv('PDF_CACHE_DIR', 'pdf_cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_max_files = int(os.getenv('PDF_CACHE_MAX_FILES', '200'))
+    
+    def ensure_format(self):
+        """
+        Dump LATEX_PREAMBLE into a custom pdflatex format file, once
+        The name carries a hash of the preamble, so editing the preamble
+        automatically builds a fresh format
+        """
+        digest = hashlib.sha1(LATEX_PREAMBLE.encode('utf-8')).hexdigest()[:10]
+        name = f"jee_preamble_{digest}"
+        os.makedirs(self.format_dir, exist_ok=True)
+        
+        if os.path.exists(os.path.join(self.format_dir, f"{name}.fmt")):
+            self.format_name = name
+            return name
+        
+        preamble_path = os.path.join(self.format_dir, f"{name}.tex")
+        with open(preamble_path, 'w', encoding='utf-8') as f:
+            f.write(LATEX_PREAMBLE + "\n\\dump\n")
+        
+        print(f"Building precompiled LaTeX format {name}...")
+        try:
+            result = subprocess.run(
+                ['pdflatex', '-ini', '-interaction=nonstopmode', '-no-shell-escape', f'-jobname={name}',
+                 '&pdflatex', preamble_path],
+                cwd=self.format_dir,
+                capture_output=True,
+                timeout=120,
+                text=True
+            )
+        except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️ Could not build LaTeX format ({e}); compiling full preamble per document")
+            return None
+        
+        if result.returncode != 0 or not os.path.exists(os.path.join(self.format_dir, f"{name}.fmt")):
+            print(f"⚠️ LaTeX format build failed; compiling full preamble per document")
+            print(result.stdout[-1000:] if result.stdout else "No stdout")
+            return None
+        
+        print(f"✓ Precompiled LaTeX format ready: {name}.fmt")
+        self.format_name = name
+        return name
+    
+    def run_pdflatex(self, filename, tex_path, latex_content, workdir):
+        """One pdflatex pass in workdir; falls back to the full preamble if the format is unusable"""
+        result = subprocess.run(
+            self.pdflatex_command(filename, tex_path, workdir),
+            cwd=workdir,
+            capture_output=True,
+            timeout=120,
+            text=True,
+            env=self.pdflatex_env()
+        )
+        
+        if result.returncode != 0 and self.format_name and 'format file' in (result.stdout or '').lower():
+            # Stale or incompatible format (e.g. TeX upgraded): fall back to the full preamble
+            print(f"⚠️ Precompiled format {self.format_name} unusable, compiling full preamble")
+            self.format_name = None
+            with open(tex_path, 'w', encoding='utf-8') as f:
+                f.write(latex_content)
+            result = subprocess.run(
+                self.pdflatex_command(filename, tex_path, workdir),
+                cwd=workdir,
+                capture_output=True,
+                timeout=120,
+                text=True
+            )
+        
+        return result
+    
+    def needs_rerun(self, log_content, aux_before, aux_after):
+        """True when the log asks for a rerun or the .aux file (labels, references) changed"""
+        if RERUN_RE.search(log_content):
+            return True
+        # On pass 1 there is no earlier .aux to compare; LaTeX's own warning covers new labels
+        return aux_after is not None and aux_before is not None and aux_before != aux_after
+    
+    def file_digest(self, path):
+        """Content hash of a file, None if it does not exist"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    
+    def parse_latex_log(self, log_content):
+        """
+        Extract errors from a pdflatex log
+        Returns list of dicts: message ("! ..." line), line number in the
+        .tex file (or None) and the offending source context
+        """
+        errors = []
+        lines = log_content.splitlines()
+        for i, line in enumerate(lines):
+            if not line.startswith('! '):
+                continue
+            error = {'message': line[2:].strip(), 'line': None, 'context': ''}
+            # TeX reports the position a few lines below as "l.<n> <source>"
+            for follow in lines[i + 1:i + 12]:
+                match = LOG_LINE_RE.match(follow)
+                if match:
+                    error['line'] = int(match.group(1))
+                    error['context'] = match.group(2).strip()
+                    break
+            errors.append(error)
+        return errors
+    
+    def pdflatex_command(self, filename, tex_path, workdir):
+        """pdflatex invocation, against the precompiled format when available"""
+        # Document text comes from the model: never let it run shell commands
+        command = ['pdflatex', '-interaction=nonstopmode', '-no-shell-escape']
+        if self.format_name:
+            command.append(f'-fmt={self.format_name}')
+        command += ['-output-directory', workdir, '-jobname', filename, tex_path]
+        return command
+    
+    def pdflatex_env(self):
+        """Let kpathsea find our format file (trailing separator keeps the default path)"""
+        env = dict(os.environ)
+        env['TEXFORMATS'] = self.format_dir + os.pathsep + env.get('TEXFORMATS', '')
+        return env
+    
+    def generate(self, solution_data, workdir=None):
+        """
+        Main entry point - called by bot.py
+        All files go to workdir (the request's workspace, removed by the caller);
+        without one they go to output_dir under a unique name
+        """
+        filename = "solution" if workdir else f"solution_{uuid.uuid4().hex}"
+        if self.backend == 'mathtext':
+            return self.create_pdf_mathtext(solution_data, filename, workdir)
+        return self.compile_pdf(solution_data, filename, workdir)
+    
+    def compile_pdf(self, solution_data, filename, workdir=None):
+        """pdflatex with typeset math; if the model's math does not compile, retry as plain text"""
+        try:
+            return self.create_pdf_local(solution_data, filename, workdir=workdir)
+        except PDFCompileError:
+            if not self.render_math:
+                raise
+            print("⚠️ Typeset math did not compile, retrying with math as plain text")
+            return self.create_pdf_local(solution_data, filename, render_math=False, workdir=workdir)
     
-    def generate(self, solution_data):
-        """Main entry point - called by bot.py"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return self.create_pdf_local(solution_data, f"solution_{timestamp}")
+    def create_pdf_mathtext(self, solution_data, filename, workdir=None):
+        """
+        Create PDF in-process with matplotlib mathtext (no TeX)
+        Falls back to pdflatex for math mathtext cannot parse or vector graphs;
+        without pdflatex installed such math is printed as typed
+        """
+        pdf_path = os.path.join(workdir or self.output_dir, f"{filename}.pdf")
+        solution_data = dict(solution_data)
+        solution_data['graphs'] = [path for path in solution_data.get('graphs', []) if os.path.exists(path)]
+        
+        if self.mathtext_writer.supports(solution_data):
+            with span('mathtext'):
+                self.mathtext_writer.write(solution_data, pdf_path)
+        elif shutil.which('pdflatex'):
+            print("Content needs LaTeX, falling back to pdflatex")
+            return self.compile_pdf(solution_data, filename, workdir)
+        else:
+            print("⚠️ Content needs LaTeX but pdflatex is not installed; printing math as typed")
+            solution_data['graphs'] = [path for path in solution_data['graphs'] if path.lower().endswith('.png')]
+            with span('mathtext'):
+                self.mathtext_writer.write(solution_data, pdf_path, verbatim_math=True)
+        
+        print(f"✓ PDF created with mathtext backend: {pdf_path} ({os.path.getsize(pdf_path)} bytes)")
+        return pdf_path
     
-    def create_pdf_local(self, solution_data, filename):
-        """Create PDF using local pdflatex with FULL ERROR REPORTING"""
+    def create_pdf_local(self, solution_data, filename, render_math=None, workdir=None):
+        """
+        Create PDF using local pdflatex with FULL ERROR REPORTING
+        A document whose LaTeX source was compiled before is served from the PDF cache
+        """
+        workdir = workdir or self.output_dir
         
         print("\n" + "="*60)
         print("PDF Generator: Creating PDF with pdflatex...")
         print("="*60)
         
         try:
-            # Step 1: Build LaTeX content
-            latex_content = self.build_latex_document(solution_data)
+            # Step 1: Build LaTeX content (body only when the preamble is precompiled)
+            with span('latex_build'):
+                latex_body = self.build_latex_body(solution_data, render_math)
+            latex_content = LATEX_PREAMBLE + latex_body
+            
+            pdf_path = os.path.join(workdir, f"{filename}.pdf")
+            cached_pdf = os.path.join(self.cache_dir, f"{self.content_key(latex_content)}.pdf")
+            if os.path.exists(cached_pdf):
+                # Same solution rendered before (re-request, resend): no compile at all
+                shutil.copyfile(cached_pdf, pdf_path)
+                METRICS.increment('pdf_cache_hits')
+                print(f"✓ PDF cache hit: {cached_pdf}")
+                return pdf_path
             
             # Step 2: Write to temp .tex file
-            tex_path = os.path.join(self.output_dir, f"{filename}.tex")
+            tex_path = os.path.join(workdir, f"{filename}.tex")
             with open(tex_path, 'w', encoding='utf-8') as f:
-                f.write(latex_content)
+                f.write(latex_body if self.format_name else latex_content)
             
             print(f"✓ LaTeX file written: {tex_path}")
             print(f"✓ LaTeX content length: {len(latex_content)} chars")
             
-            # DEBUG: Save a copy for inspection
-            debug_tex = os.path.join(self.output_dir, "DEBUG_last_compile.tex")
-            with open(debug_tex, 'w', encoding='utf-8') as f:
-                f.write(latex_content)
-            print(f"✓ DEBUG copy saved: {debug_tex}")
-            
-            # Step 3: Compile with pdflatex (run twice for TOC)
-            for run in [1, 2]:
-                print(f"\nRunning pdflatex (pass {run}/2)...")
-                result = subprocess.run(
-                    [
-                        'pdflatex',
-                        '-interaction=nonstopmode',
-                        '-output-directory', self.output_dir,
-                        '-jobname', filename,
-                        tex_path
-                    ],
-                    cwd=self.output_dir,
-                    capture_output=True,
-                    timeout=120,
-                    text=True
-                )
-                
+            # Step 3: Compile with pdflatex - once, plus reruns only when references changed
+            log_file = os.path.join(workdir, f"{filename}.log")
+            aux_file = os.path.join(workdir, f"{filename}.aux")
+            for run in range(1, MAX_LATEX_PASSES + 1):
+                print(f"\nRunning pdflatex (pass {run})...")
+                aux_before = self.file_digest(aux_file)
+                with span('pdflatex'):
+                    result = self.run_pdflatex(filename, tex_path, latex_content, workdir)
                 print(f"Return code: {result.returncode}")
                 
+                log_content = ''
+                if os.path.exists(log_file):
+                    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+                        log_content = f.read()
+                
                 if result.returncode != 0:
-                    # FULL ERROR REPORTING
+                    # Fail fast: a fatal error on any pass will not fix itself on the next one
+                    errors = self.parse_latex_log(log_content or result.stdout or '')
                     print(f"\n{'='*60}")
-                    print(f"❌ PDFLATEX FAILED ON PASS {run}/2")
+                    print(f"❌ PDFLATEX FAILED ON PASS {run}")
                     print(f"{'='*60}")
-                    
-                    print("\n📄 STDOUT (last 2000 chars):")
-                    print(result.stdout[-2000:] if result.stdout else "No stdout")
-                    
-                    print("\n📄 STDERR (last 2000 chars):")
-                    print(result.stderr[-2000:] if result.stderr else "No stderr")
-                    
-                    # Try to find the .log file for more details
-                    log_file = os.path.join(self.output_dir, f"{filename}.log")
-                    if os.path.exists(log_file):
-                        print("\n📄 LOG FILE (last 3000 chars):")
-                        with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
-                            log_content = f.read()
-                            print(log_content[-3000:])
-                    
+                    for error in errors[:10]:
+                        print(f"  line {error['line']}: {error['message']}")
+                        if error['context']:
+                            print(f"    {error['context']}")
+                    if not errors:
+                        print("\n📄 STDOUT (last 2000 chars):")
+                        print(result.stdout[-2000:] if result.stdout else "No stdout")
                     print(f"\n{'='*60}\n")
                     
-                    if run == 2:
-                        raise Exception(
-                            f"pdflatex failed with return code {result.returncode}\n"
-                            f"Check logs above for details.\n"
-                            f"Debug .tex file saved at: {debug_tex}"
-                        )
+                    raise PDFCompileError(
+                        f"pdflatex failed with return code {result.returncode}: "
+                        f"{errors[0]['message'] if errors else 'no error found in log'}",
+                        errors=errors,
+                        log_path=log_file if log_content else None,
+                        tex_path=tex_path,
+                    )
+                
+                if not self.needs_rerun(log_content, aux_before, self.file_digest(aux_file)):
+                    break
+                print("References changed, rerunning pdflatex")
             
             # Step 4: Verify PDF was created
-            pdf_path = os.path.join(self.output_dir, f"{filename}.pdf")
             if not os.path.exists(pdf_path):
                 raise Exception(
                     f"PDF was not created despite successful compilation\n"
-                    f"Expected: {pdf_path}\n"
-                    f"Directory contents: {os.listdir(self.output_dir)}"
+                    f"Expected: {pdf_path}"
                 )
             
             # Verify it's a valid PDF
@@ -109,6 +386,14 @@ class PDFGenerator:
             file_size = os.path.getsize(pdf_path)
             print(f"✓ PDF created successfully: {pdf_path}")
             print(f"✓ PDF size: {file_size} bytes")
+            self.store_cached_pdf(pdf_path, cached_pdf)
+            if workdir == self.output_dir:
+                # Shared directory, no workspace to take them away: keep only the PDF
+                for extension in ('tex', 'aux', 'log', 'out'):
+                    try:
+                        os.remove(os.path.join(workdir, f"{filename}.{extension}"))
+                    except OSError:
+                        pass
             return pdf_path
             
         except subprocess.TimeoutExpired:
@@ -129,8 +414,43 @@ class PDFGenerator:
             print(f"{'='*60}\n")
             raise
     
+    def solution_key(self, solution_data):
+        """Hash of everything that appears in a solution's PDF (same key -> same PDF)"""
+        fields = {key: solution_data.get(key) for key in SOLUTION_PDF_FIELDS}
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:32]
+    
+    def content_key(self, latex_content):
+        """Stable hash of the full LaTeX source (graphs are referenced by content-hashed paths)"""
+        return hashlib.sha256(latex_content.encode('utf-8')).hexdigest()[:32]
+    
+    def store_cached_pdf(self, pdf_path, cached_pdf):
+        """Copy a fresh PDF into the cache (atomically) and keep the cache bounded"""
+        temp_path = f"{cached_pdf}.{os.getpid()}.tmp"
+        shutil.copyfile(pdf_path, temp_path)
+        os.replace(temp_path, cached_pdf)
+        
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_file()]
+        if len(entries) <= self.cache_max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.cache_max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    
     def build_latex_document(self, solution_data):
         """Build complete LaTeX document - PROPERLY ESCAPED"""
+        return LATEX_PREAMBLE + self.build_latex_body(solution_data)
+    
+    def build_latex_body(self, solution_data, render_math=None):
+        """
+        Everything after the fixed preamble - PROPERLY ESCAPED
+        With render_math, formulas in the model text are typeset (see LatexRenderer)
+        """
+        if render_math is None:
+            render_math = self.render_math
+        render = self.latex_renderer.render if render_math else self.escape_for_latex
         
         print("Building LaTeX document...")
         
@@ -142,37 +462,25 @@ class PDFGenerator:
         confidence = solution_data.get('confidence', 90)
         reason = solution_data.get('one_sentence_reason', 'See analysis')
         all_agree = solution_data.get('all_agree', False)
+        graphs = [path for path in solution_data.get('graphs', []) if os.path.exists(path)]
         
         print(f"Strategy 1 length: {len(str(strategy_1))} chars")
         print(f"Strategy 2 length: {len(str(strategy_2))} chars")
         print(f"Strategy 3 length: {len(str(strategy_3))} chars")
         
         # Clean and escape text
-        strategy_1 = self.escape_for_latex(self.clean_text(strategy_1))
-        strategy_2 = self.escape_for_latex(self.clean_text(strategy_2))
-        strategy_3 = self.escape_for_latex(self.clean_text(strategy_3))
-        final_answer = self.escape_for_latex(str(final_answer))
-        reason = self.escape_for_latex(str(reason))
+        strategy_1 = render(self.clean_text(strategy_1))
+        strategy_2 = render(self.clean_text(strategy_2))
+        strategy_3 = render(self.clean_text(strategy_3))
+        final_answer = render(str(final_answer))
+        reason = render(str(reason))
         
         print(f"After escaping - Strategy 1: {len(strategy_1)} chars")
         print(f"After escaping - Strategy 2: {len(strategy_2)} chars")
         print(f"After escaping - Strategy 3: {len(strategy_3)} chars")
         
-        # Build document
-        latex = r'''\documentclass[10pt,a4paper]{article}
-\usepackage[utf8]{inputenc}
-\usepackage[T1]{fontenc}
-\usepackage{amsmath}
-\usepackage{amssymb}
-\usepackage{amsfonts}
-\usepackage{xcolor}
-\usepackage{geometry}
-\geometry{margin=1in}
-
-\definecolor{cengage}{RGB}{0,102,204}
-\definecolor{blackbook}{RGB}{204,0,102}
-\definecolor{olympiad}{RGB}{102,51,153}
-
+        # Build document (LATEX_PREAMBLE comes first, from the format or inline)
+        latex = r'''
 \title{\textbf{JEE Calculus Solution}}
 \author{Ultimate Calculus Bot}
 \date{\today}
@@ -221,95 +529,42 @@ class PDFGenerator:
 
 \textbf{All strategies agree:} ''' + ('Yes' if all_agree else 'No') + r'''
 
+''' + self.build_graphs_section(graphs) + r'''
 \end{document}'''
         
         print("✓ LaTeX document built successfully")
         return latex
     
+    def build_graphs_section(self, graphs):
+        """Embed the (vector PDF) graphs; empty when there are none"""
+        if not graphs:
+            return ""
+        
+        section = r'\section{Graphs}' + '\n\n'
+        for path in graphs:
+            # graphicx wants forward slashes, even on Windows
+            tex_path = os.path.abspath(path).replace(os.sep, '/')
+            section += (
+                r'\begin{center}' + '\n'
+                r'\includegraphics[width=\linewidth,height=0.8\textheight,keepaspectratio]{' + tex_path + '}\n'
+                r'\end{center}' + '\n\n'
+            )
+        return section
+    
     def clean_text(self, text):
         """Clean text before escaping"""
         if not text:
             return ""
         
-        text = str(text)
-        
-        # Remove excessive newlines
-        while '\n\n\n' in text:
-            text = text.replace('\n\n\n', '\n\n')
-        
-        # Remove control characters except newlines
-        text = ''.join(char for char in text if char == '\n' or (ord(char) >= 32 and ord(char) < 127) or ord(char) > 127)
-        
-        return text.strip()
+        # Collapse runs of blank lines, then drop control characters except newlines
+        text = BLANK_LINES_RE.sub('\n\n', str(text))
+        return CONTROL_CHARS_RE.sub('', text).strip()
     
     def escape_for_latex(self, text):
-        """Escape text for LaTeX - COMPREHENSIVE VERSION"""
+        """Escape text for LaTeX in one pass (see LATEX_ESCAPE_TABLE)"""
         if not text:
             return ""
         
-        text = str(text)
-        
-        # First pass: Handle backslashes (must be first!)
-        text = text.replace('\\', r'\textbackslash{}')
-        
-        # Second pass: Escape LaTeX special characters
-        replacements = {
-            '&': r'\&',
-            '%': r'\%',
-            '$': r'\$',
-            '#': r'\#',
-            '_': r'\_',
-            '{': r'\{',
-            '}': r'\}',
-            '~': r'\textasciitilde{}',
-            '^': r'\textasciicircum{}',
-        }
-        
-        for char, escaped in replacements.items():
-            text = text.replace(char, escaped)
-        
-        # Third pass: Handle problematic Unicode characters
-        unicode_replacements = {
-            '\u2019': "'",  # Right single quotation
-            '\u2018': "'",  # Left single quotation  
-            '\u201c': '"',  # Left double quotation
-            '\u201d': '"',  # Right double quotation
-            '\u2013': '--', # En dash
-            '\u2014': '---', # Em dash
-            '\u2026': '...', # Ellipsis
-            '\u00a0': ' ',  # Non-breaking space
-            '\u00b0': r'$^\circ$',  # Degree symbol
-            '\u00b2': r'$^2$',  # Superscript 2
-            '\u00b3': r'$^3$',  # Superscript 3
-            '\u221e': r'$\infty$',  # Infinity
-            '\u03c0': r'$\pi$',  # Pi
-            '\u222b': r'$\int$',  # Integral
-            '\u2211': r'$\sum$',  # Sum
-            '\u221a': r'$\sqrt{}$',  # Square root
-            '\u2264': r'$\leq$',  # Less than or equal
-            '\u2265': r'$\geq$',  # Greater than or equal
-            '\u2260': r'$\neq$',  # Not equal
-            '\u00d7': r'$\times$',  # Multiplication
-            '\u00f7': r'$\div$',  # Division
-            '\u00b1': r'$\pm$',  # Plus-minus
-        }
-        
-        for unicode_char, replacement in unicode_replacements.items():
-            text = text.replace(unicode_char, replacement)
-        
-        # Fourth pass: Remove any remaining high Unicode that might cause issues
-        safe_text = []
-        for char in text:
-            code = ord(char)
-            # Keep: ASCII (0-127), newlines, common Latin (128-255)
-            if code < 256 or char == '\n':
-                safe_text.append(char)
-            elif code in range(0x0391, 0x03A9):  # Greek uppercase
-                safe_text.append(char)
-            elif code in range(0x03B1, 0x03C9):  # Greek lowercase  
-                safe_text.append(char)
-            else:
-                # Replace unknown Unicode with space
-                safe_text.append(' ')
-        
-        return ''.join(safe_text)
+        text = str(text).translate(LATEX_ESCAPE_TABLE)
+        # Any remaining high Unicode (beyond Latin-1 and Greek letters) becomes a space
+        return UNSAFE_UNICODE_RE.sub(' ', text)
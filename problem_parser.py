@@ -0,0 +1,134 @@
+"""
+Typed Problem Parser
+Turns a student's typed message ("integrate x^2*e^x") into a SymPy expression
+so simple problems can skip image enhancement and vision OCR entirely
+"""
+
+import re
+from typing import Dict, Optional
+
+from sympy import E, log, pi, symbols
+from sympy.parsing.sympy_parser import (
+    convert_xor,
+    implicit_multiplication_application,
+    parse_expr,
+    standard_transformations,
+)
+
+TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application, convert_xor)
+
+# Unicode and JEE-notation rewrites applied before parsing
+UNICODE_REPLACEMENTS = {
+    '²': '^2',
+    '³': '^3',
+    'π': 'pi',
+    '·': '*',
+    '×': '*',
+    '÷': '/',
+    '−': '-',
+    '√': 'sqrt',
+    '∞': 'oo',
+    '∫': 'integrate ',
+}
+
+INTEGRATE_RE = re.compile(
+    r'^(?:find\s+|evaluate\s+|compute\s+)?(?:the\s+)?'
+    r'(?:integrate|integration\s+of|integral\s+of|antiderivative\s+of)\s+'
+    r'(?P<expr>.+?)'
+    r'(?:\s*,?\s*d(?P<var>[a-z]))?'
+    r'(?:\s+(?:from|between)\s+(?P<lower>\S+)\s+(?:to|and)\s+(?P<upper>\S+))?\s*$'
+)
+
+DIFFERENTIATE_RE = re.compile(
+    r'^(?:find\s+)?(?:the\s+)?'
+    r'(?:differentiate|derivative\s+of|d/d(?P<var>[a-z]))\s+'
+    r'(?:(?:y|f\([a-z]\))\s*=\s*)?'
+    r'(?P<expr>.+?)'
+    r'(?:\s+(?:w\.?r\.?t\.?|with\s+respect\s+to)\s+(?P<wrt>[a-z]))?\s*$'
+)
+
+# Words that suggest a calculus question even when we cannot parse it ourselves
+PROBLEM_KEYWORDS = [
+    'integrat', 'integral', 'differentiat', 'derivative', 'd/dx', 'dy/dx',
+    'area', 'tangent', 'normal', 'limit', 'maxim', 'minim',
+]
+
+
+class ProblemParser:
+    def __init__(self):
+        self.local_dict = {'e': E, 'ln': log, 'pi': pi}
+
+    def normalize(self, text: str) -> str:
+        """Lower-case, strip punctuation and rewrite Unicode math symbols"""
+        text = text.strip().lower()
+        for char, replacement in UNICODE_REPLACEMENTS.items():
+            text = text.replace(char, replacement)
+        text = text.rstrip('?.!')
+        # "∫x² dx is equal to" / "... equals" as printed in JEE papers
+        text = re.sub(r'\s*(?:is\s+equal\s+to|is\s+equal|equals|is|=)\s*:?$', '', text)
+        text = re.sub(r'\s+', ' ', text)
+        return text.strip()
+
+    def parse_expression(self, expr_text: str, evaluate: bool = True):
+        """
+        Parse a single math expression written the way students type it
+        evaluate=False keeps the written form (for display, e.g. x^2 - 2x + 2 stays in order)
+        """
+        expr_text = re.sub(r'\be\s*\^', 'E^', expr_text.strip())
+        # |f(x)| -> Abs(f(x)); JEE definite integrals use it constantly
+        expr_text = re.sub(r'\|([^|]+)\|', r'Abs(\1)', expr_text)
+        return parse_expr(expr_text, local_dict=self.local_dict, transformations=TRANSFORMATIONS,
+                          evaluate=evaluate)
+
+    def parse(self, text: str) -> Optional[Dict]:
+        """
+        Parse a typed problem
+
+        Returns:
+            Dict with operation ('integrate' / 'differentiate'), expression,
+            variable and optional (lower, upper) limits, or None if the
+            message is not a problem we can parse ourselves
+        """
+        normalized = self.normalize(text)
+
+        try:
+            match = INTEGRATE_RE.match(normalized)
+            if match:
+                variable = symbols(match.group('var') or 'x')
+                limits = None
+                if match.group('lower') is not None:
+                    limits = (
+                        self.parse_expression(match.group('lower')),
+                        self.parse_expression(match.group('upper')),
+                    )
+                return {
+                    'operation': 'integrate',
+                    'expression': self.parse_expression(match.group('expr')),
+                    'variable': variable,
+                    'limits': limits,
+                    'source': text,
+                }
+
+            match = DIFFERENTIATE_RE.match(normalized)
+            if match:
+                variable = symbols(match.group('wrt') or match.group('var') or 'x')
+                return {
+                    'operation': 'differentiate',
+                    'expression': self.parse_expression(match.group('expr')),
+                    'variable': variable,
+                    'limits': None,
+                    'source': text,
+                }
+        except Exception as e:
+            print(f"✗ Could not parse typed problem '{text[:80]}': {e}")
+
+        return None
+
+    def looks_like_problem(self, text: str) -> bool:
+        """Check if free text is worth sending to Gemini as a problem"""
+        lowered = text.lower()
+        return any(keyword in lowered for keyword in PROBLEM_KEYWORDS) or '∫' in text
+
+    def cache_key(self, problem: Dict) -> str:
+        """Canonical key so 'integrate x^2' and 'integral of x**2 dx' share a cache entry"""
+        return f"{problem['operation']}|{problem['variable']}|{problem['expression']}|{problem['limits']}"
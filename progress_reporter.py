@@ -0,0 +1,209 @@
+"""
+Progress Reporter
+Keeps the "analysis in progress" message up to date without slowing the
+pipeline down: stage changes only mark the message dirty, a background task
+edits it, rapid stage changes are merged into one edit, edits are spaced per
+message and drawn from a bot-wide token bucket (Telegram flood limits), and
+the text shows real elapsed time and an estimate from measured stage durations
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# (stage, label) in pipeline order
+PIPELINE_STAGES = [
+    ('enhance', 'Image preprocessing'),
+    ('solve', 'OCR, triple-strategy solving & SymPy verification'),
+    ('pdf', 'Generating PDF with graphs'),
+]
+
+# Starting estimates (seconds) until real durations have been measured
+DEFAULT_STAGE_SECONDS = {'enhance': 5, 'solve': 240, 'pdf': 30}
+
+# Weight of the newest duration in the moving average
+DURATION_SMOOTHING = 0.2
+
+# Pause after a stage change so stages finishing back-to-back share one edit (seconds)
+SETTLE_SECONDS = 0.3
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate: tokens added per second
+            capacity: largest burst (default: one second's worth)
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait for a token (callers are served in order)"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class StageClock:
+    """Moving averages of how long each pipeline stage takes"""
+
+    def __init__(self, defaults: Dict[str, float] = None):
+        self.seconds = dict(defaults or DEFAULT_STAGE_SECONDS)
+
+    def record(self, stage: str, seconds: float):
+        if stage in self.seconds:
+            self.seconds[stage] += DURATION_SMOOTHING * (seconds - self.seconds[stage])
+        else:
+            self.seconds[stage] = seconds
+
+    def remaining(self, stages: List[str], current: Optional[str], in_stage: float) -> float:
+        """Estimated seconds left: rest of the current stage plus every later one"""
+        if current not in stages:
+            return sum(self.seconds.get(stage, 0) for stage in stages)
+        index = stages.index(current)
+        left = max(0.0, self.seconds.get(current, 0) - in_stage)
+        return left + sum(self.seconds.get(stage, 0) for stage in stages[index + 1:])
+
+
+class ProgressReporter:
+    def __init__(self, message, limiter: TokenBucket, clock: StageClock,
+                 stages: List[Tuple[str, str]] = None, min_interval: float = None,
+                 refresh_interval: float = None):
+        """
+        Args:
+            message: Telegram message to keep edited
+            limiter: bot-wide token bucket shared by every reporter
+            clock: measured stage durations (updated as stages finish)
+            stages: (stage, label) shown, in order (default PIPELINE_STAGES)
+            min_interval: least time between two edits of this message (default from PROGRESS_MIN_INTERVAL)
+            refresh_interval: re-edit with the elapsed time this often while a stage runs (default from PROGRESS_REFRESH_SECONDS)
+        """
+        self.message = message
+        self.limiter = limiter
+        self.clock = clock
+        self.stages = PIPELINE_STAGES if stages is None else stages
+        self.min_interval = min_interval or float(os.getenv('PROGRESS_MIN_INTERVAL', '3'))
+        self.refresh_interval = refresh_interval or float(os.getenv('PROGRESS_REFRESH_SECONDS', '20'))
+
+        self.started = time.monotonic()
+        self.current = None
+        self.stage_started = None
+        self.last_text = None
+        # Earliest time the next edit may go out, and the end of a Telegram RetryAfter pause
+        self.next_edit = 0.0
+        self.retry_until = 0.0
+        self.dirty = asyncio.Event()
+        # Checked by run() itself: a cancel alone can be swallowed while it waits on dirty
+        self.stopping = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    def stage(self, name: str):
+        """Enter a stage; returns at once, the message is edited in the background"""
+        now = time.monotonic()
+        self.close_stage(now)
+        self.current = name
+        self.stage_started = now
+        self.dirty.set()
+
+    def close_stage(self, now: float):
+        if self.current is not None:
+            self.clock.record(self.current, now - self.stage_started)
+            self.current = None
+
+    async def run(self):
+        stopping = asyncio.create_task(self.stopping.wait())
+        try:
+            while not self.stopping.is_set():
+                dirty = asyncio.create_task(self.dirty.wait())
+                await asyncio.wait({dirty, stopping}, timeout=self.refresh_interval,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                dirty.cancel()
+                # Stage changes arriving during this wait are merged into one edit
+                wait = max(self.next_edit - time.monotonic(), SETTLE_SECONDS if self.dirty.is_set() else 0)
+                if wait > 0:
+                    await asyncio.wait({stopping}, timeout=wait)
+                if self.stopping.is_set():
+                    break
+                self.dirty.clear()
+                await self.edit(self.render())
+        finally:
+            stopping.cancel()
+
+    def render(self) -> str:
+        now = time.monotonic()
+        names = [name for name, _ in self.stages]
+        index = names.index(self.current) if self.current in names else -1
+        lines = ["🔍 **ANALYSIS IN PROGRESS**", ""]
+        for position, (name, label) in enumerate(self.stages):
+            mark = "✅" if position < index else "⏳" if position == index else "▫️"
+            lines.append(f"{mark} Stage {position + 1}/{len(self.stages)}: {label}")
+        remaining = self.clock.remaining(names, self.current, now - (self.stage_started or now))
+        lines += ["", f"⏱️ {format_duration(now - self.started)} elapsed · ~{format_estimate(remaining)} left"]
+        return '\n'.join(lines)
+
+    async def edit(self, text: str, **kwargs) -> bool:
+        """One rate-limited edit; failures are logged, never raised"""
+        if text == self.last_text and not kwargs:
+            return True
+        await self.limiter.acquire()
+        self.next_edit = time.monotonic() + self.min_interval
+        try:
+            await self.message.edit_text(text, parse_mode='Markdown', **kwargs)
+            self.last_text = text
+            return True
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            self.retry_until = self.next_edit = time.monotonic() + retry_after
+            logger.warning(f"Progress edits throttled by Telegram for {retry_after}s")
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return True
+            logger.warning(f"Progress edit rejected: {e}")
+        except Exception as e:
+            logger.warning(f"Progress edit failed: {e}")
+        return False
+
+    async def stop(self):
+        """Stop background edits (records the running stage's duration)"""
+        self.close_stage(time.monotonic())
+        self.stopping.set()
+        # An edit in flight is abandoned rather than waited for
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+    async def finish(self, text: str, **kwargs):
+        """Stop, then replace the progress text with text (waits out a flood-control pause)"""
+        await self.stop()
+        wait = self.retry_until - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if not await self.edit(text, **kwargs):
+            # The final text carries the answer (and buttons): send it on its own
+            await self.message.reply_text(text, parse_mode='Markdown', **kwargs)
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def format_estimate(seconds: float) -> str:
+    if seconds < 60:
+        return f"{max(5, round(seconds / 5) * 5)} s"
+    return f"{round(seconds / 60)} min"
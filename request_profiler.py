@@ -0,0 +1,153 @@
+"""
+Request Profiler
+Opt-in profiling of single requests: cProfile on the event-loop thread, a
+stack sampler over every thread (PDF builds and graphs run in executors)
+written as flamegraph-ready collapsed stacks, and tracemalloc snapshots of
+what the request allocated. Requests are sampled at PROFILE_SAMPLE_RATE so
+it can stay on in production; admins can force it on with /profile on
+
+Note: profiles cover everything the process does while the request runs,
+so concurrent requests show up too - profile at low load for clean numbers
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames of threads that are only waiting; left out of the collapsed stacks
+IDLE_MODULES = ('threading.py', 'queue.py', 'selectors.py', 'thread.py')
+
+# Lines of the cProfile and tracemalloc reports
+REPORT_LINES = 40
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.halt = threading.Event()
+
+    def run(self):
+        while not self.halt.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.halt.set()
+        self.join()
+
+
+class RequestProfiler:
+    def __init__(self, output_dir: str = None, sample_rate: float = None, interval: float = None):
+        """
+        Args:
+            output_dir: where profiles are written (default from PROFILE_DIR)
+            sample_rate: fraction of requests profiled (default from PROFILE_SAMPLE_RATE, 0 = off)
+            interval: stack sampling period in seconds (default from PROFILE_SAMPLE_INTERVAL)
+        """
+        self.output_dir = output_dir or os.getenv('PROFILE_DIR', 'profiles')
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.interval = interval or float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+        # /profile on: every request until /profile off
+        self.forced = False
+        # cProfile allows one profiler per thread: one request at a time
+        self.active = False
+        self.profiled = 0
+
+    def should_profile(self) -> bool:
+        return not self.active and (self.forced or random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, request_id: str):
+        """Profile the block if this request is sampled; yields the output prefix or None"""
+        if not self.should_profile():
+            yield None
+            return
+
+        self.active = True
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{request_id}")
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(25)
+        memory_before = tracemalloc.take_snapshot()
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield prefix
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+            memory_after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                self.write(prefix, profiler, sampler, memory_before, memory_after, peak, elapsed)
+                self.profiled += 1
+                logger.info(f"Profile written: {prefix}.* ({elapsed:.1f}s)")
+            except OSError as e:
+                logger.error(f"Could not write profile {prefix}: {e}")
+            finally:
+                self.active = False
+
+    def write(self, prefix: str, profiler: cProfile.Profile, sampler: StackSampler,
+              memory_before, memory_after, peak: int, elapsed: float):
+        # .prof loads in snakeviz / pstats; .txt is the same, readable in a chat or terminal
+        profiler.dump_stats(f"{prefix}.prof")
+        report = io.StringIO()
+        report.write(f"Request wall time: {elapsed:.3f}s\n\n")
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(REPORT_LINES)
+        with open(f"{prefix}.txt", 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+
+        # flamegraph.pl / speedscope / inferno take "frame;frame;frame count" lines
+        with open(f"{prefix}.collapsed", 'w', encoding='utf-8') as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        with open(f"{prefix}.memory.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Peak traced memory: {peak / 1e6:.1f} MB\n")
+            f.write(f"Top {REPORT_LINES} allocation sites by growth during the request:\n\n")
+            for stat in memory_after.compare_to(memory_before, 'lineno')[:REPORT_LINES]:
+                f.write(f"{stat}\n")
+
+    def status(self) -> str:
+        mode = "on (every request)" if self.forced else f"sampling {self.sample_rate:.1%} of requests"
+        return f"{mode}, {self.profiled} profiles written to {self.output_dir}/"
+
+    def latest(self) -> Optional[str]:
+        """Prefix of the most recent profile, if any"""
+        if not os.path.isdir(self.output_dir):
+            return None
+        reports = sorted(name for name in os.listdir(self.output_dir) if name.endswith('.txt')
+                         and not name.endswith('.memory.txt'))
+        return os.path.join(self.output_dir, reports[-1][:-len('.txt')]) if reports else None
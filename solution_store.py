@@ -0,0 +1,392 @@
+"""
+Persistent Solution Store
+SQLite (WAL) record of every solved problem: extracted problem, full
+solution_data, verification verdict, timings and the Telegram file_id of
+the delivered PDF, indexed by user and by image hash. Writes are queued and
+committed in batches by a background thread, so the bot never waits on disk;
+reads are blocking and meant to be run in an executor from async code.
+RedisSolutionStore keeps the same records on a Redis server, so solver
+workers on other hosts share one store with the bot
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sympy import Basic, srepr, sympify
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS solutions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    chat_id INTEGER,
+    created_at REAL NOT NULL,
+    image_hash TEXT,
+    solution_key TEXT,
+    source TEXT,
+    problem_text TEXT,
+    final_answer TEXT,
+    confidence INTEGER,
+    verified INTEGER,
+    timings TEXT,
+    solution_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_solutions_user ON solutions (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_solutions_image ON solutions (image_hash);
+CREATE INDEX IF NOT EXISTS idx_solutions_key ON solutions (solution_key);
+CREATE TABLE IF NOT EXISTS pdf_files (
+    solution_key TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Sentinel that asks the writer thread to commit what it has and stop
+_STOP = object()
+
+REDIS_SCHEMES = ('redis://', 'rediss://', 'unix://')
+# Columns returned by recent()
+SUMMARY_FIELDS = ('created_at', 'source', 'problem_text', 'final_answer', 'confidence', 'verified')
+
+# Tagged values in solution_json: SymPy objects (as srepr) and tuples
+SYMPY_TAG = '__sympy__'
+TUPLE_TAG = '__tuple__'
+
+
+def encode(value):
+    """
+    JSON-ready copy of solution_data: the parsed problem and exact answer
+    keep their SymPy structure (srepr), tuples stay tuples
+    """
+    if isinstance(value, Basic):
+        return {SYMPY_TAG: srepr(value)}
+    if isinstance(value, dict):
+        return {str(key): encode(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return {TUPLE_TAG: [encode(item) for item in value]}
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def decode(value):
+    """Inverse of encode, applied to parsed solution_json"""
+    if isinstance(value, dict):
+        if len(value) == 1 and SYMPY_TAG in value:
+            return sympify(value[SYMPY_TAG])
+        if len(value) == 1 and TUPLE_TAG in value:
+            return tuple(decode(item) for item in value[TUPLE_TAG])
+        return {key: decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def load_solution(row) -> Optional[Dict]:
+    return decode(json.loads(row['solution_json'])) if row else None
+
+
+def open_solution_store(url: str = None):
+    """
+    Store named by url (default from SOLUTION_DB)
+        redis://host:6379/0          -> RedisSolutionStore
+        sqlite:///data/solutions.db, path -> SolutionStore
+    Unset: the Redis server of JOB_QUEUE_URL when workers use one (they may
+    run on other hosts), else data/solutions.db
+    """
+    url = os.getenv('SOLUTION_DB', '') if url is None else url
+    if not url:
+        job_queue_url = os.getenv('JOB_QUEUE_URL', '')
+        url = job_queue_url if job_queue_url.startswith(REDIS_SCHEMES) else 'data/solutions.db'
+    if url.startswith(REDIS_SCHEMES):
+        return RedisSolutionStore(url)
+    return SolutionStore(url[len('sqlite:///'):] if url.startswith('sqlite:///') else url)
+
+
+def solution_row(solution_data: Dict, user_id: int = None, chat_id: int = None,
+                 image_hash: str = None, solution_key: str = None, timings: Dict = None) -> Dict:
+    """Column values stored for one solved problem"""
+    verification = solution_data.get('sympy_verification') or {}
+    verified = True if solution_data.get('source') == 'sympy' else verification.get('verified')
+    problem = solution_data.get('problem')
+    return {
+        'user_id': user_id,
+        'chat_id': chat_id,
+        'created_at': time.time(),
+        'image_hash': image_hash,
+        'solution_key': solution_key,
+        'source': solution_data.get('source', 'gemini'),
+        'problem_text': solution_data.get('problem_text') or (problem if isinstance(problem, str) else None),
+        'final_answer': str(solution_data.get('final_answer', '')),
+        'confidence': solution_data.get('confidence'),
+        'verified': None if verified is None else int(bool(verified)),
+        'timings': json.dumps(timings or {}),
+        'solution_json': json.dumps(encode(solution_data)),
+    }
+
+
+def batches(writes: queue.Queue, batch_size: int, flush_interval: float):
+    """
+    Writer-thread side of a write queue: yield lists of queued writes (at most
+    batch_size, none older than flush_interval) until _STOP. Writes are marked
+    done once the caller has handled their batch
+    """
+    stopping = False
+    while not stopping:
+        batch = [writes.get()]
+        deadline = time.monotonic() + flush_interval
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(writes.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        items = [item for item in batch if item is not _STOP]
+        stopping = len(items) < len(batch)
+        try:
+            if items:
+                yield items
+        finally:
+            for _ in batch:
+                writes.task_done()
+
+
+class SolutionStore:
+    def __init__(self, path: str = None, batch_size: int = 50, flush_interval: float = 0.5):
+        """
+        Args:
+            path: SQLite file (default from SOLUTION_DB)
+            batch_size: most writes committed in one transaction
+            flush_interval: longest a queued write waits before it is committed (seconds)
+        """
+        self.path = path or os.getenv('SOLUTION_DB', 'data/solutions.db')
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        connection = self.connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self.local = threading.local()
+        self.writes = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name='solution-store-writer', daemon=True)
+        self.writer.start()
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute('PRAGMA journal_mode=WAL')
+        # WAL + NORMAL: durable across process crashes, fsync only at checkpoints
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def reader(self) -> sqlite3.Connection:
+        """One read connection per thread (WAL readers never block the writer)"""
+        if getattr(self.local, 'connection', None) is None:
+            self.local.connection = self.connect()
+        return self.local.connection
+
+    def save_solution(self, solution_data: Dict, user_id: int = None, chat_id: int = None,
+                      image_hash: str = None, solution_key: str = None, timings: Dict = None):
+        """Queue a solved problem for storage (returns immediately)"""
+        row = solution_row(solution_data, user_id, chat_id, image_hash, solution_key, timings)
+        self.writes.put((
+            'INSERT INTO solutions (user_id, chat_id, created_at, image_hash, solution_key, source, '
+            'problem_text, final_answer, confidence, verified, timings, solution_json) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            tuple(row.values()),
+        ))
+
+    def save_file_id(self, solution_key: str, file_id: str):
+        """Queue the Telegram file_id of an uploaded PDF"""
+        self.writes.put((
+            'INSERT INTO pdf_files (solution_key, file_id, updated_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (solution_key) DO UPDATE SET file_id = excluded.file_id, updated_at = excluded.updated_at',
+            (solution_key, file_id, time.time()),
+        ))
+
+    def write_loop(self):
+        """Writer thread: drain the queue and commit in batches"""
+        connection = self.connect()
+        for statements in batches(self.writes, self.batch_size, self.flush_interval):
+            try:
+                with connection:
+                    for sql, params in statements:
+                        connection.execute(sql, params)
+            except sqlite3.Error as e:
+                print(f"⚠️ Solution store write failed ({len(statements)} rows dropped): {e}")
+        connection.close()
+
+    def flush(self):
+        """Block until every queued write is committed"""
+        self.writes.join()
+
+    def close(self):
+        """Commit pending writes and stop the writer thread"""
+        self.writes.put(_STOP)
+        self.writer.join()
+
+    def find_by_image_hash(self, image_hash: str) -> Optional[Dict]:
+        """Most recent solution for an identical image, or None"""
+        row = self.reader().execute(
+            'SELECT solution_json FROM solutions WHERE image_hash = ? ORDER BY created_at DESC LIMIT 1',
+            (image_hash,),
+        ).fetchone()
+        return load_solution(row)
+
+    def find_by_solution_key(self, solution_key: str) -> Optional[Dict]:
+        """A stored solution_data by its PDF content hash, or None"""
+        row = self.reader().execute(
+            'SELECT solution_json FROM solutions WHERE solution_key = ? ORDER BY created_at DESC LIMIT 1',
+            (solution_key,),
+        ).fetchone()
+        return load_solution(row)
+
+    def recent(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """A user's latest solutions (summary columns only)"""
+        rows = self.reader().execute(
+            f"SELECT id, {', '.join(SUMMARY_FIELDS)} "
+            'FROM solutions WHERE user_id = ? ORDER BY created_at DESC LIMIT ?',
+            (user_id, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, solution_id: int, user_id: int) -> Optional[Dict]:
+        """A stored solution_data, only for the user who asked for it"""
+        row = self.reader().execute(
+            'SELECT solution_json FROM solutions WHERE id = ? AND user_id = ?',
+            (solution_id, user_id),
+        ).fetchone()
+        return load_solution(row)
+
+    def file_id(self, solution_key: str) -> Optional[str]:
+        """file_id of the PDF uploaded for this solution hash, if any"""
+        row = self.reader().execute(
+            'SELECT file_id FROM pdf_files WHERE solution_key = ?', (solution_key,),
+        ).fetchone()
+        return row['file_id'] if row else None
+
+
+class RedisSolutionStore:
+    def __init__(self, url: str, batch_size: int = 50, flush_interval: float = 0.5,
+                 history_size: int = None, client=None):
+        """
+        Args:
+            url: Redis-compatible server (redis://host:port/db)
+            batch_size / flush_interval: as for SolutionStore (writes go out in one pipeline)
+            history_size: solutions kept in each user's history list (default from SOLUTION_HISTORY_SIZE)
+            client: an already-connected client exposing the same commands (e.g. a local stand-in)
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("SOLUTION_DB points at Redis - install the 'redis' package") from None
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.redis = client
+        self.prefix = os.getenv('SOLUTION_STORE_PREFIX', 'calculus_bot:solutions')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.history_size = history_size or int(os.getenv('SOLUTION_HISTORY_SIZE', '100'))
+
+        self.writes = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name='solution-store-writer', daemon=True)
+        self.writer.start()
+
+    def key(self, *parts) -> str:
+        return ':'.join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def save_solution(self, solution_data: Dict, user_id: int = None, chat_id: int = None,
+                      image_hash: str = None, solution_key: str = None, timings: Dict = None):
+        """Queue a solved problem for storage (returns immediately)"""
+        self.writes.put(('solution', solution_row(solution_data, user_id, chat_id, image_hash, solution_key, timings)))
+
+    def save_file_id(self, solution_key: str, file_id: str):
+        """Queue the Telegram file_id of an uploaded PDF"""
+        self.writes.put(('file_id', (solution_key, file_id)))
+
+    def write_loop(self):
+        """Writer thread: drain the queue and send each batch in one pipeline"""
+        for writes in batches(self.writes, self.batch_size, self.flush_interval):
+            try:
+                pipeline = self.redis.pipeline()
+                for kind, value in writes:
+                    if kind == 'file_id':
+                        pipeline.hset(self.key('pdf_files'), value[0], value[1])
+                    else:
+                        self.queue_solution(pipeline, value)
+                pipeline.execute()
+            except Exception as e:
+                print(f"⚠️ Solution store write failed ({len(writes)} rows dropped): {e}")
+
+    def queue_solution(self, pipeline, row: Dict):
+        solution_id = self.redis.incr(self.key('next_id'))
+        pipeline.hset(self.key('solution', solution_id),
+                      mapping={field: value for field, value in row.items() if value is not None})
+        if row['user_id'] is not None:
+            pipeline.lpush(self.key('user', row['user_id']), solution_id)
+            pipeline.ltrim(self.key('user', row['user_id']), 0, self.history_size - 1)
+        if row['image_hash']:
+            pipeline.set(self.key('image', row['image_hash']), solution_id)
+        if row['solution_key']:
+            pipeline.set(self.key('pdf_key', row['solution_key']), solution_id)
+
+    def flush(self):
+        """Block until every queued write is sent"""
+        self.writes.join()
+
+    def close(self):
+        """Send pending writes and stop the writer thread"""
+        self.writes.put(_STOP)
+        self.writer.join()
+
+    def load(self, solution_id) -> Optional[Dict]:
+        if solution_id is None:
+            return None
+        solution_json = self.redis.hget(self.key('solution', solution_id), 'solution_json')
+        return decode(json.loads(solution_json)) if solution_json else None
+
+    def find_by_image_hash(self, image_hash: str) -> Optional[Dict]:
+        """Most recent solution for an identical image, or None"""
+        return self.load(self.redis.get(self.key('image', image_hash)))
+
+    def find_by_solution_key(self, solution_key: str) -> Optional[Dict]:
+        """A stored solution_data by its PDF content hash, or None"""
+        return self.load(self.redis.get(self.key('pdf_key', solution_key)))
+
+    def recent(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """A user's latest solutions (summary columns only)"""
+        entries = []
+        for solution_id in self.redis.lrange(self.key('user', user_id), 0, limit - 1):
+            values = self.redis.hmget(self.key('solution', solution_id), *SUMMARY_FIELDS)
+            if values[0] is None:
+                continue
+            entry = dict(zip(SUMMARY_FIELDS, values), id=int(solution_id))
+            entry['created_at'] = float(entry['created_at'])
+            if entry['verified'] is not None:
+                entry['verified'] = int(entry['verified'])
+            entries.append(entry)
+        return entries
+
+    def get(self, solution_id: int, user_id: int) -> Optional[Dict]:
+        """A stored solution_data, only for the user who asked for it"""
+        solution_key = self.key('solution', solution_id)
+        if self.redis.hget(solution_key, 'user_id') != str(user_id):
+            return None
+        return self.load(solution_id)
+
+    def file_id(self, solution_key: str) -> Optional[str]:
+        """file_id of the PDF uploaded for this solution hash, if any"""
+        return self.redis.hget(self.key('pdf_files'), solution_key)
@@ -0,0 +1,117 @@
+"""
+Solver Worker
+`python bot.py --worker`: pulls image jobs from the shared job queue, runs
+the same solve-and-deliver pipeline as the bot process (CalculusSolver,
+SymPy verification, PDFGenerator) and posts results straight to the chat
+through the Bot API. Run as many workers, on as many hosts, as needed
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timezone
+
+from telegram import Bot, Chat, Message
+
+from webhook_server import start_metrics_server
+from workspace import request_workspace
+
+logger = logging.getLogger(__name__)
+
+
+class SolverWorker:
+    def __init__(self, calculus_bot, job_queue, token: str, concurrency: int = None,
+                 poll_interval: float = None):
+        """
+        Args:
+            calculus_bot: CalculusBot whose pipeline solves and delivers each job
+            job_queue: SQLiteJobQueue / RedisJobQueue shared with the bot process
+            token: Telegram bot token (results are posted as the same bot)
+            concurrency: jobs this process works on at once (default from WORKER_CONCURRENCY)
+            poll_interval: wait between claims when the queue is empty (default from WORKER_POLL_SECONDS)
+        """
+        self.calculus_bot = calculus_bot
+        self.job_queue = job_queue
+        self.token = token
+        self.concurrency = concurrency or int(os.getenv('WORKER_CONCURRENCY', '2'))
+        self.poll_interval = poll_interval or float(os.getenv('WORKER_POLL_SECONDS', '1.0'))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.bot = None
+        self.metrics_server = None
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        # Keep a reference: the server runs for the life of the worker
+        self.metrics_server = await start_metrics_server()
+        async with Bot(self.token) as bot:
+            self.bot = bot
+            await asyncio.gather(*(self.work(f"{self.worker_id}/{slot}") for slot in range(self.concurrency)))
+
+    async def work(self, worker: str):
+        """One job at a time: claim, solve and deliver, then report back to the queue"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                job = await loop.run_in_executor(None, self.job_queue.claim, worker)
+            except Exception as e:
+                logger.error(f"Job queue unavailable: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            logger.info(f"{worker} took job {job['id']} (attempt {job['attempts']})")
+            heartbeat = asyncio.create_task(self.heartbeat(job['id'], worker))
+            try:
+                await self.process(job)
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                await loop.run_in_executor(None, self.job_queue.fail, job['id'], str(e))
+            else:
+                await loop.run_in_executor(None, self.job_queue.complete, job['id'])
+            finally:
+                heartbeat.cancel()
+
+    async def heartbeat(self, job_id: int, worker: str):
+        """Renew the job's lease every third of it while it runs, so only dead workers lose jobs"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.job_queue.lease_seconds / 3)
+            try:
+                held = await loop.run_in_executor(None, self.job_queue.renew, job_id, worker)
+            except Exception as e:
+                logger.warning(f"Lease renewal for job {job_id} failed: {e}")
+                continue
+            if not held:
+                logger.warning(f"Job {job_id} lease lost: another worker may be solving it too")
+                return
+
+    async def process(self, job: dict):
+        message = self.message(job['chat_id'], job['message_id'])
+        processing_msg = None
+        if job['progress_message_id'] is not None:
+            processing_msg = self.message(job['chat_id'], job['progress_message_id'])
+
+        try:
+            processing_msg = await self.calculus_bot.show_started(message, processing_msg)
+            with request_workspace('job') as workdir:
+                image_path = os.path.join(workdir, 'photo.jpg')
+                with open(image_path, 'wb') as image_file:
+                    image_file.write(job['image'])
+                await self.calculus_bot.solve_image(message, processing_msg, image_path, job['user_id'], workdir)
+        except Exception as e:
+            await self.calculus_bot.report_image_error(message, e)
+            raise
+
+    def message(self, chat_id: int, message_id: int) -> Message:
+        """A Message the worker can reply to or edit without having received the Update"""
+        message = Message(
+            message_id=message_id,
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=chat_id, type=Chat.PRIVATE),
+        )
+        message.set_bot(self.bot)
+        return message
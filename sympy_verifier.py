@@ -6,15 +6,27 @@ This is the CRITICAL safety net that catches Gemini's mistakes
 
 from sympy import *
 from sympy.parsing.sympy_parser import parse_expr
-import matplotlib.pyplot as plt
 import numpy as np
 from typing import Dict, List, Any
+import os
 import re
+from pattern_index import PatternIndex
+from numeric_integrator import NumericIntegrator
+from graph_renderer import GraphRenderer
+
+# Where antiderivatives are checked numerically: irrational, both signs, off common poles
+ANTIDERIVATIVE_CHECK_POINTS = (-2.71, -1.37, -0.43, 0.29, 0.83, 1.61, 2.47, 3.9)
+
 
 class SympyVerifier:
     def __init__(self):
         self.x = symbols('x')
         self.t = symbols('t')
+        self.pattern_index = PatternIndex()
+        self.numeric = NumericIntegrator()
+        self.graph_renderer = GraphRenderer()
+        # Vector PDF graphs for pdflatex; PNG for the TeX-free mathtext PDF backend
+        self.graph_format = os.getenv('GRAPH_FORMAT', 'pdf')
         
     def verify_solution(self, solution_data: Dict) -> Dict:
         """
@@ -175,8 +187,8 @@ class SympyVerifier:
     
     def generate_graphs(self, solution_data: Dict) -> List[str]:
         """
-        Generate graphs using Matplotlib
-        Returns list of file paths to saved graph images
+        Generate graphs of the extracted function with the thread-safe renderer
+        Returns list of paths to cached graphs (GRAPH_FORMAT, vector PDF by default) for the PDF
         """
         graph_files = []
         
@@ -185,87 +197,152 @@ class SympyVerifier:
             text = solution_data.get('full_analysis', '').lower()
             needs_graph = any(word in text for word in ['graph', 'plot', 'curve', 'area', 'tangent'])
             
-            if not needs_graph:
+            problem = solution_data.get('problem')
+            if not needs_graph or problem is None:
                 return graph_files
             
-            # Create sample graphs (in production, parse actual functions)
-            fig, axes = plt.subplots(2, 2, figsize=(12, 10))
-            fig.suptitle('Calculus Analysis', fontsize=16, fontweight='bold')
-            
-            # Graph 1: Original function
-            x_vals = np.linspace(-5, 5, 1000)
-            
-            # Example: f(x) = x²
-            y_vals = x_vals**2
-            axes[0, 0].plot(x_vals, y_vals, 'b-', linewidth=2, label='f(x) = x²')
-            axes[0, 0].grid(True, alpha=0.3)
-            axes[0, 0].axhline(y=0, color='k', linewidth=0.5)
-            axes[0, 0].axvline(x=0, color='k', linewidth=0.5)
-            axes[0, 0].set_xlabel('x', fontsize=12)
-            axes[0, 0].set_ylabel('f(x)', fontsize=12)
-            axes[0, 0].set_title('Original Function', fontsize=14, fontweight='bold')
-            axes[0, 0].legend()
-            
-            # Graph 2: Derivative
-            y_deriv = 2 * x_vals
-            axes[0, 1].plot(x_vals, y_deriv, 'r-', linewidth=2, label="f'(x) = 2x")
-            axes[0, 1].grid(True, alpha=0.3)
-            axes[0, 1].axhline(y=0, color='k', linewidth=0.5)
-            axes[0, 1].axvline(x=0, color='k', linewidth=0.5)
-            axes[0, 1].set_xlabel('x', fontsize=12)
-            axes[0, 1].set_ylabel("f'(x)", fontsize=12)
-            axes[0, 1].set_title('Derivative', fontsize=14, fontweight='bold')
-            axes[0, 1].legend()
-            
-            # Graph 3: Integral
-            y_integral = (x_vals**3) / 3
-            axes[1, 0].plot(x_vals, y_integral, 'g-', linewidth=2, label='∫f(x)dx = x³/3')
-            axes[1, 0].grid(True, alpha=0.3)
-            axes[1, 0].axhline(y=0, color='k', linewidth=0.5)
-            axes[1, 0].axvline(x=0, color='k', linewidth=0.5)
-            axes[1, 0].set_xlabel('x', fontsize=12)
-            axes[1, 0].set_ylabel('∫f(x)dx', fontsize=12)
-            axes[1, 0].set_title('Integral (Antiderivative)', fontsize=14, fontweight='bold')
-            axes[1, 0].legend()
-            
-            # Graph 4: Area under curve
-            x_fill = np.linspace(0, 3, 100)
-            y_fill = x_fill**2
-            axes[1, 1].fill_between(x_fill, 0, y_fill, alpha=0.3, color='blue', label='Area = ∫₀³ x²dx = 9')
-            axes[1, 1].plot(x_vals, y_vals, 'b-', linewidth=2)
-            axes[1, 1].grid(True, alpha=0.3)
-            axes[1, 1].axhline(y=0, color='k', linewidth=0.5)
-            axes[1, 1].axvline(x=0, color='k', linewidth=0.5)
-            axes[1, 1].set_xlabel('x', fontsize=12)
-            axes[1, 1].set_ylabel('f(x)', fontsize=12)
-            axes[1, 1].set_title('Area Under Curve', fontsize=14, fontweight='bold')
-            axes[1, 1].legend()
-            axes[1, 1].set_xlim(-1, 4)
-            axes[1, 1].set_ylim(-1, 10)
+            expr, var = problem['expression'], problem['variable']
+            limits, area = None, None
+            if problem['limits'] is not None:
+                limits = tuple(self.numeric.to_float(limit) for limit in problem['limits'])
+                if all(np.isfinite(limits)):
+                    area = self.numeric.integrate(expr, var, *limits)['value']
+                else:
+                    limits = None
             
-            plt.tight_layout()
-            
-            # Save graph
-            graph_path = 'calculus_graphs.png'
-            plt.savefig(graph_path, dpi=300, bbox_inches='tight')
-            plt.close()
-            
-            graph_files.append(graph_path)
+            graph_files.append(os.path.abspath(
+                self.graph_renderer.render_cached(expr, var, limits=limits, area=area, fmt=self.graph_format)
+            ))
             
         except Exception as e:
             print(f"Graph generation error: {e}")
         
         return graph_files
     
-    def compute_definite_integral(self, func_str: str, lower: float, upper: float) -> float:
-        """Compute definite integral numerically"""
+    def solve_parsed(self, problem: Dict, exact: bool = True) -> Dict:
+        """
+        Solve a parsed typed problem directly with SymPy (no Gemini)
+        Knowledge-base shortcuts are tried first; returns None when SymPy
+        cannot give a closed form. With exact=False definite integrals are
+        evaluated numerically only
+        """
+        expr = problem['expression']
+        var = problem['variable']
+        shortcuts = []
+        diverges = False
+
+        if problem['operation'] == 'differentiate':
+            answer = simplify(diff(expr, var))
+            answer_text = self.format_answer(answer)
+        elif problem['limits'] is not None:
+            lower, upper = problem['limits']
+            shortcut = self.pattern_index.match_definite(expr, var, lower, upper)
+            if shortcut is not None and shortcut['value'] is not None:
+                answer = sympify(shortcut['value'])
+                shortcuts = shortcut['shortcuts']
+            elif exact:
+                answer = integrate(expr, (var, lower, upper))
+            else:
+                answer = Integral(expr, (var, lower, upper))
+            if answer.has(Integral):
+                return self.solve_numerically(expr, var, lower, upper)
+            answer = simplify(answer)
+            answer_text = self.format_answer(answer)
+            diverges = bool(answer.has(S.NaN, S.ComplexInfinity) or answer.is_infinite)
+            if diverges:
+                # Improper integral SymPy found to have no finite value
+                answer_text = "The integral diverges"
+            elif not answer.is_Integer and answer.is_number:
+                answer_text += f" ≈ {float(N(answer)):.6g}"
+        else:
+            matched = self.pattern_index.match(expr, var)
+            if matched is not None:
+                answer = matched['antiderivative']
+                shortcuts = matched['shortcuts']
+            else:
+                answer = integrate(expr, var)
+            if answer.has(Integral):
+                return None
+            answer = simplify(answer)
+            answer_text = self.format_answer(answer) + " + C"
+
+        # Cheap self-check: differentiating an antiderivative must give back the integrand
+        verified = True
+        if problem['operation'] == 'integrate' and problem['limits'] is None:
+            verified = self.check_antiderivative(answer, expr, var)
+
+        return {
+            'answer': answer,
+            'answer_text': answer_text,
+            'latex': r'\text{diverges}' if diverges else self.generate_latex(answer),
+            'verified': verified,
+            'shortcuts': shortcuts,
+        }
+
+    def check_antiderivative(self, antiderivative, integrand, var) -> bool:
+        """
+        d/dx antiderivative == integrand, symbolically for real x or else at
+        sample points (ln|3x - 1| style answers only simplify piecewise)
+        """
+        real = Dummy(str(var), real=True)
+        difference = diff(antiderivative.subs(var, real), real) - integrand.subs(var, real)
+        if simplify(difference) == 0:
+            return True
+
+        checked = 0
+        for point in ANTIDERIVATIVE_CHECK_POINTS:
+            try:
+                value = complex(difference.subs(real, point).evalf())
+                scale = abs(complex(integrand.subs(var, point).evalf()))
+            except (TypeError, ValueError, ZeroDivisionError):
+                continue
+            if not (np.isfinite(value) and np.isfinite(scale)):
+                continue
+            if abs(value) > 1e-9 * (1 + scale):
+                return False
+            checked += 1
+        return checked >= 3
+
+    def solve_numerically(self, expr, var, lower, upper) -> Dict:
+        """Numeric answer for a definite integral with no (quick) closed form"""
+        result = self.numeric.integrate(expr, var, lower, upper)
+        if not result['converged']:
+            return None
+        return {
+            'answer': Float(result['value']),
+            'answer_text': f"≈ {result['value']:.10g} (numeric, error < {max(result['error'], 1e-15):.1g})",
+            'latex': f"\\approx {result['value']:.10g}",
+            'verified': True,
+            'shortcuts': [],
+        }
+    
+    def format_answer(self, expression) -> str:
+        """Render an expression the way students type it (^ instead of **)"""
+        return str(expression).replace('**', '^')
+
+    def compute_definite_integral(self, func_str: str, lower: float, upper: float, exact: bool = False):
+        """
+        Compute definite integral
+        Numeric adaptive Gauss-Kronrod by default; symbolic integrate() only
+        when an exact closed form is requested
+        """
         try:
             func = parse_expr(func_str)
-            result = integrate(func, (self.x, lower, upper))
-            return float(result)
+            if exact:
+                return integrate(func, (self.x, lower, upper))
+            result = self.numeric.integrate(func, self.x, lower, upper)
+            if not result['converged']:
+                print(f"⚠️ Numeric integral did not converge (error ~{result['error']:.2g}, singular={result['singular']})")
+                return None
+            return result['value']
         except:
             return None
     
+    def compute_definite_integrals(self, problems: List[tuple]) -> List[Dict]:
+        """Batch version: many (func_str, lower, upper) integrals in vectorized passes"""
+        parsed = [(parse_expr(func_str), self.x, lower, upper) for func_str, lower, upper in problems]
+        return self.numeric.integrate_batch(parsed)
+    
     def compute_derivative(self, func_str: str) -> str:
         """Compute derivative symbolically"""
         try:
@@ -0,0 +1,135 @@
+"""
+In-memory stand-in for the redis.Redis commands the job queue and the
+solution store use (passed to them as client=)
+"""
+
+
+class FakeRedis:
+    def __init__(self, decode_responses: bool = False):
+        self.decode_responses = decode_responses
+        self.data = {}
+
+    @staticmethod
+    def encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).encode()
+
+    def out(self, value):
+        if value is None or not self.decode_responses:
+            return value
+        return value.decode()
+
+    def incr(self, key):
+        value = int(self.data.get(key, b'0')) + 1
+        self.data[key] = self.encode(value)
+        return value
+
+    def get(self, key):
+        return self.out(self.data.get(key))
+
+    def set(self, key, value, nx=False, ex=None):
+        # Expiry is not simulated
+        if nx and key in self.data:
+            return None
+        self.data[key] = self.encode(value)
+        return True
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        fields = self.data.setdefault(key, {})
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        for name, item in items.items():
+            fields[self.encode(name)] = self.encode(item)
+
+    def hget(self, key, field):
+        return self.out(self.data.get(key, {}).get(self.encode(field)))
+
+    def hmget(self, key, *fields):
+        return [self.hget(key, field) for field in fields]
+
+    def hgetall(self, key):
+        return {self.out(name): self.out(value) for name, value in self.data.get(key, {}).items()}
+
+    def hincrby(self, key, field, amount=1):
+        value = int(self.hget(key, field) or 0) + amount
+        self.hset(key, field, value)
+        return value
+
+    def lpush(self, key, *values):
+        self.data.setdefault(key, [])[:0] = [self.encode(value) for value in reversed(values)]
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(self.encode(value) for value in values)
+
+    def rpoplpush(self, source, destination):
+        if not self.data.get(source):
+            return None
+        value = self.data[source].pop()
+        self.lpush(destination, value)
+        return self.out(value)
+
+    def lrange(self, key, start, end):
+        values = self.data.get(key, [])
+        return [self.out(value) for value in values[start:None if end == -1 else end + 1]]
+
+    def llen(self, key):
+        return len(self.data.get(key, []))
+
+    def lrem(self, key, count, value):
+        values = self.data.get(key, [])
+        value = self.encode(value)
+        if value in values:
+            values.remove(value)
+            return 1
+        return 0
+
+    def ltrim(self, key, start, end):
+        self.data[key] = self.data.get(key, [])[start:end + 1]
+
+    def zadd(self, key, mapping, nx=False, xx=False):
+        scores = self.data.setdefault(key, {})
+        for member, score in mapping.items():
+            member = self.encode(member)
+            if (nx and member in scores) or (xx and member not in scores):
+                continue
+            scores[member] = score
+
+    def zrem(self, key, member):
+        return self.data.get(key, {}).pop(self.encode(member), None) is not None
+
+    def zrange(self, key, start, end):
+        members = sorted(self.data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        return [self.out(member) for member, _ in members[start:None if end == -1 else end + 1]]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Commands run as they are queued; execute() returns their results"""
+
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.results = []
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.results.append(command(*args, **kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
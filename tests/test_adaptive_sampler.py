@@ -0,0 +1,37 @@
+import numpy as np
+
+from adaptive_sampler import AdaptiveSampler
+
+
+def test_smooth_curve_has_no_breaks():
+    x, y = AdaptiveSampler().sample(np.sin, -5, 5)
+    assert np.all(np.diff(x) > 0)
+    assert np.isfinite(y).all()
+    assert x.size <= 1500
+
+
+def test_pole_breaks_the_line():
+    with np.errstate(all='ignore'):
+        x, y = AdaptiveSampler().sample(lambda t: 1 / t, -2, 2.1)
+    gaps = x[np.isnan(y)]
+    assert gaps.size == 1
+    assert abs(gaps[0]) < 1e-6
+
+
+def test_step_breaks_the_line_once_per_jump():
+    x, y = AdaptiveSampler().sample(np.floor, 0.5, 3.5)
+    gaps = x[np.isnan(y)]
+    assert np.allclose(gaps, [1, 2, 3], atol=1e-6)
+
+
+def test_refines_where_the_curve_bends():
+    x, _ = AdaptiveSampler().sample(lambda t: np.exp(-50 * t**2), -5, 5)
+    near_peak = np.count_nonzero(np.abs(x) < 0.5)
+    far = np.count_nonzero(np.abs(x) > 4.5)
+    assert near_peak > 4 * far
+
+
+def test_auto_window_centres_on_features():
+    lower, upper = AdaptiveSampler().auto_window(lambda t: (t - 10) * (t - 12), lambda t: 2 * t - 22)
+    assert lower < 10 and upper > 12
+    assert AdaptiveSampler().auto_window(lambda t: np.ones_like(t) * 3) == (-5.0, 5.0)
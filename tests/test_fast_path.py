@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from calculus_solver import CalculusSolver
+from problem_parser import ProblemParser
+from sympy_verifier import SympyVerifier
+
+
+def make_solver(verifier=None, workers=2, timeout=1.5, numeric_timeout=5.0):
+    """A CalculusSolver with just the fast path (no Gemini keys needed)"""
+    solver = CalculusSolver.__new__(CalculusSolver)
+    solver.verifier = verifier or SympyVerifier()
+    solver.fast_path_timeout = timeout
+    solver.numeric_timeout = numeric_timeout
+    solver.fast_path_executor = ThreadPoolExecutor(max_workers=workers)
+    solver.fast_path_slots = threading.BoundedSemaphore(workers)
+    return solver
+
+
+class SlowVerifier:
+    """solve_parsed blocks until released, like a runaway integrate()"""
+
+    def __init__(self, numeric_delay=0.0):
+        self.release = threading.Event()
+        self.numeric_delay = numeric_delay
+
+    def solve_parsed(self, problem, exact=True):
+        if exact:
+            self.release.wait(10)
+        else:
+            time.sleep(self.numeric_delay)
+        return {'answer': 1, 'answer_text': '1', 'latex': '1', 'verified': True, 'shortcuts': []}
+
+
+def test_answers_typed_problem():
+    solver = make_solver()
+    result = asyncio.run(solver.solve_fast(ProblemParser().parse('integrate x^2 from 0 to 3')))
+    assert result['source'] == 'sympy'
+    assert result['final_answer'] == '9'
+
+
+def test_runaway_calls_do_not_block_later_problems():
+    verifier = SlowVerifier()
+    solver = make_solver(verifier, workers=2, timeout=0.05)
+    problem = ProblemParser().parse('differentiate x^2')
+
+    async def scenario():
+        # Two calls time out but keep computing, holding both workers
+        assert await solver.solve_fast(problem) is None
+        assert await solver.solve_fast(problem) is None
+        started = time.perf_counter()
+        assert await solver.solve_fast(problem) is None
+        # Refused at once instead of waiting out another timeout behind them
+        return time.perf_counter() - started
+
+    try:
+        assert asyncio.run(scenario()) < 0.05
+    finally:
+        verifier.release.set()
+    solver.fast_path_executor.shutdown(wait=True)
+    # Workers are free again once the runaway calls return
+    assert solver.fast_path_slots.acquire(blocking=False)
+
+
+def test_numeric_fallback_has_a_timeout():
+    verifier = SlowVerifier(numeric_delay=0.5)
+    solver = make_solver(verifier, timeout=0.05, numeric_timeout=0.05)
+    problem = ProblemParser().parse('integrate x^2 from 0 to 1')
+    try:
+        started = time.perf_counter()
+        assert asyncio.run(solver.solve_fast(problem)) is None
+        assert time.perf_counter() - started < 0.4
+    finally:
+        verifier.release.set()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('integrate 1/x', 'log(Abs(x)) + C'),
+    ('differentiate x^3', '3*x^2'),
+])
+def test_fast_path_answers(text, expected):
+    result = asyncio.run(make_solver().solve_fast(ProblemParser().parse(text)))
+    assert result['final_answer'].replace(' ', '') == expected.replace(' ', '')
@@ -0,0 +1,65 @@
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from gemini_usage import IMAGE_TOKENS, RATE_LIMIT_COOLDOWN, UsageTracker
+
+
+def response(prompt, candidates):
+    return SimpleNamespace(usage_metadata=SimpleNamespace(prompt_token_count=prompt, candidates_token_count=candidates))
+
+
+def tracker(**quotas):
+    quotas = {'daily_requests': 0, 'daily_tokens': 0, 'minute_requests': 0, 'minute_tokens': 0, **quotas}
+    return UsageTracker(3, **quotas)
+
+
+def test_tokens_come_from_usage_metadata():
+    usage = tracker()
+    assert usage.record(0, 42, response(300, 700), ['prompt']) == {'prompt': 300, 'response': 700, 'estimated': 0}
+    assert usage.report()[0]['prompt_tokens'] == 300
+    assert usage.top_users() == [{'user_id': 42, 'requests': 1, 'prompt_tokens': 300, 'response_tokens': 700}]
+
+
+def test_tokens_are_estimated_without_metadata():
+    usage = tracker()
+    counts = usage.token_counts(SimpleNamespace(text='x' * 40), ['y' * 80, object()])
+    assert counts == {'prompt': 20 + IMAGE_TOKENS, 'response': 10, 'estimated': 1}
+
+
+def test_pick_key_prefers_headroom():
+    usage = tracker(daily_requests=10)
+    for _ in range(5):
+        usage.record(0, None, response(1, 1), [])
+    usage.record(1, None, response(1, 1), [])
+    assert usage.pick_key() == 2
+    assert usage.pick_key(exclude={2}) == 1
+    assert usage.remaining_requests() == 30 - 6
+
+
+def test_rate_limit_and_daily_quota_errors():
+    usage = tracker(daily_requests=10)
+    usage.record_error(0, Exception('429 Resource has been exhausted'))
+    assert 0 < usage.keys[0].cooldown_until - time.time() <= RATE_LIMIT_COOLDOWN
+    usage.record_error(1, Exception('429 Quota exceeded: requests per day'))
+    assert usage.pick_key() == 2
+    # A key out of daily quota counts for nothing until the reset
+    assert usage.remaining_requests() == 20
+    usage.record_error(2, Exception('500 internal'))
+    assert usage.pick_key() == 2 and usage.report()[2]['errors'] == 1
+
+
+def test_spent_keys_give_no_key():
+    usage = tracker(minute_requests=1)
+    for index in range(3):
+        usage.record(index, None, response(1, 1), [])
+    assert usage.pick_key() is None
+
+
+def test_quota_day_turns_at_the_reset_hour():
+    usage = tracker()
+    usage.reset_hour = 8
+    before = datetime(2024, 5, 2, 7, 59, tzinfo=timezone.utc).timestamp()
+    after = datetime(2024, 5, 2, 8, 0, tzinfo=timezone.utc).timestamp()
+    assert usage.quota_day(before) != usage.quota_day(after)
+    assert usage.next_reset(before) == after
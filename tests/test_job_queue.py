@@ -0,0 +1,126 @@
+import os
+import time
+
+import pytest
+
+from fake_redis import FakeRedis
+from job_queue import RedisJobQueue, SQLiteJobQueue
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def job_queue(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteJobQueue(os.path.join(tmp_path, 'jobs.db'), lease_seconds=60)
+    return RedisJobQueue('redis://', lease_seconds=60, client=FakeRedis())
+
+
+def enqueue(job_queue, user_id, chat_id=1):
+    return job_queue.enqueue(b'image', chat_id=chat_id, user_id=user_id, message_id=10)
+
+
+def test_claim_returns_the_job(job_queue):
+    job_id = enqueue(job_queue, 7, chat_id=3)
+    job = job_queue.claim('w1')
+    assert job['id'] == job_id
+    assert (job['user_id'], job['chat_id'], job['message_id'], job['progress_message_id']) == (7, 3, 10, None)
+    assert job['image'] == b'image' and job['attempts'] == 1
+    assert job_queue.claim('w2') is None
+
+
+def test_burst_does_not_occupy_every_worker(job_queue):
+    burst = [enqueue(job_queue, 1) for _ in range(3)]
+    other = enqueue(job_queue, 2)
+    assert job_queue.claim('w1')['id'] == burst[0]
+    # User 1 already has a job running
+    assert job_queue.claim('w2')['id'] == other
+    assert job_queue.claim('w3') is None
+
+
+def test_completed_jobs_free_the_user(job_queue):
+    first, second = enqueue(job_queue, 1), enqueue(job_queue, 1)
+    job_queue.complete(job_queue.claim('w1')['id'])
+    assert job_queue.claim('w1')['id'] == second != first
+
+
+def test_expired_lease_is_retried_and_renew_keeps_it(job_queue):
+    job_id = enqueue(job_queue, 1)
+    job_queue.claim('w1')
+    assert job_queue.renew(job_id, 'w1')
+    assert not job_queue.renew(job_id, 'other')
+
+    job_queue.lease_seconds = -1
+    assert job_queue.renew(job_id, 'w1')  # lease now in the past: the worker died
+    job = job_queue.claim('w2')
+    assert job['id'] == job_id and job['attempts'] == 2
+    assert not job_queue.renew(job_id, 'w1')
+
+
+def test_redis_serves_users_round_robin():
+    job_queue = RedisJobQueue('redis://', lease_seconds=60, client=FakeRedis())
+    burst = [enqueue(job_queue, 1) for _ in range(3)]
+    late = [enqueue(job_queue, 2), enqueue(job_queue, 3)]
+    assert [job_queue.position(job_id) for job_id in burst + late] == [1, 4, 5, 2, 3]
+
+    order = []
+    while True:
+        job = job_queue.claim('w')
+        if job is None:
+            break
+        order.append(job['id'])
+        job_queue.complete(job['id'])
+    assert order == [burst[0], late[0], late[1], burst[1], burst[2]]
+
+
+def test_redis_user_served_again_waits_for_the_others():
+    job_queue = RedisJobQueue('redis://', lease_seconds=60, client=FakeRedis())
+    first = enqueue(job_queue, 1)
+    job_queue.complete(job_queue.claim('w')['id'])
+    waiting = enqueue(job_queue, 2)
+    again = enqueue(job_queue, 1)
+    # User 2 has not been served yet, user 1 has
+    assert job_queue.claim('w')['id'] == waiting
+    assert job_queue.claim('w')['id'] == again != first
+
+
+def test_sqlite_lease_is_measured_from_the_last_renewal(tmp_path):
+    job_queue = SQLiteJobQueue(os.path.join(tmp_path, 'jobs.db'), lease_seconds=60)
+    job_id = enqueue(job_queue, 1)
+    job_queue.claim('w1')
+    before = time.time()
+    job_queue.renew(job_id, 'w1')
+    leased_until = job_queue.connection().execute('SELECT leased_until FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+    assert leased_until >= before + 60
+
+
+def test_worker_heartbeat_renews_until_the_lease_is_lost():
+    import asyncio
+    from solver_worker import SolverWorker
+
+    class Queue:
+        lease_seconds = 0.03
+        renewals = 0
+
+        def renew(self, job_id, worker):
+            self.renewals += 1
+            return self.renewals < 3
+
+    queue = Queue()
+    worker = SolverWorker(None, queue, 'token', concurrency=1, poll_interval=1)
+    asyncio.run(asyncio.wait_for(worker.heartbeat(1, 'w1'), timeout=2))
+    assert queue.renewals == 3
+
+
+def test_redis_running_marker_is_taken_before_the_pop():
+    client = FakeRedis()
+    first, second = (RedisJobQueue('redis://', lease_seconds=60, client=client) for _ in range(2))
+    enqueue(first, 1)
+    enqueue(first, 1)
+    # Another worker has won the user's marker but not popped a job yet
+    client.set(first.key('active', '1'), 'other-worker', nx=True)
+    assert second.claim('w2') is None
+
+    client.delete(first.key('active', '1'))
+    job = second.claim('w2')
+    assert first.claim('w1') is None
+    second.complete(job['id'])
+    assert first.claim('w1') is not None
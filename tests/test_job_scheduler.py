@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+
+from job_scheduler import JobScheduler, QueueFullError
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_jobs_run_concurrently_up_to_the_limit():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=4, per_user_limit=1)
+        started = time.perf_counter()
+        jobs = [scheduler.submit(user, lambda: asyncio.sleep(0.1)) for user in range(8)]
+        assert scheduler.active == 4 and scheduler.queued == 4
+        await asyncio.gather(*jobs)
+        return time.perf_counter() - started
+
+    # Two waves of four, not eight in a row
+    assert run(scenario()) < 0.35
+
+
+def test_round_robin_across_users():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1, per_user_limit=1, per_user_queued=5)
+        order = []
+
+        def job(name):
+            async def work():
+                order.append(name)
+                await asyncio.sleep(0)
+            return work
+
+        # The first job starts at once; user 1's backlog must not starve user 2
+        jobs = [scheduler.submit(1, job(f'1-{n}')) for n in range(3)]
+        jobs += [scheduler.submit(2, job(f'2-{n}')) for n in range(2)]
+        await asyncio.gather(*jobs)
+        return order
+
+    assert run(scenario()) == ['1-0', '2-0', '1-1', '2-1', '1-2']
+
+
+def test_per_user_limit():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=4, per_user_limit=1, per_user_queued=5)
+        for _ in range(3):
+            scheduler.submit(1, lambda: asyncio.sleep(0.01))
+        running = scheduler.active
+        await scheduler.join()
+        return running
+
+    assert run(scenario()) == 1
+
+
+def test_queue_limits_refuse_new_work():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1, per_user_limit=1, max_queued=2, per_user_queued=1)
+        scheduler.submit(1, lambda: asyncio.sleep(0.01))
+        scheduler.submit(1, lambda: asyncio.sleep(0.01))
+        with pytest.raises(QueueFullError):
+            scheduler.submit(1, lambda: asyncio.sleep(0.01))
+        scheduler.submit(2, lambda: asyncio.sleep(0.01))
+        with pytest.raises(QueueFullError):
+            scheduler.submit(3, lambda: asyncio.sleep(0.01))
+        await scheduler.join()
+        return scheduler.stats()
+
+    stats = run(scenario())
+    assert stats['running'] == 0 and stats['queued'] == 0
+
+
+def test_waiting_jobs_are_told_their_position():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1, per_user_limit=1)
+        positions = {}
+
+        async def record(user, position, eta):
+            positions.setdefault(user, []).append(position)
+
+        for user in range(3):
+            scheduler.submit(user, lambda: asyncio.sleep(0.01),
+                             on_position=lambda position, eta, user=user: record(user, position, eta))
+        await scheduler.join()
+        return positions
+
+    # User 0 starts at once; user 2 moves up as the queue drains
+    assert run(scenario()) == {1: [1], 2: [2, 1]}
+
+
+def test_failures_reach_the_job_and_free_the_slot():
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1)
+
+        async def fail():
+            raise ValueError('boom')
+
+        job = scheduler.submit(1, fail)
+        with pytest.raises(ValueError):
+            await job
+        assert await scheduler.submit(1, lambda: asyncio.sleep(0, 'ok')) == 'ok'
+        return scheduler.active
+
+    assert run(scenario()) == 0
+
+
+def test_idle_users_are_forgotten_beyond_the_limit(monkeypatch):
+    import job_scheduler
+    monkeypatch.setattr(job_scheduler, 'LAST_SERVED_LIMIT', 10)
+
+    async def scenario():
+        scheduler = JobScheduler(max_concurrent=1)
+        for user in range(30):
+            await scheduler.submit(user, lambda: asyncio.sleep(0))
+        return scheduler.last_served
+
+    last_served = run(scenario())
+    assert len(last_served) <= 11
+    assert 29 in last_served
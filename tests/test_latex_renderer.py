@@ -0,0 +1,79 @@
+import pytest
+
+from latex_renderer import LatexRenderer
+from pdf_generator import PDFGenerator
+
+
+@pytest.fixture(scope='module')
+def renderer():
+    # Escaping needs no pdflatex or output directory
+    generator = PDFGenerator.__new__(PDFGenerator)
+    return LatexRenderer(generator.escape_for_latex)
+
+
+@pytest.mark.parametrize('math', [
+    r'\InputIfFileExists{/etc/passwd}{}{}',
+    r'\input{/etc/passwd}',
+    r'\write18{rm -rf /}',
+    r'\immediate\write18{id}',
+    r'^^5cinput{/etc/passwd}',
+    r'\def\x{1} \x',
+    r'\catcode`\^=7',
+    r'\begin{document}',
+    r'\begin{filecontents}{a.tex}x\end{filecontents}',
+    r'\csname input\endcsname{/etc/passwd}',
+])
+def test_unsafe_latex_is_escaped_as_prose(renderer, math):
+    rendered = renderer.render(f"see ${math}$ here")
+    assert rendered.startswith(r'see \$')
+    # Every backslash from the model is now text, not a command
+    assert '\\' + math[1:4] not in rendered.replace(r'\textbackslash{}', '')
+
+
+@pytest.mark.parametrize('math', [
+    r'\frac{1}{3}',
+    r'\int_0^1 x^2 \, dx = \left. \frac{x^3}{3} \right|_0^1',
+    r'\sqrt{x} \cdot e^{x} \leq \infty',
+    r'f(x) = \begin{cases} x & x > 0 \\ -x & \text{otherwise} \end{cases}',
+    r'\alpha + \Omega \to \pi',
+])
+def test_allowlisted_latex_is_kept(renderer, math):
+    assert renderer.render(f"${math}$") == f"${math}$"
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('so dy/dx = 2x', r'so $\frac{dy}{dx}$ = 2x'),
+    ('d/dx of sin', r'$\frac{d}{dx}$ of sin'),
+    ('then d^2y/dx^2 is', r'then $\frac{d^{2}y}{dx^{2}}$ is'),
+    ('(dy/dx) at 0', r'($\frac{dy}{dx}$) at 0'),
+])
+def test_derivative_notation(renderer, text, expected):
+    assert renderer.render(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    'use and/or here',
+    'the ratio speed/time is',
+    'in km/h',
+    'file /usr/bin/env now',
+])
+def test_slashes_between_words_stay_prose(renderer, text):
+    assert '\\frac' not in renderer.render(text)
+
+
+def test_plain_formulas_are_typeset(renderer):
+    rendered = renderer.render('so x^2*e^x and sin(x)/(1+cos(x)) follow')
+    assert '$x^{2} e^{x}$' in rendered
+    assert r'\frac{\sin{\left(x \right)}}{1 + \cos{\left(x \right)}}' in rendered
+    assert renderer.render('x/2') == r'$\frac{x}{2}$'
+
+
+def test_prose_is_escaped(renderer):
+    assert renderer.render('50% & more') == r'50\% \& more'
+
+
+def test_fragments_are_cached(renderer):
+    renderer.fragments.clear()
+    first = renderer.render('x^2 + 1')
+    assert renderer.render('x^2 + 1') is first
+    assert len(renderer.fragments) == 2  # the text and its formula
@@ -0,0 +1,35 @@
+from sympy import cos, exp, sin, symbols
+
+from mcq_evaluator import MCQEvaluator
+
+x = symbols('x')
+
+PROBLEM = "Integral of x*e^x dx is (A) x*e^x + C (B) (x - 1)*e^x + C (C) (x + 1)*e^x + C (D) e^x + C"
+
+
+def test_parse_and_strip_options():
+    evaluator = MCQEvaluator()
+    options = evaluator.parse_options(PROBLEM)
+    assert sorted(options) == ['A', 'B', 'C', 'D']
+    assert options['B'] == '(x - 1)*e^x + C'
+    assert evaluator.strip_options(PROBLEM) == 'Integral of x*e^x dx is'
+
+
+def test_indefinite_answer_matches_up_to_a_constant():
+    evaluator = MCQEvaluator()
+    check = evaluator.evaluate((x - 1) * exp(x) + 5, evaluator.parse_options(PROBLEM), indefinite=True)
+    assert check['option'] == 'B'
+    assert check['margin'] > 0
+
+
+def test_no_option_matches():
+    evaluator = MCQEvaluator()
+    options = {'A': 'sin(x)', 'B': 'cos(x)'}
+    assert evaluator.evaluate(sin(x) + cos(x), options)['option'] is None
+
+
+def test_model_choice():
+    evaluator = MCQEvaluator()
+    assert evaluator.model_choice('Option [C]') == 'C'
+    assert evaluator.model_choice('B') == 'B'
+    assert evaluator.model_choice('42') is None
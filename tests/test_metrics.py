@@ -0,0 +1,52 @@
+import pytest
+
+from metrics import Metrics, RollingHistogram
+
+
+def test_quantiles_use_nearest_rank():
+    histogram = RollingHistogram(window_seconds=60, max_samples=1000)
+    for value in range(1, 101):
+        histogram.observe(value, now=0)
+    assert histogram.quantiles(now=0) == {0.5: 51, 0.95: 96, 0.99: 100}
+
+
+def test_old_samples_leave_the_window_but_not_the_totals():
+    histogram = RollingHistogram(window_seconds=10, max_samples=1000)
+    histogram.observe(5.0, now=0)
+    histogram.observe(1.0, now=20)
+    assert histogram.quantiles(now=25) == {0.5: 1.0, 0.95: 1.0, 0.99: 1.0}
+    assert (histogram.count, histogram.total) == (2, 6.0)
+    assert histogram.quantiles(now=100) is None
+
+
+def test_max_samples_keeps_the_newest():
+    histogram = RollingHistogram(window_seconds=60, max_samples=3)
+    for value in (100, 1, 2, 3):
+        histogram.observe(value, now=0)
+    assert histogram.quantiles(now=0)[0.99] == 3
+
+
+def test_span_records_duration_and_errors():
+    metrics = Metrics(window_seconds=60, max_samples=100)
+    with metrics.span('parse'):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.span('parse'):
+            raise ValueError
+    summary = metrics.summary()
+    assert summary['parse']['count'] == 2
+    assert set(summary['parse']) == {'count', 'p50', 'p95', 'p99'}
+    assert metrics.counters == {'parse_errors': 1}
+
+
+def test_prometheus_exposition():
+    metrics = Metrics(window_seconds=60, max_samples=100)
+    metrics.observe('gemini', 2.5)
+    metrics.increment('images')
+    metrics.gauge('jobs_queued', lambda: 3)
+    text = metrics.prometheus()
+    assert 'calculus_bot_stage_seconds{stage="gemini",quantile="0.5"} 2.500000' in text
+    assert 'calculus_bot_stage_seconds_count{stage="gemini"} 1' in text
+    assert 'calculus_bot_images_total 1' in text
+    assert 'calculus_bot_jobs_queued 3' in text
+    assert text.endswith('\n')
@@ -0,0 +1,42 @@
+import math
+
+import numpy as np
+import pytest
+from sympy import Abs, Piecewise, exp, floor, oo, pi, sin, sqrt, symbols
+
+from numeric_integrator import NumericIntegrator
+
+x, a = symbols('x a')
+
+
+@pytest.mark.parametrize('expr, lower, upper, expected', [
+    (x**2, 0, 3, 9.0),
+    (sin(x), 0, pi, 2.0),
+    (Abs(x - 1), 0, 3, 2.5),
+    (floor(x), 0, 3, 3.0),
+    (Piecewise((x, x < 1), (2 - x, True)), 0, 2, 1.0),
+    (exp(-x**2), -oo, oo, math.sqrt(math.pi)),
+    (1 / sqrt(x), 0, 1, 2.0),
+])
+def test_integrate(expr, lower, upper, expected):
+    result = NumericIntegrator().integrate(expr, x, lower, upper)
+    assert result['converged']
+    assert result['value'] == pytest.approx(expected, rel=1e-7)
+
+
+def test_reversed_limits_change_sign():
+    result = NumericIntegrator().integrate(x**2, x, 3, 0)
+    assert result['value'] == pytest.approx(-9.0)
+
+
+def test_batch_shares_compiled_integrand():
+    integrator = NumericIntegrator()
+    results = integrator.integrate_batch([(x**2, x, 0, 1), (x**2, x, 0, 2), (sin(x), x, 0, pi)])
+    assert [r['value'] for r in results] == pytest.approx([1 / 3, 8 / 3, 2.0])
+    assert len(integrator.compiled) == 2
+
+
+def test_parametric():
+    result = NumericIntegrator().integrate_parametric(a * x, x, a, 0, 1, [1, 2, 3])
+    assert result['converged']
+    assert np.allclose(result['values'], [0.5, 1.0, 1.5])
@@ -0,0 +1,90 @@
+import pytest
+from sympy import Abs, cos, diff, exp, log, oo, pi, simplify, sin, sqrt, symbols
+
+from pattern_index import PatternIndex
+from problem_parser import ProblemParser
+from sympy_verifier import SympyVerifier
+
+x, t, k = symbols('x t k')
+
+
+@pytest.fixture(scope='module')
+def index():
+    return PatternIndex()
+
+
+@pytest.fixture(scope='module')
+def verifier():
+    return SympyVerifier()
+
+
+@pytest.mark.parametrize('integrand, shortcut', [
+    (x**5, 'power_rule'),
+    ((2 * x + 1)**5, 'power_rule'),
+    (1 / (3 * x + 2), 'logarithmic'),
+    (sin(x), 'sin'),
+    (1 / sqrt(4 - x**2), 'inv_sqrt'),
+    (1 / (4 + x**2), 'inv_sum'),
+    ((2 * x + 3) / (3 * x - 1), 'linear_over_linear'),
+    (x * exp(x), 'x_e_x'),
+    (2 * x / (x**2 + 1), 'f_prime_over_f'),
+    (cos(x) * sin(x)**3, 'f_prime_times_f_power'),
+])
+def test_shortcut_antiderivatives_differentiate_back(index, verifier, integrand, shortcut):
+    result = index.match(integrand, x)
+    assert shortcut in result['shortcuts']
+    assert verifier.check_antiderivative(result['antiderivative'], integrand, x)
+
+
+def test_sums_are_matched_termwise(index):
+    result = index.match(3 * x**2 + 2 * sin(x) + 5, x)
+    assert simplify(diff(result['antiderivative'], x) - (3 * x**2 + 2 * sin(x) + 5)) == 0
+    assert sorted(result['shortcuts']) == ['power_rule', 'sin']
+
+
+def test_other_variable(index):
+    result = index.match(exp(2 * t), t)
+    assert simplify(result['antiderivative'] - exp(2 * t) / 2) == 0
+
+
+def test_x_as_a_parameter_is_not_merged_with_the_variable(index):
+    # integral of x*t dt is x*t^2/2, not t^3/3
+    result = index.match(x * t, t)
+    assert simplify(result['antiderivative'] - x * t**2 / 2) == 0
+    result = index.match(1 / (t + x), t)
+    assert simplify(result['antiderivative'] - log(Abs(t + x))) == 0
+
+
+def test_no_shortcut(index):
+    assert index.match(exp(x**2), x) is None
+
+
+def test_definite_shortcuts(index):
+    assert index.match_definite(x**3 * cos(x), x, -1, 1)['value'] == 0
+    assert index.match_definite(x**2, x, -2, 2)['shortcuts'] == ['even_function']
+
+
+@pytest.mark.parametrize('integrand', [1 / x, 1 / x**3])
+def test_improper_integrals_get_no_shortcut(index, verifier, integrand):
+    assert index.match_definite(integrand, x, -1, 1) is None
+    assert index.match_definite(x, x, -oo, oo) is None
+
+    result = verifier.solve_parsed({
+        'operation': 'integrate', 'expression': integrand, 'variable': x, 'limits': (-1, 1),
+    })
+    assert result['answer_text'] == 'The integral diverges'
+    assert result['shortcuts'] == []
+
+
+def test_shortcut_values_are_not_truncated(verifier, monkeypatch):
+    monkeypatch.setattr(verifier.pattern_index, 'match_definite',
+                        lambda *args: {'value': pi / 4, 'shortcuts': ['kings_property'], 'hints': []})
+    problem = ProblemParser().parse('integrate 1/(1+tan(x)) from 0 to pi/2')
+    assert verifier.solve_parsed(problem)['answer'] == pi / 4
+
+
+def test_check_antiderivative_uses_real_variable(verifier):
+    # ln|3x - 1| only simplifies piecewise; still accepted on both sides of the pole
+    assert verifier.check_antiderivative(log(Abs(3 * x - 1)) / 3, 1 / (3 * x - 1), x)
+    assert not verifier.check_antiderivative(log(Abs(3 * x - 1)), 1 / (3 * x - 1), x)
+    assert not verifier.check_antiderivative(k * x, x, x)
@@ -0,0 +1,47 @@
+from sympy import E, exp, pi, sin, symbols
+
+from problem_parser import ProblemParser
+
+x, t = symbols('x t')
+
+
+def test_integral_with_limits_and_unicode():
+    problem = ProblemParser().parse('∫x² dx from 0 to π')
+    assert problem['operation'] == 'integrate'
+    assert problem['expression'] == x**2
+    assert problem['variable'] == x
+    assert problem['limits'] == (0, pi)
+
+
+def test_indefinite_integral_in_another_variable():
+    problem = ProblemParser().parse('integrate t^2*e^t dt')
+    assert problem['expression'] == t**2 * exp(t)
+    assert problem['variable'] == t
+    assert problem['limits'] is None
+
+
+def test_derivative_forms():
+    parser = ProblemParser()
+    for text in ('differentiate sin(x)', 'd/dx sin(x)', 'derivative of y = sin(x)'):
+        problem = parser.parse(text)
+        assert problem['operation'] == 'differentiate', text
+        assert problem['expression'] == sin(x), text
+
+
+def test_jee_phrasing_is_stripped():
+    problem = ProblemParser().parse('Evaluate the integral of e^x from 0 to 1 is equal to?')
+    assert problem['expression'] == exp(x)
+    assert problem['limits'] == (0, 1)
+
+
+def test_not_a_problem():
+    parser = ProblemParser()
+    assert parser.parse('hello there') is None
+    assert not parser.looks_like_problem('hello there')
+    assert parser.looks_like_problem('what is the area under y = x^2')
+
+
+def test_cache_key_is_canonical():
+    parser = ProblemParser()
+    assert parser.cache_key(parser.parse('integrate x^2')) == parser.cache_key(parser.parse('integral of x**2 dx'))
+    assert parser.parse_expression('e^x') == E**x
@@ -0,0 +1,89 @@
+import asyncio
+
+from progress_reporter import ProgressReporter, StageClock, TokenBucket, format_estimate
+
+STAGES = [('enhance', 'Enhance'), ('solve', 'Solve'), ('pdf', 'PDF')]
+
+
+class Message:
+    def __init__(self):
+        self.edits = []
+        self.replies = []
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def reporter(message, **kwargs):
+    return ProgressReporter(message, TokenBucket(100), StageClock(), STAGES,
+                            min_interval=kwargs.pop('min_interval', 0.01),
+                            refresh_interval=kwargs.pop('refresh_interval', 60), **kwargs)
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+def test_stop_right_after_a_stage_change_returns():
+    async def scenario():
+        for _ in range(20):
+            progress = reporter(Message())
+            await asyncio.sleep(0)
+            progress.stage('enhance')
+            await asyncio.wait_for(progress.stop(), timeout=1)
+            assert progress.task.done()
+
+    run(scenario())
+
+
+def test_rapid_stage_changes_share_one_edit():
+    async def scenario():
+        message = Message()
+        progress = reporter(message)
+        for stage, _ in STAGES:
+            progress.stage(stage)
+        await asyncio.sleep(0.5)
+        await progress.stop()
+        return message.edits
+
+    edits = run(scenario())
+    assert len(edits) == 1
+    assert '⏳ Stage 3/3: PDF' in edits[0] and '✅ Stage 2/3: Solve' in edits[0]
+
+
+def test_elapsed_time_is_refreshed_while_a_stage_runs():
+    async def scenario():
+        message = Message()
+        progress = reporter(message, refresh_interval=0.05)
+        progress.stage('solve')
+        progress.started -= 61  # the next edit shows a new elapsed time
+        await asyncio.sleep(0.5)
+        progress.started -= 61
+        await asyncio.sleep(0.2)
+        await progress.stop()
+        return message.edits
+
+    edits = run(scenario())
+    assert len(edits) >= 2 and len(set(edits)) == len(edits)
+
+
+def test_finish_replaces_the_progress_text_and_records_the_stage():
+    async def scenario():
+        message = Message()
+        progress = reporter(message)
+        progress.stage('solve')
+        await progress.finish('done')
+        return message, progress
+
+    message, progress = run(scenario())
+    assert message.edits[-1] == 'done' and not message.replies
+    assert progress.clock.seconds['solve'] < 240
+
+
+def test_estimates_are_rounded():
+    assert format_estimate(2) == '5 s'
+    assert format_estimate(42) == '40 s'
+    assert format_estimate(150) == '2 min'
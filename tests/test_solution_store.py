@@ -0,0 +1,100 @@
+import os
+
+import pytest
+from sympy import Abs, Dummy, Rational, log, pi, symbols
+
+from fake_redis import FakeRedis
+from problem_parser import ProblemParser
+from solution_store import RedisSolutionStore, SolutionStore, open_solution_store
+
+x = symbols('x')
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        store = SolutionStore(os.path.join(tmp_path, 'solutions.db'), flush_interval=0.01)
+    else:
+        store = RedisSolutionStore('redis://', flush_interval=0.01, client=FakeRedis(decode_responses=True))
+    yield store
+    store.close()
+
+
+def solution():
+    problem = ProblemParser().parse('integrate 1/x from 1 to pi')
+    return {
+        'source': 'sympy',
+        'problem': problem,
+        'problem_text': 'integrate 1/x from 1 to pi',
+        'final_answer': 'log(pi)',
+        'answer': log(pi),
+        'mcq_check': {'option': 'B', 'margin': 0.5, 'distances': {'A': 1.0, 'B': 0.0}},
+        'graphs': ['/tmp/graph.pdf'],
+        'confidence': 100,
+    }
+
+
+def test_round_trip_keeps_sympy_structure(store):
+    store.save_solution(solution(), user_id=1, chat_id=1, image_hash='abc', solution_key='key')
+    store.flush()
+
+    loaded = store.find_by_image_hash('abc')
+    assert loaded == solution()
+    assert loaded['problem']['variable'] == x
+    assert loaded['problem']['limits'] == (1, pi)
+    assert isinstance(loaded['problem']['limits'], tuple)
+    assert store.find_by_solution_key('key') == loaded
+
+
+def test_dummies_and_rationals_survive(store):
+    data = {'answer': Rational(1, 3) * Abs(Dummy('t')), 'final_answer': '1/3'}
+    store.save_solution(data, user_id=1, solution_key='dummy')
+    store.flush()
+    loaded = store.find_by_solution_key('dummy')['answer']
+    assert loaded.atoms(Rational) == {Rational(1, 3)}
+    assert str(loaded) == str(data['answer'])
+
+
+def test_history_is_per_user(store):
+    store.save_solution(solution(), user_id=1)
+    store.save_solution({'problem_text': 'other', 'final_answer': '2'}, user_id=2)
+    store.flush()
+
+    entries = store.recent(1)
+    assert [entry['final_answer'] for entry in entries] == ['log(pi)']
+    assert store.get(entries[0]['id'], 1)['answer'] == log(pi)
+    assert store.get(entries[0]['id'], 2) is None
+
+
+def test_file_ids(store):
+    assert store.file_id('key') is None
+    store.save_file_id('key', 'first')
+    store.save_file_id('key', 'second')
+    store.flush()
+    assert store.file_id('key') == 'second'
+
+
+def test_history_keeps_newest_first(store):
+    for number in range(3):
+        store.save_solution({'problem_text': f'problem {number}', 'final_answer': str(number)}, user_id=1)
+    store.flush()
+    entries = store.recent(1, limit=2)
+    assert [entry['final_answer'] for entry in entries] == ['2', '1']
+    assert all(isinstance(entry['created_at'], float) for entry in entries)
+
+
+def test_workers_default_to_the_job_queue_redis(monkeypatch, tmp_path):
+    monkeypatch.delenv('SOLUTION_DB', raising=False)
+    monkeypatch.setenv('JOB_QUEUE_URL', 'sqlite:///' + os.path.join(tmp_path, 'jobs.db'))
+    monkeypatch.chdir(tmp_path)
+    store = open_solution_store()
+    assert isinstance(store, SolutionStore)
+    store.close()
+
+    monkeypatch.setenv('JOB_QUEUE_URL', 'redis://localhost:6379/0')
+    try:
+        store = open_solution_store()
+    except ImportError:
+        return  # redis package not installed: the Redis store was still chosen
+    assert isinstance(store, RedisSolutionStore)
+    store.close()
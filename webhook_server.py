@@ -0,0 +1,206 @@
+"""
+Webhook Server
+Receives Telegram updates over HTTPS (via the platform's reverse proxy)
+instead of long polling: a small asyncio HTTP/1.1 server with keep-alive
+that checks Telegram's secret-token header, feeds updates to the
+Application's update queue and serves /healthz and Prometheus /metrics.
+Polling bots and solver workers can run the same server for /metrics alone
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import signal
+import time
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, Tuple
+from urllib.parse import unquote, urlsplit
+
+from telegram import Update
+from telegram.ext import Application
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted (updates are a few KB)
+MAX_BODY_BYTES = 1024 * 1024
+# Idle time before a keep-alive connection is closed (seconds)
+KEEPALIVE_TIMEOUT = 75
+
+Response = Tuple[int, str, bytes]
+Handler = Callable[[Dict[str, str], bytes], Awaitable[Response]]
+
+
+class HttpServer:
+    max_body_bytes = MAX_BODY_BYTES
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 8080):
+        self.host = host
+        self.port = port
+        self.started_at = time.time()
+        self.server = None
+        self.connections = set()
+        self.routes = {}
+        self.add_route('GET', '/metrics', metrics_endpoint)
+
+    def add_route(self, method: str, path: str, handler: Handler):
+        """handler(headers, body) -> (status, content_type, payload)"""
+        self.routes[(method, path)] = handler
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        logger.info(f"HTTP server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            # Idle keep-alive connections would otherwise hold wait_closed() open
+            for writer in list(self.connections):
+                writer.close()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection until the client closes it or goes idle"""
+        self.connections.add(writer)
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                if length > self.max_body_bytes:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'text/plain', b'', False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                handler = self.routes.get((method, unquote(urlsplit(target).path)))
+                if handler is None:
+                    status, content_type, payload = HTTPStatus.NOT_FOUND, 'text/plain', b'not found'
+                else:
+                    status, content_type, payload = await handler(headers, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except Exception as e:
+            logger.error(f"Webhook request failed: {e}")
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, content_type: str,
+                      payload: bytes, keep_alive: bool):
+        head = (
+            f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+
+class WebhookServer(HttpServer):
+    def __init__(self, application: Application, path: str = '/telegram', secret_token: str = None,
+                 host: str = '0.0.0.0', port: int = 8080):
+        """
+        Args:
+            application: started Application that processes the updates
+            path: URL path Telegram posts updates to
+            secret_token: expected X-Telegram-Bot-Api-Secret-Token (None disables the check)
+            host / port: listening address
+        """
+        super().__init__(host, port)
+        self.application = application
+        self.secret_token = secret_token
+        self.add_route('POST', path, self.handle_update)
+        self.add_route('GET', '/healthz', self.health)
+
+    async def handle_update(self, headers: Dict[str, str], body: bytes) -> Response:
+        """Telegram update: check the secret, queue it and answer at once"""
+        if self.secret_token is not None and not hmac.compare_digest(
+                headers.get('x-telegram-bot-api-secret-token', ''), self.secret_token):
+            return HTTPStatus.FORBIDDEN, 'text/plain', b'forbidden'
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            return HTTPStatus.BAD_REQUEST, 'text/plain', b'bad update'
+        await self.application.update_queue.put(update)
+        return HTTPStatus.OK, 'text/plain', b'ok'
+
+    async def health(self, headers: Dict[str, str], body: bytes) -> Response:
+        running = self.application.running
+        payload = json.dumps({
+            'status': 'ok' if running else 'stopped',
+            'uptime_s': round(time.time() - self.started_at),
+            'pending_updates': self.application.update_queue.qsize(),
+        }).encode()
+        return (HTTPStatus.OK if running else HTTPStatus.SERVICE_UNAVAILABLE), 'application/json', payload
+
+
+async def metrics_endpoint(headers: Dict[str, str], body: bytes) -> Response:
+    return HTTPStatus.OK, 'text/plain; version=0.0.4', METRICS.prometheus().encode()
+
+
+async def start_metrics_server(port: int = None):
+    """
+    /metrics on its own port (default from METRICS_PORT) for polling bots and
+    workers; returns the started server, or None when no port is configured
+    """
+    port = port or int(os.getenv('METRICS_PORT', '0'))
+    if not port:
+        return None
+    server = HttpServer(port=port)
+    await server.start()
+    return server
+
+
+async def run_webhook(application: Application, webhook_url: str, allowed_updates: list,
+                      port: int = None, secret_token: str = None):
+    """
+    Serve the bot in webhook mode until SIGINT/SIGTERM
+
+    Args:
+        webhook_url: public HTTPS URL; '/telegram' is used when it has no path
+        allowed_updates: update types Telegram should send
+        port: listening port (default from PORT, as set by Railway/Render)
+        secret_token: shared secret (default from WEBHOOK_SECRET, else random per start)
+    """
+    url = urlsplit(webhook_url)
+    if url.path in ('', '/'):
+        url = url._replace(path='/telegram')
+    secret_token = secret_token or os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+    server = WebhookServer(
+        application, path=url.path, secret_token=secret_token,
+        port=port or int(os.getenv('PORT', '8080')),
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    async with application:
+        await application.start()
+        await server.start()
+        await application.bot.set_webhook(
+            url=url.geturl(), secret_token=secret_token, allowed_updates=allowed_updates,
+        )
+        logger.info(f"Webhook set to {url.geturl()}")
+        await stop.wait()
+        await server.stop()
+        await application.stop()
@@ -0,0 +1,66 @@
+"""
+Request Workspace
+Every request gets its own scratch directory (photo, enhanced image, .tex,
+.aux, .log, PDF) with a unique name, on RAM-backed /dev/shm when available.
+The directory is removed when the request ends, whether it succeeded or
+failed, so nothing accumulates, names never collide between concurrent
+requests and no code has to scan a shared directory
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Workspace directory names start with this (the startup sweep only touches these)
+PREFIX = 'calculus-'
+
+
+def workspace_root() -> str:
+    """WORKSPACE_DIR, else /dev/shm (tmpfs) if writable, else the system temp directory"""
+    root = os.getenv('WORKSPACE_DIR')
+    if root:
+        os.makedirs(root, exist_ok=True)
+        return root
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+@contextmanager
+def request_workspace(kind: str = 'request'):
+    """Yield a fresh private directory; it and everything in it is removed on exit"""
+    path = tempfile.mkdtemp(prefix=f'{PREFIX}{kind}-', dir=workspace_root())
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def sweep_workspaces(max_age: float = None) -> int:
+    """
+    Remove workspaces left behind by killed processes (called once at startup)
+    Only directories older than max_age (default from WORKSPACE_MAX_AGE_SECONDS)
+    are removed, so requests running in other processes are left alone
+    """
+    max_age = max_age or float(os.getenv('WORKSPACE_MAX_AGE_SECONDS', '86400'))
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(workspace_root()))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.name.startswith(PREFIX) and entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Removed {removed} stale request workspace(s)")
+    return removed